@@ -0,0 +1,80 @@
+#-------------------------------------------------------------------------------
+# Name:         benchmark_export.py
+# Purpose:      Measure time of exporting a few bands from a product with
+#               many bands
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#-------------------------------------------------------------------------------
+''' Usage: python benchmark_export.py [nBands] [nRepeats]
+
+Creates a product with <nBands> bands (50 by default) from the test file
+gcps.tif and measures time of:
+* deleting all bands but one from a copy of the VRT band by band (with
+  read/write of the XML for each band, as without transactions)
+* deleting the same bands in one transaction (VRT.delete_bands)
+* Nansat.export(bands=[1]) into a NetCDF file
+'''
+import os
+import sys
+import time
+
+import numpy as np
+
+from nansat import Nansat
+from nansat.tests import nansat_test_data as ntd
+
+
+def min_time(function, nRepeats):
+    ''' Return minimum time of calling the function '''
+    times = []
+    for i in range(nRepeats):
+        t0 = time.time()
+        function()
+        times.append(time.time() - t0)
+
+    return min(times)
+
+
+def delete_band_by_band(n, bandNums):
+    ''' Delete bands from a copy of VRT without a transaction '''
+    vrt = n.vrt.copy()
+    for bandNum in sorted(bandNums, reverse=True):
+        vrt.delete_band(bandNum)
+
+
+def delete_bands(n, bandNums):
+    ''' Delete bands from a copy of VRT in one transaction '''
+    vrt = n.vrt.copy()
+    vrt.delete_bands(list(bandNums))
+
+
+if __name__ == '__main__':
+    nBands = 50
+    nRepeats = 3
+    if len(sys.argv) > 1:
+        nBands = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        nRepeats = int(sys.argv[2])
+
+    n = Nansat(os.path.join(ntd.test_data_path, 'gcps.tif'), logLevel=40)
+    array = n[1].astype(np.float32)
+    for i in range(n.vrt.dataset.RasterCount, nBands):
+        n.add_band(array, parameters={'name': 'band_%03d' % i})
+    bandNums = range(2, n.vrt.dataset.RasterCount + 1)
+    fileName = os.path.join(ntd.tmp_data_path, 'benchmark_export.nc')
+
+    tBandByBand = min_time(lambda: delete_band_by_band(n, bandNums),
+                           nRepeats)
+    tTransaction = min_time(lambda: delete_bands(n, bandNums), nRepeats)
+    tExport = min_time(lambda: n.export(fileName, bands=[1]), nRepeats)
+
+    print 'Number of bands: %d' % n.vrt.dataset.RasterCount
+    print '%-40s %10.3f s' % ('delete bands one by one', tBandByBand)
+    print '%-40s %10.3f s' % ('delete bands in one transaction',
+                              tTransaction)
+    print '%-40s %10.3f s' % ('export(bands=[1])', tExport)
+    print 'Speedup of deleting bands: %.1f' % (tBandByBand / tTransaction)
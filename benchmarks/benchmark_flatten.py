@@ -0,0 +1,74 @@
+#-------------------------------------------------------------------------------
+# Name:         benchmark_flatten.py
+# Purpose:      Measure latency of block reads against depth of VRT chain
+#               with and without flattening
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#-------------------------------------------------------------------------------
+''' Usage: python benchmark_flatten.py [maxDepth] [nRepeats]
+
+Creates a Nansat object with a 2000 x 2000 band, crops it 1 pixel from each
+side several times (each crop adds two VRTs to the chain) and measures time
+of reading 256 x 256 blocks of the band:
+* from self.vrt
+* from the flattened VRT (Nansat(..., flattenVRT=True))
+The time of flattening is given separately.
+'''
+import sys
+import time
+
+import numpy as np
+
+from nansat import Nansat, Domain
+
+
+def min_time(function, nRepeats):
+    ''' Return minimum time of calling the function '''
+    times = []
+    for i in range(nRepeats):
+        t0 = time.time()
+        function()
+        times.append(time.time() - t0)
+
+    return min(times)
+
+
+def read_blocks(n, nBlocks=16):
+    ''' Read blocks from the first band '''
+    for i in range(nBlocks):
+        n[1, (i * 100):(i * 100 + 256), 256:512]
+
+
+if __name__ == '__main__':
+    maxDepth = 10
+    nRepeats = 3
+    if len(sys.argv) > 1:
+        maxDepth = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        nRepeats = int(sys.argv[2])
+
+    d = Domain(4326, '-te 0 0 20 20 -ts 2000 2000')
+    array = np.random.randn(2000, 2000).astype(np.float32)
+
+    print '%5s %8s %12s %12s %12s' % ('crops', 'VRTs', 'chain, s',
+                                      'flat, s', 'flatten, s')
+    for depth in range(maxDepth + 1):
+        n = Nansat(domain=d, array=array, logLevel=40)
+        nFlat = Nansat(domain=d, array=array, logLevel=40, flattenVRT=True)
+        for i in range(depth):
+            n.crop(1, 1, 1998 - i * 2, 1998 - i * 2)
+            nFlat.crop(1, 1, 1998 - i * 2, 1998 - i * 2)
+
+        t0 = time.time()
+        nFlat._get_read_vrt()
+        tFlatten = time.time() - t0
+        tChain = min_time(lambda: read_blocks(n), nRepeats)
+        tFlat = min_time(lambda: read_blocks(nFlat), nRepeats)
+
+        nVRTs = len(repr(n.vrt).split('=>'))
+        print '%5d %8d %12.4f %12.4f %12.4f' % (depth, nVRTs, tChain, tFlat,
+                                               tFlatten)
@@ -0,0 +1,147 @@
+#-------------------------------------------------------------------------------
+# Name:         benchmark_node.py
+# Purpose:      Measure time of parsing and querying large XML files with Node
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#-------------------------------------------------------------------------------
+''' Usage: python benchmark_node.py [annotation.xml] [nRepeats]
+
+Measures time of:
+* parsing a Sentinel-1 annotation file with xml.dom.minidom (what the
+  previous Node implementation did before converting the DOM to Nodes)
+* Node.create()
+* reading the geolocation grid as in mapper_s1a_l1
+* reading all calibration vectors as in mapper_s1a_l1.get_LUT_VRTs
+* Node.insert() into a band of a VRT with many bands
+
+If no annotation file is given, an XML file of similar size and structure
+(IW GRD annotation with calibration vectors appended, about 7 MB) is
+generated.
+'''
+import sys
+import time
+import xml.dom.minidom as xdm
+
+from nansat.node import Node
+
+
+def min_time(function, nRepeats):
+    ''' Return minimum time of calling the function '''
+    times = []
+    for i in range(nRepeats):
+        t0 = time.time()
+        function()
+        times.append(time.time() - t0)
+
+    return min(times)
+
+
+def make_annotation(nLines=10, nPixels=21, nVectors=30, nValues=1300):
+    ''' Generate XML similar to S1 IW GRD annotation and calibration '''
+    xml = ['<?xml version="1.0" encoding="UTF-8"?>\n<product>\n'
+           '  <adsHeader><polarisation>VV</polarisation></adsHeader>\n'
+           '  <generalAnnotation><productInformation><pass>Ascending</pass>'
+           '</productInformation></generalAnnotation>\n'
+           '  <geolocationGrid>\n'
+           '    <geolocationGridPointList count="%d">\n' % (nLines * nPixels)]
+    for line in range(nLines):
+        for pixel in range(nPixels):
+            xml.append('      <geolocationGridPoint>\n'
+                       '        <azimuthTime>2014-10-10T05:56:32.1</azimuthTime>\n'
+                       '        <slantRangeTime>5.3e-03</slantRangeTime>\n'
+                       '        <line>%d</line>\n'
+                       '        <pixel>%d</pixel>\n'
+                       '        <latitude>%f</latitude>\n'
+                       '        <longitude>%f</longitude>\n'
+                       '        <height>0</height>\n'
+                       '        <incidenceAngle>%f</incidenceAngle>\n'
+                       '        <elevationAngle>29.1</elevationAngle>\n'
+                       '      </geolocationGridPoint>\n'
+                       % (line * 1000, pixel * 1250, 60 + line * 0.1,
+                          10 + pixel * 0.1, 30 + pixel * 0.7))
+    xml.append('    </geolocationGridPointList>\n  </geolocationGrid>\n'
+               '  <calibrationVectorList count="%d">\n' % nVectors)
+    pixels = ' '.join(str(i * 20) for i in range(nValues))
+    values = ' '.join('%.6e' % (500 + i * 0.01) for i in range(nValues))
+    for line in range(nVectors):
+        xml.append('    <calibrationVector>\n'
+                   '      <azimuthTime>2014-10-10T05:56:32.1</azimuthTime>\n'
+                   '      <line>%d</line>\n'
+                   '      <pixel count="%d">%s</pixel>\n'
+                   '      <sigmaNought count="%d">%s</sigmaNought>\n'
+                   '      <betaNought count="%d">%s</betaNought>\n'
+                   '      <gamma count="%d">%s</gamma>\n'
+                   '      <dn count="%d">%s</dn>\n'
+                   '    </calibrationVector>\n'
+                   % ((line * 1000, nValues, pixels) + (nValues, values) * 4))
+    xml.append('  </calibrationVectorList>\n</product>\n')
+    return ''.join(xml)
+
+
+def make_vrt(nBands=200):
+    ''' Generate XML of a VRT with many bands '''
+    xml = ['<VRTDataset rasterXSize="1000" rasterYSize="1000">']
+    for band in range(1, nBands + 1):
+        xml.append('<VRTRasterBand dataType="Float32" band="%d">'
+                   '<ComplexSource><SourceFilename>/vsimem/a.vrt'
+                   '</SourceFilename><SourceBand>%d</SourceBand>'
+                   '<SrcRect xOff="0" yOff="0" xSize="1000" ySize="1000"/>'
+                   '<DstRect xOff="0" yOff="0" xSize="1000" ySize="1000"/>'
+                   '</ComplexSource></VRTRasterBand>' % (band, band))
+    xml.append('</VRTDataset>')
+    return ''.join(xml)
+
+
+def read_geolocation_grid(xml):
+    ''' Read the geolocation grid as in mapper_s1a_l1 '''
+    pointList = xml.node('geolocationGrid').children[0]
+    for gridPoint in pointList.children:
+        (int(gridPoint['pixel']), int(gridPoint['line']),
+         float(gridPoint['longitude']), float(gridPoint['latitude']),
+         float(gridPoint['incidenceAngle']))
+
+
+def read_calibration(xml):
+    ''' Read calibration vectors as in mapper_s1a_l1.get_LUT_VRTs '''
+    for vec in xml.node('calibrationVectorList').children:
+        map(int, vec['pixel'].split())
+        int(vec['line'])
+        map(float, vec['sigmaNought'].split())
+
+
+def insert_sources(vrt):
+    ''' Add a source into each band as in VRT.get_shifted_vrt '''
+    for i in range(len(vrt.nodeList('VRTRasterBand'))):
+        node1 = vrt.node('VRTRasterBand', i)
+        cloneNode = node1.node('ComplexSource').copy()
+        vrt.replaceNode('VRTRasterBand', i, node1.insert(cloneNode))
+
+
+if __name__ == '__main__':
+    nRepeats = 3
+    if len(sys.argv) > 1:
+        annotation = open(sys.argv[1]).read()
+    else:
+        annotation = make_annotation()
+    if len(sys.argv) > 2:
+        nRepeats = int(sys.argv[2])
+
+    xml = Node.create(annotation)
+    vrtXML = make_vrt()
+
+    tMinidom = min_time(lambda: xdm.parseString(annotation), nRepeats)
+    tCreate = min_time(lambda: Node.create(annotation), nRepeats)
+    tGrid = min_time(lambda: read_geolocation_grid(xml), nRepeats)
+    tCalibration = min_time(lambda: read_calibration(xml), nRepeats)
+    tInsert = min_time(lambda: insert_sources(Node.create(vrtXML)), nRepeats)
+
+    print 'Size of annotation XML: %.1f MB' % (len(annotation) / 1e6)
+    print '%-40s %10.3f s' % ('minidom.parseString', tMinidom)
+    print '%-40s %10.3f s' % ('Node.create', tCreate)
+    print '%-40s %10.3f s' % ('read geolocation grid', tGrid)
+    print '%-40s %10.3f s' % ('read calibration vectors', tCalibration)
+    print '%-40s %10.3f s' % ('insert source into 200 VRT bands', tInsert)
@@ -0,0 +1,82 @@
+#-------------------------------------------------------------------------------
+# Name:         benchmark_open.py
+# Purpose:      Measure time of opening test files with automatic mapper
+#               selection with and without the mapper index
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#-------------------------------------------------------------------------------
+''' Usage: python benchmark_open.py [nRepeats]
+
+Opens every file from the mapper test archive (see
+mapper_tests/mapper_test_archive.py) with automatically selected mapper:
+first trying all mappers (as without MapperIndex) and then trying only
+mappers selected by the match rules. Prints open latency per file and the
+number of tried mappers.
+'''
+import sys
+import time
+
+import nansat.nansat
+from nansat import Nansat
+from nansat.nansat import _import_mappers
+from nansat.mapperindex import MapperIndex
+from nansat.tools import gdal
+from mapper_tests.mapper_test_archive import DataForTestingMappers
+
+
+def open_time(fileName, mapperIndex, nRepeats):
+    ''' Return minimum time of opening file with given mapper index '''
+    nansat.nansat.nansatMapperIndex = mapperIndex
+    times = []
+    for i in range(nRepeats):
+        t0 = time.time()
+        n = Nansat(fileName, logLevel=40)
+        times.append(time.time() - t0)
+        n = None
+
+    return min(times)
+
+
+if __name__ == '__main__':
+    nRepeats = 3
+    if len(sys.argv) > 1:
+        nRepeats = int(sys.argv[1])
+
+    testData = DataForTestingMappers()
+    testData.download_all_test_data()
+
+    mappers = _import_mappers(logLevel=40)
+    nansat.nansat.nansatMappers = mappers
+    allMappers = MapperIndex(mappers, useRules=False)
+    ruleMappers = MapperIndex(mappers)
+
+    print '%-60s %10s %10s %10s' % ('file', 'all, s', 'index, s',
+                                     'candidates')
+    totalAll = 0
+    totalIndex = 0
+    for mapperName in sorted(testData.mapperData):
+        for mapperFile in testData.mapperData[mapperName]:
+            try:
+                tAll = open_time(mapperFile, allMappers, nRepeats)
+                tIndex = open_time(mapperFile, ruleMappers, nRepeats)
+            except Exception as e:
+                print '%-60s failed: %s' % (mapperFile[-60:], str(e))
+                continue
+            try:
+                gdalDataset = gdal.Open(mapperFile)
+                metadata = gdalDataset.GetMetadata()
+            except RuntimeError:
+                gdalDataset, metadata = None, None
+            nCandidates = len(ruleMappers.candidates(mapperFile, gdalDataset,
+                                                     metadata))
+            totalAll += tAll
+            totalIndex += tIndex
+            print '%-60s %10.3f %10.3f %6d/%d' % (mapperFile[-60:], tAll,
+                                                  tIndex, nCandidates,
+                                                  len(mappers))
+
+    print '%-60s %10.3f %10.3f' % ('total', totalAll, totalIndex)
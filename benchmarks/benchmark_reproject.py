@@ -0,0 +1,67 @@
+#-------------------------------------------------------------------------------
+# Name:         benchmark_reproject.py
+# Purpose:      Compare time of lazy and materialized (tiled, parallel)
+#               reprojection
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#-------------------------------------------------------------------------------
+''' Usage: python benchmark_reproject.py [size] [nProcesses]
+
+Creates a Nansat object with a <size> x <size> band on a lon/lat grid,
+reprojects it onto polar stereographic grid of the same size and measures
+time of reading the reprojected band:
+* lazy: warped VRT (Nansat.reproject(d))
+* materialized, 1 process
+* materialized, <nProcesses> processes, GDAL NUM_THREADS=2
+The maximum difference from the lazy result is printed for each mode.
+'''
+import sys
+import time
+
+import numpy as np
+
+from nansat import Nansat, Domain
+
+
+def reproject_and_read(n, d, **kwargs):
+    ''' Reproject and read the first band, return time and data '''
+    n.undo(10)
+    t0 = time.time()
+    n.reproject(d, eResampleAlg=1, **kwargs)
+    data = n[1]
+    return time.time() - t0, data
+
+
+if __name__ == '__main__':
+    size = 4000
+    nProcesses = 4
+    if len(sys.argv) > 1:
+        size = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        nProcesses = int(sys.argv[2])
+
+    srcDomain = Domain(4326, '-te 0 70 40 80 -ts %d %d' % (size, size))
+    dstDomain = Domain('+proj=stere +lat_0=90 +lon_0=20 +datum=WGS84',
+                       '-te -600000 -2200000 600000 -1100000 -ts %d %d'
+                       % (size, size))
+    array = np.random.randn(size, size).astype(np.float32)
+    n = Nansat(domain=srcDomain, array=array, logLevel=40)
+
+    tLazy, dataLazy = reproject_and_read(n, dstDomain)
+    modes = [('lazy', {}),
+             ('tiled, 1 process', {'materialize': True}),
+             ('tiled, %d processes' % nProcesses,
+              {'materialize': True, 'nProcesses': nProcesses,
+               'nThreads': 2})]
+
+    print '%24s %10s %10s %12s' % ('mode', 'time, s', 'speedup', 'max diff')
+    for name, kwargs in modes:
+        t, data = reproject_and_read(n, dstDomain, **kwargs)
+        valid = np.isfinite(data) * np.isfinite(dataLazy)
+        print '%24s %10.2f %10.2f %12.6f' % (name, t, tLazy / t,
+                                             np.abs(data -
+                                                    dataLazy)[valid].max())
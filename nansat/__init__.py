@@ -34,8 +34,11 @@ except Exception as e:
 from nansat.nsr import NSR
 from nansat.domain import Domain
 from nansat.nansat import Nansat
+from nansat.vsimem import vsimem_usage, set_vsimem_limit
+from nansat.resamplingplan import ResamplingPlan
 
-__all__ = ['NSR', 'Domain', 'Nansat']
+__all__ = ['NSR', 'Domain', 'Nansat', 'vsimem_usage', 'set_vsimem_limit',
+           'ResamplingPlan']
 
 try:
     from nansat.figure import Figure
@@ -0,0 +1,123 @@
+# Name:    arraycache.py
+# Purpose: Container of ArrayCache class
+# Created:      17.10.2026
+# Copyright:    (c) NERSC 2011 - 2026
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import collections
+if hasattr(collections, 'OrderedDict'):
+    from collections import OrderedDict
+else:
+    from ordereddict import OrderedDict
+
+
+class ArrayCache(object):
+    '''Memory-bounded LRU cache for arrays read from bands
+
+    Keys are tuples which identify the VRT, the band and the window
+    (e.g. (vrt.fileName, bandNumber, window)). Values are NumPy arrays.
+    When the total size of cached arrays exceeds <maxBytes> the least
+    recently used arrays are removed.
+
+    The cache keeps statistics:
+    * hits : number of successful lookups
+    * misses : number of failed lookups
+    * evictedBytes : total size of arrays removed to free space
+
+    '''
+    def __init__(self, maxBytes):
+        '''Create empty cache
+
+        Parameters
+        -----------
+        maxBytes : int
+            maximum total size of the cached arrays in bytes
+
+        '''
+        self.maxBytes = int(maxBytes)
+        self.nBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictedBytes = 0
+        self._arrays = OrderedDict()
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def __contains__(self, key):
+        return key in self._arrays
+
+    def get(self, key):
+        '''Get array from cache and mark it as recently used
+
+        Parameters
+        -----------
+        key : tuple
+            key of the array
+
+        Returns
+        --------
+        array : NumPy array or None, if key is not in cache
+
+        '''
+        array = self._arrays.pop(key, None)
+        if array is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._arrays[key] = array
+        return array
+
+    def put(self, key, array):
+        '''Add array to cache and remove least recently used arrays
+
+        Arrays larger than the cache are not added.
+
+        Parameters
+        -----------
+        key : tuple
+            key of the array
+        array : NumPy array
+
+        '''
+        self.remove(key)
+        if array.nbytes > self.maxBytes:
+            return
+
+        # remove least recently used arrays until the new one fits
+        while self.nBytes + array.nbytes > self.maxBytes:
+            oldKey, oldArray = self._arrays.popitem(last=False)
+            self.nBytes -= oldArray.nbytes
+            self.evictedBytes += oldArray.nbytes
+
+        self._arrays[key] = array
+        self.nBytes += array.nbytes
+
+    def remove(self, key):
+        '''Remove array with given key (if any) from the cache'''
+        array = self._arrays.pop(key, None)
+        if array is not None:
+            self.nBytes -= array.nbytes
+
+    def clear(self):
+        '''Remove all arrays from the cache'''
+        self._arrays.clear()
+        self.nBytes = 0
+
+    def stats(self):
+        '''Return dictionary with statistics of the cache'''
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictedBytes': self.evictedBytes,
+                'nBytes': self.nBytes,
+                'maxBytes': self.maxBytes,
+                'count': len(self._arrays)}
@@ -0,0 +1,185 @@
+# Name:    datasetpool.py
+# Purpose: Container of DatasetPool class
+# Created:      17.10.2026
+# Copyright:    (c) NERSC 2011 - 2026
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import collections
+import os
+from contextlib import contextmanager
+if hasattr(collections, 'OrderedDict'):
+    from collections import OrderedDict
+else:
+    from ordereddict import OrderedDict
+
+from nansat.tools import gdal
+
+
+class DatasetPool(object):
+    '''Pool of read-only GDAL dataset handles with reference counts
+
+    Datasets are opened with gdal.Open() once per file name and shared
+    between all borrowers. A dataset is in use while its reference count is
+    above zero and is never closed then. Datasets which are not in use are
+    kept open for reuse, but not more than <maxSize> of them: the least
+    recently used are closed first.
+
+    The pool counts the actual calls of gdal.Open() in <nOpens>.
+
+    Datasets from the pool must not be modified. Files on disk are pooled
+    by absolute path together with their modification time and size: if a
+    file is rewritten, the next acquire() opens it again (borrowers of the
+    old dataset keep their handles). The same is done for subdatasets
+    (e.g. 'NETCDF:"file.nc":var') if the file name can be found in the
+    subdataset name. Other files which are changed after opening (e.g. VRT
+    files in /vsimem) should be discarded from the pool.
+
+    '''
+    def __init__(self, maxSize=32):
+        '''Create empty pool
+
+        Parameters
+        -----------
+        maxSize : int
+            maximum number of open datasets which are not in use
+
+        '''
+        self.maxSize = int(maxSize)
+        self.nOpens = 0
+        self._datasets = OrderedDict()
+        self._counts = {}
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._datasets)
+
+    def __contains__(self, fileName):
+        return self._key(fileName) in self._datasets
+
+    def _key(self, fileName):
+        '''Get key of dataset in the pool (absolute path of files on disk)'''
+        if os.path.isfile(fileName):
+            return os.path.abspath(fileName)
+        return fileName
+
+    def _signature(self, fileName):
+        '''Get modification time and size of the file or of the file of
+        the subdataset (None for other datasets)'''
+        for name in [fileName] + fileName.split(':'):
+            name = name.strip('"')
+            if name and os.path.isfile(name):
+                stat = os.stat(name)
+                return (name, stat.st_mtime, stat.st_size)
+        return None
+
+    def acquire(self, fileName):
+        '''Get dataset from the pool and increase its reference count
+
+        Parameters
+        -----------
+        fileName : str
+            name of the file or of the subdataset
+
+        Returns
+        --------
+        dataset : gdal.Dataset
+            or None if the file cannot be opened
+
+        '''
+        key = self._key(fileName)
+        signature = self._signature(fileName)
+        dataset = self._datasets.pop(key, None)
+        if dataset is None or signature != self._signatures.get(key):
+            # not open yet or the file was changed after opening
+            self.nOpens += 1
+            dataset = None
+            try:
+                dataset = gdal.Open(fileName)
+            finally:
+                if dataset is None:
+                    self._remove(key)
+            if dataset is None:
+                return None
+            self._signatures[key] = signature
+            self._counts.setdefault(key, 0)
+        self._datasets[key] = dataset
+        self._counts[key] += 1
+
+        return dataset
+
+    def get(self, fileName):
+        '''Get dataset from the pool without holding it
+
+        The dataset stays in the pool for reuse (e.g. by VRT._create_band())
+        until it is closed as least recently used.
+
+        '''
+        dataset = self.acquire(fileName)
+        self.release(fileName)
+        return dataset
+
+    def release(self, fileName):
+        '''Decrease reference count of dataset and close unused datasets'''
+        key = self._key(fileName)
+        if key not in self._counts:
+            return
+        self._counts[key] = max(self._counts[key] - 1, 0)
+        self._shrink()
+
+    @contextmanager
+    def borrow(self, fileName):
+        '''Context manager which acquires and releases dataset
+
+        Examples
+        --------
+        with datasetPool.borrow(fileName) as dataset:
+            xSize = dataset.RasterXSize
+
+        '''
+        dataset = self.acquire(fileName)
+        try:
+            yield dataset
+        finally:
+            self.release(fileName)
+
+    def discard(self, fileName):
+        '''Remove dataset from the pool (e.g. if the file was changed)
+
+        Borrowers which still use the dataset keep their handles.
+
+        '''
+        self._remove(self._key(fileName))
+
+    def clear(self):
+        '''Close all datasets which are not in use'''
+        for key in list(self._datasets):
+            if self._counts[key] == 0:
+                self._remove(key)
+
+    def _remove(self, key):
+        '''Remove dataset from the pool by key'''
+        self._datasets.pop(key, None)
+        self._counts.pop(key, None)
+        self._signatures.pop(key, None)
+
+    def _shrink(self):
+        '''Close least recently used datasets which are not in use'''
+        nUnused = sum(1 for count in self._counts.values() if count == 0)
+        for key in list(self._datasets):
+            if nUnused <= self.maxSize:
+                break
+            if self._counts[key] == 0:
+                self._remove(key)
+                nUnused -= 1
+
+
+# process-local pool used by VRT, mappers and Mosaic
+datasetPool = DatasetPool()
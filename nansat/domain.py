@@ -21,6 +21,7 @@ import string
 from xml.etree.ElementTree import ElementTree
 
 import numpy as np
+from scipy.interpolate import RectBivariateSpline
 import matplotlib.pyplot as plt
 from mpl_toolkits.basemap import Basemap
 from matplotlib.patches import Polygon
@@ -369,7 +370,9 @@ class Domain(object):
         kmlFile.write('</kml>')
         kmlFile.close()
 
-    def get_geolocation_grids(self, stepSize=1):
+    def get_geolocation_grids(self, stepSize=1, tiePointStep=None,
+                              accuracy=None, interpolation='linear',
+                              returnError=False):
         '''Get longitude and latitude grids representing the full data grid
 
         If GEOLOCATION is not present in the self.vrt.dataset then grids
@@ -377,10 +380,25 @@ class Domain(object):
         If GEOLOCATION is present in the self.vrt.dataset then grids are read
         from the geolocation bands.
 
+        If <tiePointStep> or <accuracy> is given, only pixel/line of a sparse
+        grid of tie-points are converted into lat/lon and the grids are
+        interpolated to the output size block by block (see
+        _interpolate_geolocation_grids()).
+
         Parameters
         -----------
         stepSize : int
             Reduction factor if output is desired on a reduced grid size
+        tiePointStep : int
+            Distance between tie-points (in pixels of the full data grid)
+        accuracy : float
+            Maximum acceptable error of interpolation (degrees). The
+            distance between tie-points is halved (starting from
+            <tiePointStep> or 64) until the error is below <accuracy>.
+        interpolation : str
+            'linear' (bilinear) or 'cubic' (bicubic splines)
+        returnError : bool
+            Return also the maximum error of interpolation (degrees)
 
         Returns
         --------
@@ -388,25 +406,121 @@ class Domain(object):
             grid with longitudes
         latitude : numpy array
             grid with latitudes
+        error : float
+            maximum error of interpolation (if <returnError> is True).
+            Estimated in the centers of tie-point cells, 0 for exact grids
         '''
 
-        X = range(0, self.vrt.dataset.RasterXSize, stepSize)
-        Y = range(0, self.vrt.dataset.RasterYSize, stepSize)
-        Xm, Ym = np.meshgrid(X, Y)
+        X = np.arange(0, self.vrt.dataset.RasterXSize, stepSize)
+        Y = np.arange(0, self.vrt.dataset.RasterYSize, stepSize)
+        error = 0.
 
         if len(self.vrt.geolocationArray.d) > 0:
             # if the vrt dataset has geolocationArray
             # read lon,lat grids from geolocationArray
             lon, lat = self.vrt.geolocationArray.get_geolocation_grids()
-            longitude, latitude = lon[Ym, Xm], lat[Ym, Xm]
-        else:
+            longitude, latitude = lon[np.ix_(Y, X)], lat[np.ix_(Y, X)]
+        elif tiePointStep is None and accuracy is None:
             # generate lon,lat grids using GDAL Transformer
-            lonVec, latVec = self.transform_points(Xm.flatten(), Ym.flatten())
-            longitude = lonVec.reshape(Xm.shape)
-            latitude = latVec.reshape(Xm.shape)
-
+            Xm, Ym = np.meshgrid(X, Y)
+            longitude, latitude = self.vrt.transform_arrays(Xm, Ym)
+        else:
+            # interpolate lon,lat grids from tie-points
+            tiePointStep = tiePointStep or 64
+            while True:
+                longitude, latitude, error = (
+                    self._interpolate_geolocation_grids(X, Y, tiePointStep,
+                                                        interpolation))
+                if (accuracy is None or error <= accuracy or
+                        tiePointStep <= stepSize):
+                    break
+                tiePointStep //= 2
+            self.logger.debug('Geolocation grids interpolated from '
+                              'tie-points every %d pixels, error: %f' %
+                              (tiePointStep, error))
+
+        if returnError:
+            return longitude, latitude, error
         return longitude, latitude
 
+    def _interpolate_geolocation_grids(self, X, Y, tiePointStep,
+                                       interpolation='linear',
+                                       blockSize=2 ** 22):
+        '''Interpolate lon/lat grids from a sparse grid of tie-points
+
+        Pixel/line of tie-points are converted into lon/lat with one call
+        of the transformer and lon/lat grids are interpolated in blocks of
+        rows with about <blockSize> pixels. Longitudes crossing the
+        dateline are interpolated in range 0 - 360.
+
+        Parameters
+        -----------
+        X, Y : 1D numpy arrays
+            columns and rows of the output grids
+        tiePointStep : int
+            distance between tie-points (pixels)
+        interpolation : str
+            'linear' or 'cubic'
+        blockSize : int
+            approximate number of pixels interpolated at once
+
+        Returns
+        --------
+        longitude, latitude : 2D numpy arrays
+        error : float
+            maximum difference between interpolated and transformed lon/lat
+            in the centers of tie-point cells
+
+        '''
+        # tie-points cover the output grid including the last row/column
+        tieX = np.unique(np.append(np.arange(X[0], X[-1], tiePointStep),
+                                   X[-1])).astype('float64')
+        tieY = np.unique(np.append(np.arange(Y[0], Y[-1], tiePointStep),
+                                   Y[-1])).astype('float64')
+        tieLon, tieLat = self.vrt.transform_arrays(*np.meshgrid(tieX, tieY))
+
+        lonOffset = 0
+        if tieLon.max() - tieLon.min() > 180:
+            # dateline is crossed
+            tieLon = tieLon % 360
+            lonOffset = 180
+
+        # splines of lon/lat (degree is reduced for too few tie-points)
+        order = {'linear': 1, 'cubic': 3}[interpolation]
+        kx = min(order, len(tieY) - 1)
+        ky = min(order, len(tieX) - 1)
+        if kx == 0 or ky == 0:
+            # grid with one row or column
+            longitude, latitude = self.vrt.transform_arrays(*np.meshgrid(X,
+                                                                         Y))
+            return longitude, latitude, 0.
+        lonSpline = RectBivariateSpline(tieY, tieX, tieLon, kx=kx, ky=ky)
+        latSpline = RectBivariateSpline(tieY, tieX, tieLat, kx=kx, ky=ky)
+
+        # interpolate block by block
+        longitude = np.empty((len(Y), len(X)))
+        latitude = np.empty((len(Y), len(X)))
+        nRows = max(1, blockSize // len(X))
+        for row0 in range(0, len(Y), nRows):
+            rows = slice(row0, row0 + nRows)
+            longitude[rows] = lonSpline(Y[rows], X)
+            latitude[rows] = latSpline(Y[rows], X)
+
+        # estimate error in centers of tie-point cells
+        midX = (tieX[1:] + tieX[:-1]) / 2.
+        midY = (tieY[1:] + tieY[:-1]) / 2.
+        midLon, midLat = self.vrt.transform_arrays(*np.meshgrid(midX, midY))
+        if lonOffset:
+            midLon = midLon % 360
+        lonError = np.abs(lonSpline(midY, midX) - midLon)
+        latError = np.abs(latSpline(midY, midX) - midLat)
+        error = float(np.nanmax([np.nanmax(lonError), np.nanmax(latError)]))
+
+        if lonOffset:
+            longitude = (longitude + lonOffset) % 360 - lonOffset
+
+        return longitude, latitude, error
+
     def _convert_extentDic(self, dstSRS, extentDic):
         '''Convert -lle option (lat/lon) to -te (proper coordinate system)
 
@@ -865,7 +979,7 @@ class Domain(object):
         '''
         return self.vrt.transform_points(colVector, rowVector, DstToSrc)
 
-    def azimuth_y(self, reductionFactor=1):
+    def azimuth_y(self, reductionFactor=1, tiePointStep=None):
         '''Calculate the azimuth of 'upward' direction in each pixel
 
         Generaly speaking, azimuth is angle from the reference vector
@@ -882,6 +996,9 @@ class Domain(object):
         -----------
         reductionFactor : integer
             factor by which the size of the output array is reduced
+        tiePointStep : integer
+            distance between tie-points for interpolation of lon/lat grids
+            (see get_geolocation_grids())
 
         Returns
         -------
@@ -890,7 +1007,8 @@ class Domain(object):
 
         '''
 
-        lon, lat = self.get_geolocation_grids(reductionFactor)
+        lon, lat = self.get_geolocation_grids(reductionFactor,
+                                              tiePointStep=tiePointStep)
         a = initial_bearing(lon[1:, :], lat[1:, :],
                             lon[:-1:, :], lat[:-1:, :])
         # Repeat last row once to match size of lon-lat grids
@@ -0,0 +1,286 @@
+# Name:    expression.py
+# Purpose: Parsing and evaluation of band expressions
+# Created:      17.10.2026
+# Copyright:    (c) NERSC 2011 - 2026
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+'''Band expressions (metadata 'expression' of a band)
+
+An expression is parsed once (see parse()) into a tree of operations and
+evaluated with NumPy ufuncs. Only the following is allowed:
+* numbers and constants pi, e, nan, inf (also as np.pi, etc.)
+* arithmetic operators + - * / // % ** and comparisons
+* calls of whitelisted ufuncs (see UFUNCS): np.power(10., x), sqrt(x)
+* references to bands by name or number: self["chlor_a_log"], self[1]
+* bandData : data of the band which has the expression
+
+Examples
+--------
+'np.power(10., self["chlor_a_1_log"])'
+'self["nLw_555"] / 1.85 / (0.52 + 1.7 * self["nLw_555"] / 1.85)'
+
+'''
+from __future__ import absolute_import
+import ast
+
+import numpy as np
+
+from nansat.tools import OptionError
+
+# names of NumPy ufuncs which can be called in expressions
+UFUNCS = set(['absolute', 'abs', 'add', 'arccos', 'arccosh', 'arcsin',
+              'arcsinh', 'arctan', 'arctan2', 'arctanh', 'ceil', 'cos',
+              'cosh', 'deg2rad', 'degrees', 'divide', 'exp', 'exp2', 'expm1',
+              'floor', 'fmax', 'fmin', 'fmod', 'hypot', 'isfinite', 'isnan',
+              'log', 'log10', 'log1p', 'log2', 'logical_and', 'logical_not',
+              'logical_or', 'maximum', 'minimum', 'mod', 'multiply',
+              'negative', 'power', 'rad2deg', 'radians', 'sign', 'sin',
+              'sinh', 'sqrt', 'square', 'subtract', 'tan', 'tanh',
+              'true_divide'])
+# names of constants
+CONSTANTS = {'pi': np.pi, 'e': np.e, 'nan': np.nan, 'inf': np.inf}
+# names of NumPy module in expressions
+_numpyNames = ['np', 'numpy']
+
+_binaryOps = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply,
+              ast.Div: np.true_divide, ast.FloorDiv: np.floor_divide,
+              ast.Mod: np.mod, ast.Pow: np.power}
+_unaryOps = {ast.USub: np.negative, ast.Not: np.logical_not}
+_compareOps = {ast.Gt: np.greater, ast.GtE: np.greater_equal,
+               ast.Lt: np.less, ast.LtE: np.less_equal,
+               ast.Eq: np.equal, ast.NotEq: np.not_equal}
+
+# parsed expressions by text
+_expressions = {}
+
+
+def parse(text):
+    '''Get parsed expression (each text is parsed only once)
+
+    Parameters
+    -----------
+    text : str
+        expression
+
+    Returns
+    --------
+    expression : Expression
+
+    '''
+    if text not in _expressions:
+        _expressions[text] = Expression(text)
+    return _expressions[text]
+
+
+class Expression(object):
+    '''Parsed band expression
+
+    The expression is converted into a tree of tuples:
+    ('value', number), ('band', bandID, leafNumber),
+    ('bandData', leafNumber), ('ufunc', ufunc, [args], nodeNumber)
+
+    Attributes
+    -----------
+    text : str
+        the expression
+    bands : list
+        names or numbers of bands referenced in the expression
+    usesBandData : bool
+        is data of the band with the expression used?
+
+    '''
+    def __init__(self, text):
+        self.text = text
+        self.bands = []
+        self.usesBandData = False
+        self._nNodes = 0
+        try:
+            tree = ast.parse(text.strip(), mode='eval')
+        except SyntaxError as e:
+            raise OptionError('Cannot parse expression %s: %s' % (text, e))
+        self._root = self._compile(tree.body)
+
+    def __repr__(self):
+        return 'Expression(%s)' % repr(self.text)
+
+    def _error(self, node, message='is not allowed'):
+        raise OptionError('%s %s in expression %s' %
+                          (type(node).__name__, message, self.text))
+
+    def _next_number(self):
+        self._nNodes += 1
+        return self._nNodes
+
+    def _compile(self, node):
+        '''Convert AST node into tuple (see Expression)'''
+        if isinstance(node, ast.Num):
+            return ('value', node.n)
+        if isinstance(node, ast.Name):
+            if node.id == 'bandData':
+                self.usesBandData = True
+                return ('bandData', self._next_number())
+            if node.id in CONSTANTS:
+                return ('value', CONSTANTS[node.id])
+            self._error(node, '%s is not allowed' % node.id)
+        if isinstance(node, ast.Attribute):
+            if (isinstance(node.value, ast.Name) and
+                    node.value.id in _numpyNames and
+                    node.attr in CONSTANTS):
+                return ('value', CONSTANTS[node.attr])
+            self._error(node)
+        if isinstance(node, ast.Subscript):
+            return self._compile_band(node)
+        if isinstance(node, ast.BinOp) and type(node.op) in _binaryOps:
+            return self._ufunc(_binaryOps[type(node.op)],
+                               [node.left, node.right])
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.UAdd):
+                return self._compile(node.operand)
+            if type(node.op) in _unaryOps:
+                return self._ufunc(_unaryOps[type(node.op)], [node.operand])
+        if (isinstance(node, ast.Compare) and len(node.ops) == 1 and
+                type(node.ops[0]) in _compareOps):
+            return self._ufunc(_compareOps[type(node.ops[0])],
+                               [node.left, node.comparators[0]])
+        if isinstance(node, ast.Call):
+            return self._compile_call(node)
+        self._error(node)
+
+    def _compile_band(self, node):
+        '''Compile reference to a band: self["name"] or self[number]'''
+        if not (isinstance(node.value, ast.Name) and
+                node.value.id == 'self' and
+                isinstance(node.slice, ast.Index)):
+            self._error(node)
+        index = node.slice.value
+        if isinstance(index, ast.Str):
+            bandID = str(index.s)
+        elif isinstance(index, ast.Num) and isinstance(index.n, int):
+            bandID = index.n
+        else:
+            self._error(node, 'with this band ID is not allowed')
+        self.bands.append(bandID)
+        return ('band', bandID, self._next_number())
+
+    def _compile_call(self, node):
+        '''Compile call of a whitelisted ufunc: np.sqrt(x) or sqrt(x)'''
+        func = node.func
+        if (isinstance(func, ast.Attribute) and
+                isinstance(func.value, ast.Name) and
+                func.value.id in _numpyNames):
+            name = func.attr
+        elif isinstance(func, ast.Name):
+            name = func.id
+        else:
+            self._error(node)
+        if (name not in UFUNCS or node.keywords or
+                getattr(node, 'starargs', None) or
+                getattr(node, 'kwargs', None)):
+            self._error(node, 'of %s is not allowed' % name)
+        ufunc = getattr(np, name)
+        if len(node.args) != ufunc.nin:
+            self._error(node, 'of %s with %d arguments is not allowed' %
+                        (name, len(node.args)))
+        return self._ufunc(ufunc, node.args)
+
+    def _ufunc(self, ufunc, args):
+        return ('ufunc', ufunc, [self._compile(arg) for arg in args],
+                self._next_number())
+
+    def evaluate(self, read_band, read_band_data=None, buffers=None,
+                 shape=None):
+        '''Compute the expression
+
+        Data of the bands is read with the given functions. Arrays read
+        from bands and results of operations are reused for results of
+        next operations if shape and data type allow it. If <buffers> is
+        given, the arrays are kept there and reused in the next call
+        (e.g. for the next window of the same size).
+
+        Parameters
+        -----------
+        read_band : function
+            read_band(bandID, out) returns data of band <bandID>, read into
+            array <out> (if not None)
+        read_band_data : function
+            read_band_data(out) returns data of the band with the expression
+        buffers : dict, optional
+            arrays reused between calls
+        shape : tuple, optional
+            shape of data read from bands. Buffers of another shape (e.g.
+            from a larger previous window) are dropped
+
+        Returns
+        --------
+        result : numpy array or scalar
+            result of the expression (may be one of <buffers>)
+
+        '''
+        if buffers is None:
+            buffers = {}
+        if shape is not None:
+            for key in list(buffers):
+                if buffers[key].shape != tuple(shape):
+                    del buffers[key]
+        return self._evaluate(self._root, read_band, read_band_data,
+                              buffers)[0]
+
+    def _evaluate(self, node, read_band, read_band_data, buffers):
+        '''Compute value of a node
+
+        Returns
+        --------
+        value : numpy array or scalar
+        isTemporary : bool
+            can the array be overwritten?
+
+        '''
+        if node[0] == 'value':
+            return node[1], False
+
+        if node[0] in ['band', 'bandData']:
+            out = buffers.get(node[-1])
+            if node[0] == 'band':
+                data = read_band(node[1], out)
+            else:
+                data = read_band_data(out)
+            buffers[node[-1]] = data
+            return data, True
+
+        ufunc, argNodes, nodeNumber = node[1:]
+        args = []
+        temporary = []
+        for argNode in argNodes:
+            arg, isTemporary = self._evaluate(argNode, read_band,
+                                              read_band_data, buffers)
+            args.append(arg)
+            if isTemporary:
+                temporary.append(arg)
+        # write result into an argument or into the buffer of the node
+        out = buffers.get(nodeNumber)
+        if temporary:
+            # data type of result (scalars keep their casting rules)
+            dtype = ufunc(*[arg.flat[:1] if isinstance(arg, np.ndarray)
+                            else arg for arg in args]).dtype
+            shape = np.broadcast(*args).shape
+            for arg in temporary:
+                if arg.shape == shape and arg.dtype == dtype:
+                    out = arg
+                    break
+            if out is not None and (out.shape != shape or
+                                    out.dtype != dtype):
+                out = None
+        if out is None:
+            result = ufunc(*args)
+        else:
+            result = ufunc(*(args + [out]))
+        if isinstance(result, np.ndarray) and result is not out:
+            buffers[nodeNumber] = result
+        return result, isinstance(result, np.ndarray)
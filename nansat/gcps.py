@@ -0,0 +1,257 @@
+# Name:    gcps.py
+# Purpose: Vectorized operations on ground control points (GCPs)
+# Created:      17.10.2026
+# Copyright:    (c) NERSC 2011 - 2026
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+'''GCPs as NumPy structured arrays
+
+GCPs are kept in 1D arrays with fields pixel, line, x, y, z, info and id
+(see GCP_DTYPE). All operations (creation from grids, subsetting,
+transformation) work on the whole array. GDAL GCP objects are created only
+when GCPs are set into a dataset (see to_gdal()).
+
+GCPs are stored in metadata (e.g. by Nansat.export()) as base64 encoded
+little-endian float64 arrays (see to_metadata() and from_metadata()).
+
+'''
+from __future__ import absolute_import
+import base64
+
+import numpy as np
+
+from nansat.nsr import NSR
+from nansat.tools import gdal, osr
+
+GCP_DTYPE = np.dtype([('pixel', 'f8'), ('line', 'f8'),
+                      ('x', 'f8'), ('y', 'f8'), ('z', 'f8'),
+                      ('info', 'O'), ('id', 'O')])
+
+# encoding of GCPs in metadata (name and version)
+METADATA_ENCODING = 'base64-float64-le:1'
+# names of GCP coordinates in metadata of the old text format
+_metadataTextNames = ['GCPPixel', 'GCPLine', 'GCPX', 'GCPY']
+
+
+def create(pixel, line, x, y, z=0, info='', ids=None):
+    '''Create array of GCPs from arrays of coordinates
+
+    Parameters
+    -----------
+    pixel, line, x, y, z : numpy arrays or scalars
+        coordinates of GCPs. Arrays are broadcasted and flattened
+    info : str
+        value of Info of all GCPs
+    ids : list or None
+        values of Id. If None, GCPs are numbered from 1
+
+    Returns
+    --------
+    gcps : numpy array with GCP_DTYPE
+
+    '''
+    pixel, line, x, y, z = np.broadcast_arrays(pixel, line, x, y, z)
+    gcps = np.zeros(pixel.size, GCP_DTYPE)
+    gcps['pixel'] = pixel.flat
+    gcps['line'] = line.flat
+    gcps['x'] = x.flat
+    gcps['y'] = y.flat
+    gcps['z'] = z.flat
+    gcps['info'] = info
+    if ids is None:
+        ids = [str(i + 1) for i in range(gcps.size)]
+    gcps['id'] = ids
+    return gcps
+
+
+def from_grids(x, y, rows, cols, pixelOffset=0, pixelStep=1,
+               lineOffset=0, lineStep=1):
+    '''Create GCPs from selected rows and columns of coordinate grids
+
+    Parameters
+    -----------
+    x, y : 2D numpy arrays
+        grids of X and Y coordinates (e.g. longitude and latitude)
+    rows, cols : lists or 1D numpy arrays
+        indices of rows and columns of the grids used for GCPs
+    pixelOffset, pixelStep, lineOffset, lineStep : float
+        pixel = pixelOffset + col * pixelStep,
+        line = lineOffset + row * lineStep
+
+    Returns
+    --------
+    gcps : numpy array with GCP_DTYPE (row by row)
+
+    '''
+    rows = np.asarray(rows, int)
+    cols = np.asarray(cols, int)
+    index = np.ix_(rows, cols)
+    return create(pixelOffset + cols[None, :] * pixelStep,
+                  lineOffset + rows[:, None] * lineStep,
+                  x[index], y[index], ids=[''] * (rows.size * cols.size))
+
+
+def from_gdal(gdalGCPs):
+    '''Convert list of GDAL GCPs into array'''
+    gcps = np.zeros(len(gdalGCPs), GCP_DTYPE)
+    for field, attr in [('pixel', 'GCPPixel'), ('line', 'GCPLine'),
+                        ('x', 'GCPX'), ('y', 'GCPY'), ('z', 'GCPZ'),
+                        ('info', 'Info'), ('id', 'Id')]:
+        gcps[field] = [getattr(gcp, attr) for gcp in gdalGCPs]
+    return gcps
+
+
+def to_gdal(gcps):
+    '''Create list of GDAL GCPs from array'''
+    return [gdal.GCP(float(gcp['x']), float(gcp['y']), float(gcp['z']),
+                     float(gcp['pixel']), float(gcp['line']),
+                     str(gcp['info']), str(gcp['id']))
+            for gcp in gcps]
+
+
+def transform(gcps, srcSRS, dstSRS):
+    '''Transform X, Y, Z of GCPs into another SRS
+
+    All GCPs are transformed with one call of
+    osr.CoordinateTransformation.TransformPoints.
+
+    Parameters
+    -----------
+    gcps : numpy array with GCP_DTYPE
+    srcSRS, dstSRS : proj4, WKT, NSR, EPSG
+        source and destination SRS (any NSR input)
+
+    Returns
+    --------
+    gcps : new numpy array with GCP_DTYPE
+
+    '''
+    dstGCPs = gcps.copy()
+    if gcps.size == 0:
+        return dstGCPs
+    transformer = osr.CoordinateTransformation(NSR(srcSRS), NSR(dstSRS))
+    points = np.array(transformer.TransformPoints(
+        np.column_stack([gcps['x'], gcps['y'], gcps['z']]).tolist()))
+    dstGCPs['x'] = points[:, 0]
+    dstGCPs['y'] = points[:, 1]
+    dstGCPs['z'] = points[:, 2]
+    return dstGCPs
+
+
+def valid_lonlat(gcps):
+    '''Select GCPs with valid longitude (x) and latitude (y)'''
+    valid = ((gcps['x'] >= -180) * (gcps['x'] <= 180) *
+             (gcps['y'] >= -90) * (gcps['y'] <= 90))
+    return gcps[valid]
+
+
+def crop(gcps, xOff, yOff, xSize, ySize):
+    '''Select GCPs inside a window and shift pixel/line to its origin
+
+    GCPs on the border of the window are not selected.
+
+    Returns
+    --------
+    gcps : new numpy array with GCP_DTYPE
+
+    '''
+    pixel = gcps['pixel'] - xOff
+    line = gcps['line'] - yOff
+    inside = (0 < pixel) * (pixel < xSize) * (0 < line) * (line < ySize)
+    dstGCPs = gcps[inside]
+    dstGCPs['pixel'] = pixel[inside]
+    dstGCPs['line'] = line[inside]
+    return dstGCPs
+
+
+def to_metadata(gcps, bottomup=False, chunkLength=5000):
+    '''Encode pixel, line, x, y of GCPs into metadata items
+
+    GCPs should make a regular grid (row by row), the first row is found
+    from the line of the first GCP.
+
+    Parameters
+    -----------
+    gcps : numpy array with GCP_DTYPE
+    bottomup : bool
+        if True (image is flipped) X and Y are flipped upside down
+    chunkLength : int
+        maximum length of metadata items
+
+    Returns
+    --------
+    metadata : dict
+        'GCPEncoding' => METADATA_ENCODING,
+        'GCPData_000', 'GCPData_001', ... => chunks of encoded data
+
+    '''
+    column = np.argmax(gcps['line'] != gcps['line'][0])
+    if column == 0:
+        column = gcps.size
+    row = gcps.size // column
+    gcps = gcps[:row * column]
+    x = gcps['x']
+    y = gcps['y']
+    if bottomup:
+        x = x.reshape(row, column)[::-1].flatten()
+        y = y.reshape(row, column)[::-1].flatten()
+    data = base64.b64encode(np.vstack([gcps['pixel'], gcps['line'],
+                                       x, y]).astype('<f8').tostring())
+
+    metadata = {'GCPEncoding': METADATA_ENCODING}
+    for i, start in enumerate(range(0, max(len(data), 1), chunkLength)):
+        metadata['GCPData_%03d' % i] = data[start:start + chunkLength]
+    return metadata
+
+
+def from_metadata(metadata):
+    '''Decode GCPs from metadata items
+
+    Both the encoding from to_metadata() and the old text format (items
+    GCPPixel_000, GCPLine_000, GCPX_000, GCPY_000, ...) are read.
+
+    Parameters
+    -----------
+    metadata : dict
+        metadata items (names without prefix 'NANSAT_')
+
+    Returns
+    --------
+    gcps : numpy array with GCP_DTYPE (empty if no GCPs are found)
+
+    '''
+    if metadata.get('GCPEncoding', '') == METADATA_ENCODING:
+        nChunks = len([key for key in metadata
+                       if key.startswith('GCPData_')])
+        data = ''.join(metadata['GCPData_%03d' % i] for i in range(nChunks))
+        values = np.fromstring(base64.b64decode(data), '<f8').reshape(4, -1)
+    else:
+        values = []
+        for gcpName in _metadataTextNames:
+            nChunks = len([key for key in metadata
+                           if key.startswith(gcpName + '_')])
+            gcpString = ''.join(metadata['%s_%03d' % (gcpName, i)]
+                                for i in range(nChunks))
+            values.append([float(value) for value in gcpString.split('|')
+                           if len(value.strip()) > 0])
+        if len(set(len(iValues) for iValues in values)) != 1:
+            return np.zeros(0, GCP_DTYPE)
+        values = np.array(values, 'f8').reshape(4, -1)
+
+    return create(values[0], values[1], values[2], values[3],
+                  ids=[''] * values.shape[1])
+
+
+def scale(gcps, factor):
+    '''Multiply pixel/line of GCPs by factor (e.g. for resized image)'''
+    dstGCPs = gcps.copy()
+    dstGCPs['pixel'] *= factor
+    dstGCPs['line'] *= factor
+    return dstGCPs
@@ -0,0 +1,246 @@
+# Name:    mapperindex.py
+# Purpose: Container of MapperIndex class
+# Created:      17.10.2026
+# Copyright:    (c) NERSC 2011 - 2026
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import os
+import ast
+import json
+import pkgutil
+import tarfile
+import zipfile
+from fnmatch import fnmatchcase
+
+# name of the file with names and match rules of mappers in a package
+manifestName = 'manifest.json'
+
+
+class MapperIndex(object):
+    '''Select mappers which can possibly open a file using cheap rules
+
+    A mapper can declare match rules in the class attribute
+    Mapper.matchRules (dictionary). Each rule is a necessary condition:
+    if the rule does not match the mapper would anyway raise
+    WrongMapperError. The following rules are supported:
+    * fileNames : list of glob patterns. Any pattern should match the
+        full name or the base name of the file.
+    * drivers : list of GDAL driver short names (e.g. 'GTiff', 'HDF4').
+        The file should be opened by GDAL with any of the drivers.
+    * metadataKeys : list of keys. All keys should be in the metadata of
+        the GDAL dataset.
+    * archiveMembers : list of glob patterns. The file should be a tar or
+        zip archive and any pattern should match the name (or base name)
+        of any member of the archive.
+
+    Mappers without matchRules are always selected. The order of mappers
+    is kept.
+
+    Examples
+    --------
+    class Mapper(VRT):
+        matchRules = {'fileNames': ['ascat_*.nc']}
+
+    '''
+    ruleTypes = ['fileNames', 'drivers', 'metadataKeys', 'archiveMembers']
+
+    def __init__(self, mappers, useRules=True):
+        '''Read match rules from all mappers
+
+        Parameters
+        -----------
+        mappers : OrderedDict
+            key : mapper name
+            value : class Mapper(VRT) or exc_info tuple (if the mapper
+            could not be imported)
+        useRules : bool
+            if False, all mappers are selected (as without index)
+
+        '''
+        self.names = list(mappers.keys())
+        self.rules = {}
+        if useRules:
+            for name in self.names:
+                matchRules = getattr(mappers[name], 'matchRules', None)
+                if matchRules:
+                    self.rules[name] = matchRules
+
+    def candidates(self, fileName, gdalDataset=None, metadata=None):
+        '''Get names of mappers which can possibly open the file
+
+        Parameters
+        -----------
+        fileName : str
+            name of the input file
+        gdalDataset : GDAL Dataset or None
+            dataset opened from the file
+        metadata : dict or None
+            metadata of the dataset
+
+        Returns
+        --------
+        names : list of str
+            names of the mappers in the original order
+
+        '''
+        fingerprint = self._get_fingerprint(fileName, gdalDataset, metadata)
+
+        return [name for name in self.names
+                if name not in self.rules or
+                self._match(self.rules[name], fingerprint)]
+
+    def _get_fingerprint(self, fileName, gdalDataset, metadata):
+        '''Collect properties of the file which are checked by rules'''
+        driver = None
+        if gdalDataset is not None:
+            try:
+                driver = gdalDataset.GetDriver().ShortName
+            except AttributeError:
+                pass
+
+        return {'fileName': fileName,
+                'fileNames': [fileName, os.path.basename(fileName)],
+                'driver': driver,
+                'metadataKeys': set(metadata or {}),
+                # archive members are read only if required by a rule
+                'archiveMembers': None}
+
+    def _get_archive_members(self, fileName):
+        '''Get names of members of a tar or zip archive (empty if not archive)
+        '''
+        members = []
+        if not os.path.isfile(fileName):
+            return members
+        try:
+            if zipfile.is_zipfile(fileName):
+                zipFile = zipfile.ZipFile(fileName)
+                members = zipFile.namelist()
+                zipFile.close()
+            elif tarfile.is_tarfile(fileName):
+                tarFile = tarfile.open(fileName)
+                members = tarFile.getnames()
+                tarFile.close()
+        except (IOError, tarfile.TarError, zipfile.BadZipfile):
+            pass
+
+        return members + [os.path.basename(m) for m in members]
+
+    def _match(self, rules, fingerprint):
+        '''Check if all rules of one mapper match the file'''
+        if 'fileNames' in rules:
+            if not any(fnmatchcase(name, pattern)
+                       for name in fingerprint['fileNames']
+                       for pattern in rules['fileNames']):
+                return False
+
+        if 'drivers' in rules:
+            if fingerprint['driver'] not in rules['drivers']:
+                return False
+
+        if 'metadataKeys' in rules:
+            if not set(rules['metadataKeys']).issubset(
+                                                fingerprint['metadataKeys']):
+                return False
+
+        if 'archiveMembers' in rules:
+            if fingerprint['archiveMembers'] is None:
+                fingerprint['archiveMembers'] = self._get_archive_members(
+                                                    fingerprint['fileName'])
+            if not any(fnmatchcase(member, pattern)
+                       for member in fingerprint['archiveMembers']
+                       for pattern in rules['archiveMembers']):
+                return False
+
+        return True
+
+
+def get_match_rules(fileName):
+    '''Read match rules from source code of a mapper module without import
+
+    Parameters
+    -----------
+    fileName : str
+        name of the Python file with the mapper module
+
+    Returns
+    --------
+    matchRules : dict or None
+        Mapper.matchRules ({} if not declared) or None if the module
+        has no class Mapper
+
+    '''
+    tree = ast.parse(open(fileName).read(), fileName)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == 'Mapper':
+            for item in node.body:
+                if (isinstance(item, ast.Assign) and
+                        [t.id for t in item.targets
+                         if isinstance(t, ast.Name)] == ['matchRules']):
+                    return ast.literal_eval(item.value)
+            return {}
+
+    return None
+
+
+def build_manifest(packagePath):
+    '''Create manifest with names and match rules of mappers in a package
+
+    Parameters
+    -----------
+    packagePath : str
+        directory with mapper modules
+
+    Returns
+    --------
+    manifest : dict
+        'mappers' : dict with match rules of each mapper module
+        'modules' : list of other (helper) modules
+
+    '''
+    manifest = {'mappers': {}, 'modules': []}
+    for finder, name, ispkg in pkgutil.iter_modules([packagePath]):
+        fileName = os.path.join(packagePath, name + '.py')
+        if ispkg or not os.path.exists(fileName):
+            continue
+        matchRules = get_match_rules(fileName)
+        if matchRules is None:
+            manifest['modules'].append(name)
+        else:
+            manifest['mappers'][name] = matchRules
+    manifest['modules'].sort()
+
+    return manifest
+
+
+def read_manifest(packagePath):
+    '''Read manifest of mappers in a package (None if it does not exist)'''
+    fileName = os.path.join(packagePath, manifestName)
+    if not os.path.exists(fileName):
+        return None
+
+    return json.load(open(fileName))
+
+
+def write_manifest(packagePath):
+    '''Create manifest of mappers in a package and write into the package'''
+    manifest = build_manifest(packagePath)
+    manifestFile = open(os.path.join(packagePath, manifestName), 'w')
+    json.dump(manifest, manifestFile, indent=4, sort_keys=True,
+              separators=(',', ': '))
+    manifestFile.write('\n')
+    manifestFile.close()
+
+
+if __name__ == '__main__':
+    # update manifest of the built-in mappers:
+    # python -m nansat.mapperindex
+    import nansat.mappers
+    write_manifest(nansat.mappers.__path__[0])
@@ -19,6 +19,9 @@ from nansat.tools import gdal, ogr, WrongMapperError
 class Mapper(VRT):
     ''' Mapper for Level-3 AMSR2 data from https://gcom-w1.jaxa.jp'''
 
+    matchRules = {'metadataKeys': ['PlatformShortName', 'SensorShortName',
+                                   'ProductName']}
+
     freqs = [6, 7, 10, 18, 23, 36, 89]
 
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
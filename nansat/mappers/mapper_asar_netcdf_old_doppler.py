@@ -30,6 +30,8 @@ class Mapper(VRT):
         Create VRT with mapping of ASAR wide swath Doppled data
     '''
 
+    matchRules = {'fileNames': ['*.doppler.nc']}
+
     def __init__(self, filename, gdalDataset, gdalMetadata, **kwargs):
 
         # Check this is ASAR old doppler netcdf
@@ -18,6 +18,8 @@ from nansat.tools import WrongMapperError
 class Mapper(VRT):
     ''' Create VRT with mapping of WKV '''
 
+    matchRules = {'fileNames': ['ascat_*.nc']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  latlonGrid=None, mask='', **kwargs):
 
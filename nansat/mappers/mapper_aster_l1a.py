@@ -10,12 +10,16 @@ from dateutil.parser import parse
 
 from nansat.tools import gdal, ogr, WrongMapperError
 from nansat.vrt import GeolocationArray, VRT
+from nansat import gcps as gcptools
 from nansat.nsr import NSR
 
 
 class Mapper(VRT):
     ''' Mapper for ASTER L1A VNIR data'''
 
+    matchRules = {'fileNames': ['*AST_L1A_*'],
+                  'metadataKeys': ['INSTRUMENTSHORTNAME']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  GCP_COUNT=10,
                  bandNames=['VNIR_Band1', 'VNIR_Band2', 'VNIR_Band3N'],
@@ -103,22 +107,14 @@ class Mapper(VRT):
         self.logger.debug('steps: %d %d %d %d' % (step0, step1,
                                                   pixelStep, lineStep))
 
-        # generate list of GCPs
-        gcps = []
-        k = 0
-        for i0 in range(0, latitude.shape[0], step0):
-            for i1 in range(0, latitude.shape[1], step1):
-                # create GCP with X,Y,pixel,line from lat/lon matrices
-                lon = float(longitude[i0, i1])
-                lat = float(latitude[i0, i1])
-                if (lon >= -180 and lon <= 180 and lat >= -90 and lat <= 90):
-                    gcp = gdal.GCP(lon, lat, 0, i1 * pixelStep, i0 * lineStep)
-                    self.logger.debug('%d %d %d %f %f' % (k, gcp.GCPPixel,
-                                                          gcp.GCPLine,
-                                                          gcp.GCPX, gcp.GCPY))
-                    gcps.append(gcp)
-                    k += 1
+        # generate GCPs with X,Y,pixel,line from lat/lon matrices
+        gcps = gcptools.from_grids(longitude, latitude,
+                                   range(0, latitude.shape[0], step0),
+                                   range(0, latitude.shape[1], step1),
+                                   pixelStep=pixelStep,
+                                   lineStep=lineStep)
+        gcps = gcptools.valid_lonlat(gcps)
         # append GCPs and lat/lon projection to the vsiDataset
-        self.dataset.SetGCPs(gcps, NSR().wkt)
+        self.dataset.SetGCPs(gcptools.to_gdal(gcps), NSR().wkt)
 
         self._set_time(parse(gdalMetadata['FIRSTPACKETTIME']))
@@ -17,6 +17,8 @@ from nansat.mappers import mapper_generic as mg
 
 class Mapper(mg.Mapper):
     '''Mapping for the BEAM/Visat output of Case2Regional algorithm'''
+    matchRules = {'fileNames': ['*N1_C2IOP*.nc']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  wavelengths=[None, 413, 443, 490, 510, 560, 620, 665,
                               681, 709, 753, None, 778, 864], **kwargs):
@@ -12,6 +12,8 @@ import numpy as np
 from nansat.nsr import NSR
 from nansat.vrt import VRT, GeolocationArray
 from nansat.node import Node
+from nansat.datasetpool import datasetPool
+from nansat import gcps as gcptools
 from nansat.tools import gdal, ogr, WrongMapperError
 
 
@@ -52,88 +54,96 @@ class Mapper(VRT):
         firstXSize = 0
         firstYSize = 0
         for i, fileName in enumerate(fileNames):
-            subDataset = gdal.Open(fileName)
-            # choose the first dataset whith grid
-            if (firstXSize == 0 and firstYSize == 0 and
-                    subDataset.RasterXSize > 1 and subDataset.RasterYSize > 1):
-                firstXSize = subDataset.RasterXSize
-                firstYSize = subDataset.RasterYSize
-                firstSubDataset = subDataset
-                # get projection from the first subDataset
-                projection = firstSubDataset.GetProjection()
-
-            # take bands whose sizes are same as the first band.
-            if (subDataset.RasterXSize == firstXSize and
-                    subDataset.RasterYSize == firstYSize):
-                if projection == '':
-                    projection = subDataset.GetProjection()
-                if ('GEOLOCATION_X_DATASET' in fileName or
-                        'longitude' in fileName):
-                    xDatasetSource = fileName
-                elif ('GEOLOCATION_Y_DATASET' in fileName or
-                        'latitude' in fileName):
-                    yDatasetSource = fileName
-                else:
-                    for iBand in range(subDataset.RasterCount):
-                        subBand = subDataset.GetRasterBand(iBand+1)
-                        bandMetadata = subBand.GetMetadata_Dict()
-                        if 'PixelFunctionType' in bandMetadata:
-                            bandMetadata.pop('PixelFunctionType')
-                        sourceBands = iBand + 1
-                        #sourceBands = i*subDataset.RasterCount + iBand + 1
-
-                        # generate src metadata
-                        src = {'SourceFilename': fileName,
-                               'SourceBand': sourceBands}
-                        # set scale ratio and scale offset
-                        scaleRatio = bandMetadata.get(
-                            'ScaleRatio',
-                            bandMetadata.get(
-                                'scale',
-                                bandMetadata.get('scale_factor', '')))
-                        if len(scaleRatio) > 0:
-                            src['ScaleRatio'] = scaleRatio
-                        scaleOffset = bandMetadata.get(
-                            'ScaleOffset',
-                            bandMetadata.get(
-                                'offset',
+            # hold subdataset while reading its metadata
+            subDataset = datasetPool.acquire(fileName)
+            try:
+                # choose the first dataset whith grid
+                if (firstXSize == 0 and firstYSize == 0 and
+                        subDataset.RasterXSize > 1 and
+                        subDataset.RasterYSize > 1):
+                    firstXSize = subDataset.RasterXSize
+                    firstYSize = subDataset.RasterYSize
+                    firstSubDataset = subDataset
+                    # get projection from the first subDataset
+                    projection = firstSubDataset.GetProjection()
+
+                # take bands whose sizes are same as the first band.
+                if (subDataset.RasterXSize == firstXSize and
+                        subDataset.RasterYSize == firstYSize):
+                    if projection == '':
+                        projection = subDataset.GetProjection()
+                    if ('GEOLOCATION_X_DATASET' in fileName or
+                            'longitude' in fileName):
+                        xDatasetSource = fileName
+                    elif ('GEOLOCATION_Y_DATASET' in fileName or
+                            'latitude' in fileName):
+                        yDatasetSource = fileName
+                    else:
+                        for iBand in range(subDataset.RasterCount):
+                            subBand = subDataset.GetRasterBand(iBand+1)
+                            bandMetadata = subBand.GetMetadata_Dict()
+                            if 'PixelFunctionType' in bandMetadata:
+                                bandMetadata.pop('PixelFunctionType')
+                            sourceBands = iBand + 1
+                            #sourceBands = i*subDataset.RasterCount + iBand + 1
+
+                            # generate src metadata
+                            src = {'SourceFilename': fileName,
+                                   'SourceBand': sourceBands}
+                            # set scale ratio and scale offset
+                            scaleRatio = bandMetadata.get(
+                                'ScaleRatio',
                                 bandMetadata.get(
-                                    'add_offset', '')))
-                        if len(scaleOffset) > 0:
-                            src['ScaleOffset'] = scaleOffset
-                        # sate DataType
-                        src['DataType'] = subBand.DataType
-
-                        # generate dst metadata
-                        # get all metadata from input band
-                        dst = bandMetadata
-                        # set wkv and bandname
-                        dst['wkv'] = bandMetadata.get('standard_name', '')
-                        # first, try the name metadata
-                        bandName = bandMetadata.get('name', '')
-                        # if it doesn't exist get name from NETCDF_VARNAME
-                        if len(bandName) == 0:
-                            bandName = bandMetadata.get('NETCDF_VARNAME', '')
+                                    'scale',
+                                    bandMetadata.get('scale_factor', '')))
+                            if len(scaleRatio) > 0:
+                                src['ScaleRatio'] = scaleRatio
+                            scaleOffset = bandMetadata.get(
+                                'ScaleOffset',
+                                bandMetadata.get(
+                                    'offset',
+                                    bandMetadata.get(
+                                        'add_offset', '')))
+                            if len(scaleOffset) > 0:
+                                src['ScaleOffset'] = scaleOffset
+                            # sate DataType
+                            src['DataType'] = subBand.DataType
+
+                            # generate dst metadata
+                            # get all metadata from input band
+                            dst = bandMetadata
+                            # set wkv and bandname
+                            dst['wkv'] = bandMetadata.get('standard_name',
+                                                          '')
+                            # first, try the name metadata
+                            bandName = bandMetadata.get('name', '')
+                            # if it doesn't exist get name from
+                            # NETCDF_VARNAME
                             if len(bandName) == 0:
-                                bandName = bandMetadata.get('dods_variable',
+                                bandName = bandMetadata.get('NETCDF_VARNAME',
                                                             '')
-                            if len(bandName) > 0:
-                                if origin_is_nansat and fileExt == '.nc':
-                                    # remove digits added by gdal in
-                                    # exporting to netcdf...
-                                    if bandName[-1:].isdigit():
-                                        bandName = bandName[:-1]
-                                    if bandName[-1:].isdigit():
-                                        bandName = bandName[:-1]
-                        dst['name'] = bandName
-
-                        # remove non-necessary metadata from dst
-                        for rmMetadata in rmMetadatas:
-                            if rmMetadata in dst:
-                                dst.pop(rmMetadata)
-
-                        # append band with src and dst dictionaries
-                        metaDict.append({'src': src, 'dst': dst})
+                                if len(bandName) == 0:
+                                    bandName = bandMetadata.get(
+                                        'dods_variable', '')
+                                if len(bandName) > 0:
+                                    if origin_is_nansat and fileExt == '.nc':
+                                        # remove digits added by gdal in
+                                        # exporting to netcdf...
+                                        if bandName[-1:].isdigit():
+                                            bandName = bandName[:-1]
+                                        if bandName[-1:].isdigit():
+                                            bandName = bandName[:-1]
+                            dst['name'] = bandName
+
+                            # remove non-necessary metadata from dst
+                            for rmMetadata in rmMetadatas:
+                                if rmMetadata in dst:
+                                    dst.pop(rmMetadata)
+
+                            # append band with src and dst dictionaries
+                            metaDict.append({'src': src, 'dst': dst})
+            finally:
+                datasetPool.release(fileName)
 
         # create empty VRT dataset with geolocation only
         VRT.__init__(self, firstSubDataset, srcMetadata=gdalMetadata)
@@ -224,37 +234,8 @@ class Mapper(VRT):
         return projection.replace("|", ",").replace("&", '"')
 
     def add_gcps_from_metadata(self, geoMetadata):
-        '''Get GCPs from strings in metadata and insert in dataset'''
-        gcpNames = ['GCPPixel', 'GCPLine', 'GCPX', 'GCPY']
-        gcpAllValues = []
-
-        # for all gcp coordinates
-        for i, gcpName in enumerate(gcpNames):
-            # scan throught metadata and find how many lines with each GCP
-            gcpLineCount = 0
-            for metaDataItem in geoMetadata:
-                if gcpName in metaDataItem:
-                    gcpLineCount += 1
-            # concat all lines
-            gcpString = ''
-            for n in range(0, gcpLineCount):
-                gcpLineName = '%s_%03d' % (gcpName, n)
-                gcpString += geoMetadata[gcpLineName]
-            # convert strings to floats
-            gcpString = gcpString.strip().replace(' ', '')
-            gcpValues = []
-            # append all gcps from string
-            for x in gcpString.split('|'):
-                if len(x) > 0:
-                    gcpValues.append(float(x))
-            #gcpValues = [float(x) for x in gcpString.strip().split('|')]
-            gcpAllValues.append(gcpValues)
-
-        # create list of GDAL GCPs
-        gcps = []
-        for i in range(0, len(gcpAllValues[0])):
-            gcps.append(gdal.GCP(gcpAllValues[2][i], gcpAllValues[3][i], 0,
-                                 gcpAllValues[0][i], gcpAllValues[1][i]))
+        '''Get GCPs from metadata (any format) and insert in dataset'''
+        gcps = gcptools.to_gdal(gcptools.from_metadata(geoMetadata))
 
         if len(gcps) > 0:
             # get GCP projection and repare
@@ -15,6 +15,8 @@ from nansat.domain import Domain
 class Mapper(VRT):
     ''' VRT with mapping of WKV for KMSS TOA tiff data'''
 
+    matchRules = {'fileNames': ['101_*tif', '102_*tif'], 'drivers': ['GTiff']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create VRT '''
         if (os.path.split(fileName)[1][0:4] != '101_' or
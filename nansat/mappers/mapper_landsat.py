@@ -16,6 +16,8 @@ from nansat.node import Node
 class Mapper(VRT):
     ''' Mapper for LANDSAT3,4,5,6,7,8.tar.gz files'''
 
+    matchRules = {'archiveMembers': ['L*.TIF', 'L*.tif', 'M*.TIF', 'M*.tif']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create LANDSAT VRT '''
         # try to open .tar or .tar.gz or .tgz file with tar
@@ -17,6 +17,9 @@ from nansat.node import Node
 class Mapper(VRT):
     ''' Mapper for high resolution band of LANDSAT8.tar.gz files'''
 
+    matchRules = {'archiveMembers': ['L*.TIF', 'L*.tif', 'M*.TIF',
+                                     'M*.tif']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create LANDSAT VRT '''
         # try to open .tar or .tar.gz or .tgz file with tar
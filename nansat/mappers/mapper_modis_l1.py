@@ -9,11 +9,14 @@ import warnings
 
 from nansat.tools import gdal, ogr, WrongMapperError
 from nansat.vrt import VRT
+from nansat.datasetpool import datasetPool
 
 
 class Mapper(VRT):
     ''' VRT with mapping of WKV for MODIS Level 1 (QKM, HKM, 1KM) '''
 
+    matchRules = {'metadataKeys': ['SHORTNAME']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create MODIS_L1 VRT '''
 
@@ -306,13 +309,14 @@ class Mapper(VRT):
         rOffsets = {}
         for sf in metaDictSF:
             dsName = subDsString % (fileName, sf)
-            ds = gdal.Open(dsName)
-            rScales[dsName] = map(float,
-                                  ds.GetMetadataItem('radiance_scales').
-                                  split(','))
-            rOffsets[dsName] = map(float,
-                                   ds.GetMetadataItem('radiance_offsets').
-                                   split(','))
+            # subdatasets are reused by VRT._create_band() from the pool
+            with datasetPool.borrow(dsName) as ds:
+                rScales[dsName] = map(float,
+                                      ds.GetMetadataItem('radiance_scales').
+                                      split(','))
+                rOffsets[dsName] = map(float,
+                                       ds.GetMetadataItem('radiance_offsets').
+                                       split(','))
             self.logger.debug('radiance_scales: %s' % str(rScales))
 
         # add 'band_name' to 'parameters'
@@ -9,6 +9,7 @@ from math import ceil
 
 from nansat.tools import gdal, ogr, WrongMapperError
 from nansat.vrt import GeolocationArray, VRT
+from nansat import gcps as gcptools
 from nansat.nsr import NSR
 
 
@@ -20,6 +21,8 @@ class Mapper(VRT):
     * Test on MODIS Terra
     '''
 
+    matchRules = {'metadataKeys': ['Title']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  GCP_COUNT=10, **kwargs):
         ''' Create VRT
@@ -236,24 +239,13 @@ class Mapper(VRT):
                           latitude.shape[0], latitude.shape[1],
                           GCP_COUNT, step0, step1)
 
-        # generate list of GCPs
-        dx = .5
-        dy = .5
-        gcps = []
-        k = 0
-        for i0 in range(0, latitude.shape[0], step0):
-            for i1 in range(0, latitude.shape[1], step1):
-                # create GCP with X,Y,pixel,line from lat/lon matrices
-                lon = float(longitude[i0, i1])
-                lat = float(latitude[i0, i1])
-                if (lon >= -180 and lon <= 180 and lat >= -90 and lat <= 90):
-                    gcp = gdal.GCP(lon, lat, 0, i1 * pixelStep + dx,
-                                   i0 * lineStep + dy)
-                    self.logger.debug('%d %d %d %f %f',
-                                      k, gcp.GCPPixel, gcp.GCPLine,
-                                      gcp.GCPX, gcp.GCPY)
-                    gcps.append(gcp)
-                    k += 1
+        # generate GCPs with X,Y,pixel,line from lat/lon matrices
+        gcps = gcptools.from_grids(longitude, latitude,
+                                   range(0, latitude.shape[0], step0),
+                                   range(0, latitude.shape[1], step1),
+                                   pixelOffset=.5, pixelStep=pixelStep,
+                                   lineOffset=.5, lineStep=lineStep)
+        gcps = gcptools.valid_lonlat(gcps)
 
         # append GCPs and lat/lon projection to the vsiDataset
-        self.dataset.SetGCPs(gcps, NSR().wkt)
+        self.dataset.SetGCPs(gcptools.to_gdal(gcps), NSR().wkt)
@@ -18,6 +18,8 @@ class Mapper(VRT):
     ''' Mapper for Level-3 Standard Mapped Image from
     http://oceancolor.gsfc.nasa.gov'''
 
+    matchRules = {'metadataKeys': ['Title']}
+
     # detect wkv from metadata 'Parameter'
     param2wkv = {'Chlorophyll a concentration': 'mass_concentration_of_chlorophyll_a_in_sea_water',
                  'Diffuse attenuation coefficient': 'volume_attenuation_coefficient_of_downwelling_radiative_flux_in_sea_water',
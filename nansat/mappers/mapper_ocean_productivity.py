@@ -19,6 +19,9 @@ from nansat.vrt import VRT, GeolocationArray
 class Mapper(VRT):
     ''' Mapper for Ocean Productivity website
     http://www.science.oregonstate.edu/ocean.productivity/'''
+    matchRules = {'metadataKeys': ['Projection Category',
+                                   'Hole Value']}
+
     # detect wkv from metadata 'Parameter'
     param2wkv = {'chl': 'mass_concentration_of_chlorophyll_a_in_sea_water',
                  'sst': 'sea_surface_temperature',
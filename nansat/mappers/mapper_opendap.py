@@ -35,6 +35,8 @@ except ImportError:
 
 
 class Mapper(VRT):
+    matchRules = {'fileNames': ['http://*']}
+
     def get_proj4_from_ncvar(self, var):
         projDict = {
             'albers_conical_equal_area': {
@@ -20,6 +20,8 @@ class Mapper(vrt.VRT):
     * remote files
     '''
 
+    matchRules = {'fileNames': ['*AVHRR_Pathfinder-PFV5.2*']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, minQual=4,
                  **kwargs):
         ''' Create VRT '''
@@ -19,6 +19,7 @@ import os
 from dateutil.parser import parse
 
 from nansat.vrt import VRT
+from nansat import gcps as gcptools
 from nansat.tools import gdal, WrongMapperError
 from nansat.nsr import NSR
 
@@ -116,27 +117,16 @@ class Mapper(VRT):
         pixelStep = 1
         lineStep = 1
         self.logger.debug('pixel/lineStep %f %f' % (pixelStep, lineStep))
-        # generate list of GCPs
-        dx = .5
-        dy = .5
-        gcps = []
-        k = 0
-        for i0 in range(0, latitude.shape[0], step0):
-            for i1 in range(0, latitude.shape[1], step1):
-                # create GCP with X,Y,pixel,line from lat/lon matrices
-                lon = float(longitude[i0, i1])
-                lat = float(latitude[i0, i1])
-                if (lon >= -180 and lon <= 180 and lat >= -90 and lat <= 90):
-                    gcp = gdal.GCP(lon, lat, 0, i1 * pixelStep + dx,
-                                   i0 * lineStep + dy)
-                    self.logger.debug('%d %d %d %f %f',
-                                      k, gcp.GCPPixel, gcp.GCPLine,
-                                      gcp.GCPX, gcp.GCPY)
-                    gcps.append(gcp)
-                    k += 1
+        # generate GCPs with X,Y,pixel,line from lat/lon matrices
+        gcps = gcptools.from_grids(longitude, latitude,
+                                   range(0, latitude.shape[0], step0),
+                                   range(0, latitude.shape[1], step1),
+                                   pixelOffset=.5, pixelStep=pixelStep,
+                                   lineOffset=.5, lineStep=lineStep)
+        gcps = gcptools.valid_lonlat(gcps)
 
         # append GCPs and lat/lon projection to the vsiDataset
-        self.dataset.SetGCPs(gcps, NSR().wkt)
+        self.dataset.SetGCPs(gcptools.to_gdal(gcps), NSR().wkt)
 
         # define band specific parameters
         metaDict = []
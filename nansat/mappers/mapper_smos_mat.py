@@ -16,6 +16,8 @@ from nansat.tools import gdal, ogr, WrongMapperError
 class Mapper(VRT):
     ''' MApper for Matlab files with SMOS data '''
 
+    matchRules = {'fileNames': ['*.MAT', '*OSUDP2*.mat']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create SMOS VRT '''
         # check extension
@@ -13,12 +13,15 @@ from scipy.ndimage.filters import gaussian_filter
 
 from nansat.nsr import NSR
 from nansat.vrt import GeolocationArray, VRT
+from nansat import gcps as gcptools
 from nansat.tools import gdal, ogr, WrongMapperError
 
 
 class Mapper(VRT):
     ''' VRT with mapping of WKV for VIIRS Level 1B '''
 
+    matchRules = {'fileNames': ['*GMTCO_npp_*']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  GCP_COUNT0=5, GCP_COUNT1=20, pixelStep=1,
                  lineStep=1, **kwargs):
@@ -92,25 +95,16 @@ class Mapper(VRT):
                           latitude.shape[0], latitude.shape[1],
                           GCP_COUNT0, GCP_COUNT1, step0, step1)
 
-        # generate list of GCPs
-        gcps = []
-        k = 0
-        for i0 in range(0, latitude.shape[0], step0):
-            for i1 in range(0, latitude.shape[1], step1):
-                # create GCP with X,Y,pixel,line from lat/lon matrices
-                lon = float(longitude[i0, i1])
-                lat = float(latitude[i0, i1])
-                if (lon >= -180 and lon <= 180 and lat >= -90 and lat <= 90):
-                    gcp = gdal.GCP(lon, lat, 0,
-                                   i1 * pixelStep, i0 * lineStep)
-                    self.logger.debug('%d %d %d %f %f',
-                                      k, gcp.GCPPixel, gcp.GCPLine,
-                                      gcp.GCPX, gcp.GCPY)
-                    gcps.append(gcp)
-                    k += 1
+        # generate GCPs with X,Y,pixel,line from lat/lon matrices
+        gcps = gcptools.from_grids(longitude, latitude,
+                                   range(0, latitude.shape[0], step0),
+                                   range(0, latitude.shape[1], step1),
+                                   pixelStep=pixelStep,
+                                   lineStep=lineStep)
+        gcps = gcptools.valid_lonlat(gcps)
 
         # append GCPs and lat/lon projection to the vsiDataset
-        self.dataset.SetGCPs(gcps, NSR().wkt)
+        self.dataset.SetGCPs(gcptools.to_gdal(gcps), NSR().wkt)
 
         # remove geolocation array
         self.remove_geolocationArray()
@@ -23,6 +23,7 @@ import numpy as np
 import scipy.stats as st
 
 from nansat.nansat import Nansat
+from nansat.datasetpool import datasetPool
 
 
 class Mosaic(Nansat):
@@ -125,25 +126,22 @@ class Mosaic(Nansat):
         --------
         mask : Numpy array with L2-mask
         '''
-        mask = 64 * np.ones(self.shape()).astype('int8')
         # add mask band [0: nodata, 1: cloud, 2: land, 64: data]
         self.logger.info('Try to get raw mask')
-        try:
-            mask = n[self.maskName]
-        except:
+        if not n.has_band(self.maskName):
             self.logger.error('Cannot get mask from %s' % n.fileName)
-            n.add_band(array=mask, parameters={'name': self.maskName})
+            # constant band is computed on reading (no array is kept)
+            n.add_virtual_band('constant', {'name': self.maskName},
+                               value=64, dtype='int8')
         self.logger.debug('Got raw mask - OK')
 
         if self.doReproject:
             # reproject image and get reprojected mask
             self.logger.debug('Try to get reprojected mask')
             n.reproject(self, eResampleAlg=self.eResampleAlg)
-            try:
-                mask = n[self.maskName]
-            except:
-                self.logger.error('Unable to get reprojected mask!')
-            self.logger.debug('Get reprojected mask - OK')
+
+        mask = n[self.maskName]
+        self.logger.debug('Get mask - OK')
 
         return mask
 
@@ -165,6 +163,8 @@ class Mosaic(Nansat):
         mask : Numpy array with array
         '''
         mask = None
+        # close datasets of the previous layers which are not in use
+        datasetPool.clear()
         n = self._get_layer_image(f)
         if n is not None:
             mask = self._get_layer_mask(n)
@@ -389,6 +389,10 @@ class Mosaic(Nansat):
             fQueue : get results from the task queue
             matQueue : get and put results from into the result queue
         '''
+        # buffer for reading data from all bands of all files
+        bandsData = np.empty((len(self.bandIDs), ) + tuple(self.shape()),
+                             'float32')
+
         # start infinite loop
         while True:
             # get task from the queue
@@ -422,15 +426,26 @@ class Mosaic(Nansat):
             stdMatTmp = np.zeros((len(self.bandIDs),
                                   dstShape[0], dstShape[1]), 'float16')
 
+            # read projected data from all bands at once
+            try:
+                n.get_bands(self.bandIDs, out=bandsData)
+                bandsRead = True
+            except:
+                bandsRead = False
+
             # add data to summation matrices
             for bi, b in enumerate(self.bandIDs):
                 self.logger.info('    Adding %s to sum' % b)
                 # get projected data from Nansat object
                 a = None
-                try:
-                    a = n[b]
-                except:
-                    self.logger.error('%s is not in %s' % (b, n.fileName))
+                if bandsRead:
+                    a = bandsData[bi]
+                else:
+                    try:
+                        a = n.read_band(b, out=bandsData[bi])
+                    except:
+                        self.logger.error('%s is not in %s' % (b,
+                                                               n.fileName))
                 if a is not None:
                     # mask invalid data
                     a[mask < 64] = 0
@@ -586,6 +601,9 @@ class Mosaic(Nansat):
         for b in bands:
             avgMat[b] = np.zeros((maxIndex.shape[0], maxIndex.shape[1]))
         maskMat = np.zeros((maxIndex.shape[0], maxIndex.shape[1]))
+        # buffer for reading data from all bands of all files
+        bandsData = np.empty((len(bands), maxIndex.shape[0],
+                              maxIndex.shape[1]), 'float32')
 
         for i in range(len(files)):
             f = files[ars[i]]
@@ -599,15 +617,26 @@ class Mosaic(Nansat):
             # by the serial number of the input file
             maskMat[maxIndex == (i + 1)] = mask[maxIndex == (i + 1)]
 
+            # read projected data from all bands at once
+            try:
+                n.get_bands(bands, out=bandsData)
+                bandsRead = True
+            except:
+                bandsRead = False
+
             # insert data into mosaic matrix
-            for b in bands:
+            for bi, b in enumerate(bands):
                 self.logger.debug('    Inserting %s to latest' % b)
                 # get projected data from Nansat object
                 a = None
-                try:
-                    a = n[b].astype('float32')
-                except:
-                    self.logger.error('%s is not in %s' % (b, n.fileName))
+                if bandsRead:
+                    a = bandsData[bi]
+                else:
+                    try:
+                        a = n.read_band(b, out=bandsData[bi])
+                    except:
+                        self.logger.error('%s is not in %s' % (b,
+                                                               n.fileName))
                 if a is not None:
                     # insert data into result only for pixels masked
                     # by the serial number of the input file
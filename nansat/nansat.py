@@ -21,7 +21,7 @@ import glob
 import sys
 import tempfile
 import datetime
-import dateutil.parser
+import hashlib
 import pkgutil
 import warnings
 import collections
@@ -41,6 +41,13 @@ from nansat.nsr import NSR
 from nansat.domain import Domain
 from nansat.figure import Figure
 from nansat.vrt import VRT
+from nansat.arraycache import ArrayCache
+from nansat.resamplingplan import ResamplingPlan, METHODS
+from nansat import expression as bandexpression
+from nansat.datasetpool import datasetPool
+from nansat import gcps as gcptools
+from nansat.vrtcache import VRTCache
+from nansat.mapperindex import MapperIndex, read_manifest
 from nansat.nansatshape import Nansatshape
 from nansat.tools import add_logger, gdal
 from nansat.tools import OptionError, WrongMapperError, Error, GDALError
@@ -49,6 +56,21 @@ from nansat.pointbrowser import PointBrowser
 
 # container for all mappers
 nansatMappers = None
+# index of match rules of all mappers
+nansatMapperIndex = None
+
+# NumPy data types of GDAL data types
+gdalNumpyTypes = {'Byte': 'uint8',
+                  'UInt16': 'uint16',
+                  'Int16': 'int16',
+                  'UInt32': 'uint32',
+                  'Int32': 'int32',
+                  'Float32': 'float32',
+                  'Float64': 'float64',
+                  'CInt16': 'complex64',
+                  'CInt32': 'complex128',
+                  'CFloat32': 'complex64',
+                  'CFloat64': 'complex128'}
 
 def test_openable(fname):
     try:
@@ -57,6 +79,7 @@ def test_openable(fname):
         raise
     f.close()
 
+
 class Nansat(Domain):
     '''Container for geospatial data, performs all high-level operations
 
@@ -81,8 +104,18 @@ class Nansat(Domain):
     Nansat uses instance of Figure (collection of methods for visualization)
     '''
 
+    # LRU cache of arrays read from bands (None if caching is disabled)
+    cache = None
+    # read data from flattened VRT chain (see VRT.flatten())
+    flattenVRT = False
+    # maximum number of steps for undo() (None for unlimited)
+    undoDepth = None
+    # number of pixels in windows of band expressions (see _read_band())
+    expressionBlockSize = 2 ** 20
+
     def __init__(self, fileName='', mapperName='', domain=None,
-                 array=None, parameters=None, logLevel=30, **kwargs):
+                 array=None, parameters=None, logLevel=30, cacheSize=0,
+                 cacheDir=None, flattenVRT=False, undoDepth=None, **kwargs):
         '''Create Nansat object
 
         if <fileName> is given:
@@ -110,6 +143,26 @@ class Nansat(Domain):
             Metadata for the 1st band of a new raster,e.g. name, wkv, units,...
         logLevel : int, optional, default: logging.DEBUG (30)
             Level of logging. See: http://docs.python.org/howto/logging.html
+        cacheSize : int, optional, default: 0
+            Maximum size (bytes) of the cache for arrays read from bands.
+            The cache is cleared when self.vrt is replaced (e.g. by
+            reproject, crop, resize, add_band, undo). 0 disables caching.
+        cacheDir : str or VRTCache, optional
+            Directory for persistent cache of VRTs created by mappers (or
+            VRTCache object, e.g. with non-default size limit). If the file
+            was opened before with the same mapper arguments and neither
+            the file nor the mapper were changed, the VRT is read from the
+            cache and the mapper is not used. None disables the cache.
+        flattenVRT : bool, optional, default: False
+            Read data from the flattened chain of VRTs (see VRT.flatten()).
+            After reproject, crop, resize, add_band, etc. the chain is
+            flattened once, before the first read.
+        undoDepth : int, optional
+            Maximum number of steps which can be undone (see undo()).
+            Older sub-VRTs (and their VSI files) are freed unless they are
+            still needed for reading data (see VRT.free_sub_vrts(), e.g.
+            a reprojected dataset keeps the source of the warped VRT).
+            None means no limit.
         kwargs : additional arguments for mappers
 
         Creates
@@ -124,6 +177,8 @@ class Nansat(Domain):
             logger for output debugging info
         self.name : string
             name of object (for writing KML)
+        self.cache : ArrayCache
+            cache of arrays read from bands (if cacheSize > 0)
 
         Examples
         --------
@@ -153,6 +208,12 @@ class Nansat(Domain):
         # create logger
         self.logger = add_logger('Nansat', logLevel)
 
+        # create cache of band arrays
+        if cacheSize > 0:
+            self.cache = ArrayCache(cacheSize)
+        self.flattenVRT = flattenVRT
+        self.undoDepth = undoDepth
+
         # empty dict of VRTs with added bands
         self.addedBands = {}
 
@@ -165,7 +226,11 @@ class Nansat(Domain):
         # create self.vrt from a file using mapper or...
         if fileName != '':
             # Make original VRT object with mapping of variables
-            self.vrt = self._get_mapper(mapperName, **kwargs)
+            if cacheDir is None:
+                self.vrt = self._get_mapper(mapperName, **kwargs)
+            else:
+                self.vrt = self._get_cached_mapper(cacheDir, mapperName,
+                                                   **kwargs)
         # ...create using array, domain, and parameters
         else:
             # Set current VRT object
@@ -178,45 +243,454 @@ class Nansat(Domain):
 
         self.logger.debug('Object created from %s ' % self.fileName)
 
+    @property
+    def vrt(self):
+        '''VRT object with the current state of the dataset'''
+        return self._vrt
+
+    @vrt.setter
+    def vrt(self, vrt):
+        '''Replace VRT object and invalidate data derived from the old one'''
+        self._vrt = vrt
+        self._vrt_changed()
+
+    def _vrt_changed(self):
+        '''Invalidate data which depend on self.vrt
+
+        Called every time self.vrt is replaced (e.g. by reproject, crop,
+        resize, add_band or undo)
+
+        '''
+        if self.cache is not None:
+            self.cache.clear()
+        if self.undoDepth is None:
+            return
+        # free sub-VRTs only if the chain is deeper than undoDepth
+        depth = 0
+        vrt = self._vrt.vrt
+        while vrt is not None and depth <= self.undoDepth:
+            depth += 1
+            vrt = vrt.vrt
+        if depth > self.undoDepth:
+            self._vrt.free_sub_vrts(self.undoDepth)
+
     def __getitem__(self, bandID):
         ''' Returns the band as a NumPy array, by overloading []
 
         Parameters
         -----------
-        bandID : int or str
+        bandID : int or str or tuple
             If int, array from band with number <bandID> is returned
             If string, array from band with metadata 'name' equal to
             <bandID> is returned
+            If tuple, the first element is the band number or name and the
+            next one or two elements are row and column indices (int or
+            slice). Only the corresponding window is read from the dataset.
 
         Returns
         --------
         self.get_GDALRasterBand(bandID).ReadAsArray() : NumPy array
 
+        Examples
+        --------
+        a = n['sigma0_HH']
+        # read the full band
+
+        a = n['sigma0_HH', 1000:2000, 500:1500]
+        # read only 1000 rows and 1000 columns of the band
+
+        a = n[1, 100]
+        # read one row of the first band
+
+        '''
+        window = None
+        if type(bandID) == tuple:
+            window = self._get_window(*bandID[1:])
+            bandID = bandID[0]
+
+        if window is None:
+            return self._read_band(bandID)
+
+        xOff, yOff, xSize, ySize, rowIndex, colIndex = window
+        bandData = self._read_band(bandID, (xOff, yOff, xSize, ySize))
+
+        return bandData[rowIndex, colIndex]
+
+    def read_band(self, bandID, window=None, out=None, masked=False):
+        ''' Read band (or window of band) into new or given array
+
+        Unlike Nansat.__getitem__ the data can be read into a preallocated
+        array (no new array is allocated for each band) and the native
+        data type can be kept together with a separate mask of valid
+        pixels (no conversion to float for setting np.nan).
+
+        Parameters
+        -----------
+        bandID : int or str
+            number or name of the band
+        window : tuple with 4 int, optional
+            (xOff, yOff, xSize, ySize) of the window to read.
+            If None, the full band is read.
+        out : NumPy array, optional
+            array with shape (ySize, xSize) to read data into. Data is
+            converted to the data type of <out> by GDAL.
+        masked : bool or str, optional, default=False
+            If False, invalid values (_FillValue, inf) are set to np.nan
+            If True, values are not changed and boolean mask of valid
+            pixels is returned together with the data
+            If 'packed', the mask is packed into bits (np.packbits along
+            rows)
+
+        Returns
+        --------
+        bandData : NumPy array
+            if <masked> is False
+        bandData, mask : NumPy arrays
+            if <masked> is True or 'packed'
+
+        Examples
+        --------
+        buf = np.empty(n.shape(), 'float32')
+        for bandName in ['L_412', 'L_443']:
+            n.read_band(bandName, out=buf)
+            # process data in buf
+
+        data, mask = n.read_band('sigma0_HH', masked=True)
+        # data has the data type of the band, mask is True for valid pixels
+
         '''
+        if window is not None:
+            window = tuple(int(w) for w in window)
+            if len(window) != 4:
+                raise OptionError('Window should contain xOff, yOff, '
+                                  'xSize, ySize!')
+
+        if out is not None:
+            if window is None:
+                outShape = self.shape()
+            else:
+                outShape = (window[3], window[2])
+            if out.shape != tuple(outShape):
+                raise OptionError('Shape of <out> %s does not match shape '
+                                  'of the window %s!' % (str(out.shape),
+                                                         str(outShape)))
+
+        return self._read_band(bandID, window, out, masked)
+
+    def _read_band(self, bandID, window=None, out=None, masked=False):
+        ''' Read full band or a window of band, apply expression and masking
+
+        Parameters
+        -----------
+        bandID : int or str
+            number or name of the band
+        window : tuple with 4 int, optional
+            (xOff, yOff, xSize, ySize) of the window to read.
+            If None, the full band is read.
+        out : NumPy array, optional
+            array to read data into
+        masked : bool or str
+            see Nansat.read_band
+
+        Returns
+        --------
+        bandData : NumPy array
+            or (bandData, mask) if <masked> is True
+
+        '''
+        # get data from cache
+        if self.cache is not None:
+            cacheKey = (self.vrt.fileName,
+                        self._get_band_number(bandID), window)
+            if masked:
+                cacheKey += ('masked', )
+            bandData = self.cache.get(cacheKey)
+            if bandData is not None:
+                if out is None:
+                    bandData = bandData.copy()
+                else:
+                    out[...] = bandData
+                    bandData = out
+                if masked:
+                    fillValue = self.get_GDALRasterBand(bandID).GetMetadata(
+                                                    ).get('_FillValue', None)
+                    return bandData, self._get_valid_mask(bandData,
+                                                          fillValue, masked)
+                return bandData
+
         # get band
         band = self.get_GDALRasterBand(bandID)
+        bandMetadata = band.GetMetadata()
         # get expression from metadata
-        expression = band.GetMetadata().get('expression', '')
-        # get data
-        bandData = band.ReadAsArray()
-        # execute expression if any
+        expression = bandMetadata.get('expression', '')
+        if window is None:
+            readWindow = (0, 0, band.XSize, band.YSize)
+        else:
+            readWindow = window
+        # get data (directly into <out> if no expression should be applied)
+        readBand = self._get_read_vrt().dataset.GetRasterBand(
+                                            self._get_band_number(bandID))
         if expression != '':
-            bandData = eval(expression)
+            bandData = self._evaluate_expression(expression, readBand,
+                                                 readWindow, out)
+        elif out is not None:
+            bandData = readBand.ReadAsArray(*readWindow, buf_obj=out)
+        else:
+            bandData = readBand.ReadAsArray(*readWindow)
+
+        fillValue = bandMetadata.get('_FillValue', None)
+        if masked:
+            # keep values and data type, return mask of valid pixels
+            mask = self._get_valid_mask(bandData, fillValue, masked)
+        else:
+            self._set_invalid_to_nan(bandData, fillValue, bandID)
+
+        # keep a copy in cache: returned array can be modified by user
+        if self.cache is not None:
+            self.cache.put(cacheKey, bandData.copy())
+
+        if masked:
+            return bandData, mask
+        return bandData
+
+    def _evaluate_expression(self, expression, readBand, window, out=None):
+        ''' Compute band expression window by window
 
-        # Set invalid and missing data to np.nan
-        if '_FillValue' in band.GetMetadata():
-            fillValue = float(band.GetMetadata()['_FillValue'])
+        The expression is parsed once (see nansat.expression). Windows of
+        about self.expressionBlockSize pixels are computed one by one and
+        arrays for bands referenced in the expression and for intermediate
+        results are reused between the windows.
+
+        Parameters
+        -----------
+        expression : str
+            band expression
+        readBand : GDAL RasterBand
+            band with the expression (to read bandData from)
+        window : tuple with 4 int
+            (xOff, yOff, xSize, ySize) of the window to compute
+        out : NumPy array, optional
+            array for the result
+
+        Returns
+        --------
+        bandData : NumPy array
+
+        '''
+        parsedExpression = bandexpression.parse(expression)
+        xOff, yOff, xSize, ySize = window
+        nRows = max(1, self.expressionBlockSize // max(xSize, 1))
+        buffers = {}
+        for row0 in range(0, ySize, nRows):
+            blockWindow = (xOff, yOff + row0, xSize, min(nRows, ySize - row0))
+
+            def read_band(bandID, buf):
+                return self._read_band(bandID, blockWindow, buf)
+
+            def read_band_data(buf):
+                return readBand.ReadAsArray(*blockWindow, buf_obj=buf)
+
+            result = parsedExpression.evaluate(read_band, read_band_data,
+                                               buffers,
+                                               (blockWindow[3], xSize))
+            if out is None:
+                out = np.empty((ySize, xSize), np.asarray(result).dtype)
+            out[row0:row0 + blockWindow[3]] = result
+
+        if out is None:
+            # empty window
+            out = np.empty((ySize, xSize), 'float32')
+        return out
+
+    def _get_read_vrt(self):
+        ''' Return VRT to read data from
+
+        Returns
+        --------
+        vrt : VRT
+            flattened self.vrt (created once for each VRT) if
+            self.flattenVRT is True, otherwise self.vrt
+
+        '''
+        if not self.flattenVRT:
+            return self.vrt
+        if self.vrt.flatVRT is None:
+            flatVRT = self.vrt.flatten()
+            # False if nothing is flattened (no reference of VRT to itself)
+            self.vrt.flatVRT = flatVRT if flatVRT is not self.vrt else False
+        if self.vrt.flatVRT is False:
+            return self.vrt
+        return self.vrt.flatVRT
+
+    def _set_invalid_to_nan(self, bandData, fillValue=None, bandID=None):
+        ''' Set _FillValue and inf values to np.nan in place
+
+        Parameters
+        -----------
+        bandData : NumPy array
+        fillValue : str or float, optional
+            value of missing data
+        bandID : int or str, optional
+            number or name of the band (for logging only)
+
+        '''
+        if fillValue is not None:
             try:
-                bandData[bandData == fillValue] = np.nan
+                bandData[bandData == float(fillValue)] = np.nan
             except:
                 self.logger.info('Cannot replace _FillValue values '
                                  'with np.NAN in %s!' % bandID)
-        try:
+        # only float arrays can contain inf
+        if bandData.dtype.kind in 'fc':
             bandData[np.isinf(bandData)] = np.nan
-        except:
-            self.logger.info('Cannot replace inf values with np.NAN!')
 
-        return bandData
+    def get_bands(self, bandList=None, window=None, out=None):
+        ''' Read several bands into one 3D array
+
+        The array with shape (nBands, ySize, xSize) is allocated once. If
+        all requested bands are read from the dataset without expressions
+        they are read with one call to GDAL, so that the common sources
+        (e.g. warping or pixel functions) are processed only once. If the
+        cache of band arrays is used (cacheSize > 0), the bands are read
+        one by one through the cache instead.
+        _FillValue and expressions are handled as in Nansat.__getitem__
+
+        Parameters
+        -----------
+        bandList : list of int or str, optional
+            numbers or names of bands. If None, all bands are read.
+        window : tuple with 4 int, optional
+            (xOff, yOff, xSize, ySize) of the window to read.
+            If None, the full bands are read.
+        out : NumPy array, optional
+            array with shape (nBands, ySize, xSize) to read data into
+
+        Returns
+        --------
+        data : NumPy 3D array
+            data type is common for all bands (e.g. float32 for Int16 and
+            Float32 bands)
+
+        Examples
+        --------
+        rgb = n.get_bands(['L_645', 'L_555', 'L_469'])
+        # rgb.shape is (3, n.shape()[0], n.shape()[1])
+
+        '''
+        return self._read_bands(bandList, window, out)[0]
+
+    def _read_bands(self, bandList=None, window=None, out=None):
+        ''' Read several bands into one 3D array
+
+        Parameters
+        -----------
+        see Nansat.get_bands
+
+        Returns
+        --------
+        data : NumPy 3D array
+        dtypes : list of NumPy dtypes
+            data type of each band as it would be returned by
+            Nansat.__getitem__
+
+        '''
+        if bandList is None:
+            bandList = range(1, self.vrt.dataset.RasterCount + 1)
+        elif type(bandList) not in [list, tuple]:
+            bandList = [bandList]
+        bandNumbers = [self._get_band_number(b) for b in bandList]
+
+        if window is None:
+            window = (0, 0, self.vrt.dataset.RasterXSize,
+                      self.vrt.dataset.RasterYSize)
+            bandWindow = None
+        else:
+            window = tuple(int(w) for w in window)
+            bandWindow = window
+        shape = (len(bandNumbers), window[3], window[2])
+
+        # bands with expressions are computed first to know the data type
+        bands = [self.vrt.dataset.GetRasterBand(bn) for bn in bandNumbers]
+        metadata = [b.GetMetadata() for b in bands]
+        exprData = {}
+        dtypes = []
+        for i, bandNumber in enumerate(bandNumbers):
+            if metadata[i].get('expression', '') != '':
+                exprData[i] = self._read_band(bandNumber, bandWindow)
+                dtypes.append(exprData[i].dtype)
+            else:
+                gdalType = gdal.GetDataTypeName(bands[i].DataType)
+                dtypes.append(np.dtype(gdalNumpyTypes.get(gdalType,
+                                                          'float32')))
+
+        if out is None:
+            out = np.empty(shape, np.result_type(*dtypes))
+        elif out.shape != shape:
+            raise OptionError('Shape of <out> %s does not match shape '
+                              '%s!' % (str(out.shape), str(shape)))
+
+        # read all bands without expressions with one call
+        plainBands = [bn for i, bn in enumerate(bandNumbers)
+                      if i not in exprData]
+        readDone = False
+        # with cache bands are read (and cached) one by one
+        if len(exprData) == 0 and self.cache is None:
+            readDataset = self._get_read_vrt().dataset
+            try:
+                if plainBands == range(1, readDataset.RasterCount + 1):
+                    readDataset.ReadAsArray(*window, buf_obj=out)
+                else:
+                    readDataset.ReadAsArray(*window, buf_obj=out,
+                                            band_list=plainBands)
+                readDone = True
+            except (TypeError, ValueError):
+                # old GDAL without <buf_obj> or <band_list>
+                self.logger.debug('Cannot read bands with one call')
+
+        for i, bandNumber in enumerate(bandNumbers):
+            if i in exprData:
+                out[i] = exprData[i]
+            elif readDone:
+                self._set_invalid_to_nan(out[i],
+                                         metadata[i].get('_FillValue', None),
+                                         bandNumber)
+            else:
+                self._read_band(bandNumber, bandWindow, out[i])
+
+        return out, dtypes
+
+    def _get_valid_mask(self, bandData, fillValue=None, masked=True):
+        ''' Get mask of valid pixels (not equal to _FillValue, finite)
+
+        Parameters
+        -----------
+        bandData : NumPy array
+        fillValue : str or float, optional
+            value of missing data
+        masked : bool or str
+            if 'packed', the mask is packed into bits with np.packbits
+
+        Returns
+        --------
+        mask : NumPy array
+            boolean (True for valid pixels) or uint8 with packed bits
+
+        '''
+        mask = None
+        if fillValue is not None:
+            mask = bandData != float(fillValue)
+        if bandData.dtype.kind in 'fc':
+            if mask is None:
+                mask = np.isfinite(bandData)
+            else:
+                mask &= np.isfinite(bandData)
+        if mask is None:
+            mask = np.ones(bandData.shape, bool)
+
+        if masked == 'packed':
+            mask = np.packbits(mask, axis=-1)
+
+        return mask
 
     def __repr__(self):
         '''Creates string with basic info about the Nansat object'''
@@ -231,8 +705,9 @@ class Nansat(Domain):
         outString += Domain.__repr__(self)
         return outString
 
-    def add_band(self, array, parameters=None, nomem=False):
-        '''Add band from the array to self.vrt
+    def add_band(self, array=None, parameters=None, nomem=False,
+                 expression=None):
+        '''Add band from the array (or from expression) to self.vrt
 
         Create VRT object which contains VRT and RAW binary file and append it
         to self.vrt.bandVRTs
@@ -244,6 +719,10 @@ class Nansat(Domain):
         parameters : dictionary
             band metadata: wkv, name, etc. (or for several bands)
         nomem : boolean, saves the vrt to a tempfile if nomem is True
+        expression : str
+            if given instead of <array>, values of the band are computed
+            from other bands on reading (see nansat.expression), e.g.
+            'np.sqrt(self["U"] ** 2 + self["V"] ** 2)'
 
         Modifies
         ---------
@@ -259,14 +738,30 @@ class Nansat(Domain):
         n.add_band(a, p, nomem=True)
         # add new band from an array <a> with metadata <p> but keep it
         # temporarli on disk intead of memory
+
+        n.add_band(expression='np.power(10., self["chlor_a_log"])',
+                   parameters={'name': 'chlor_a'})
+        # add new band computed from band 'chlor_a_log' on reading
         '''
-        self.add_bands([array], [parameters], nomem)
+        if expression is None:
+            self.add_bands([array], [parameters], nomem)
+            return
+
+        # check the expression before adding the band
+        bandexpression.parse(expression)
+        parameters = dict(parameters or {})
+        parameters['expression'] = expression
+        self.add_virtual_band('constant', parameters)
 
     def add_bands(self, arrays, parameters=None, nomem=False):
         '''Add band from the array to self.vrt
 
-        Create VRT object which contains VRT and RAW binary file and append it
-        to self.vrt.bandVRTs
+        Create VRT objects which contain VRT and RAW binary file and append
+        them to self.vrt.bandVRTs. All bands are added at once (the VRT file
+        is written once) and can be removed with one undo(). If bands were
+        added to self before (and nothing else changed self.vrt), the new
+        bands are appended to the current VRT instead of a new super VRT
+        (see VRT.get_append_vrt()).
 
         Parameters
         -----------
@@ -290,10 +785,48 @@ class Nansat(Domain):
         '''
         # create VRTs from arrays
         bandVRTs = [VRT(array=array, nomem=nomem) for array in arrays]
+        self._add_band_vrts(bandVRTs, parameters)
 
-        self.vrt = self.vrt.get_super_vrt()
+    def add_virtual_band(self, function, parameters=None, value=0,
+                         dtype=None, tiePointStep=16):
+        '''Add band with values computed for each pixel on reading
+
+        The band takes (almost) no storage, only the blocks which are read
+        are computed. The band is reprojected, cropped, etc. as other bands.
 
-        # add the array band into self.vrt and get bandName
+        Parameters
+        -----------
+        function : str
+            'constant', 'pixel', 'line', 'longitude' or 'latitude'
+            (see VRT.get_virtual_vrt())
+        parameters : dictionary
+            band metadata: wkv, name, etc.
+        value : int or float
+            value of the constant band
+        dtype : str or numpy dtype
+            data type of the band
+        tiePointStep : int
+            distance between tie-points for interpolation of longitude and
+            latitude (pixels)
+
+        Examples
+        --------
+        n.add_virtual_band('constant', {'name': 'mask'}, value=64,
+                           dtype='uint8')
+        n.add_virtual_band('latitude', {'wkv': 'latitude'})
+
+        '''
+        bandVRT = self.vrt.get_virtual_vrt(function, value, dtype,
+                                           tiePointStep)
+        self._add_band_vrts([bandVRT], [parameters])
+
+    def _add_band_vrts(self, bandVRTs, parameters):
+        '''Add the first band of each VRT to self.vrt (see add_bands())'''
+        vrt = self.vrt.get_append_vrt()
+        if vrt is not self.vrt:
+            self.vrt = vrt
+
+        # add the band into self.vrt and get bandName
         for bi, bandVRT in enumerate(bandVRTs):
             params = parameters[bi]
             if params is None:
@@ -305,6 +838,7 @@ class Nansat(Domain):
             self.vrt.bandVRTs[bandName] = bandVRT
 
         self.vrt.dataset.FlushCache()  # required after adding bands
+        datasetPool.discard(self.vrt.fileName)
 
     def bands(self):
         ''' Make a dictionary with all metadata from all bands
@@ -315,9 +849,10 @@ class Nansat(Domain):
             key = N, value = dict with all band metadata
 
         '''
+        bandIndex = self.vrt.get_band_index()
         b = {}
-        for iBand in range(self.vrt.dataset.RasterCount):
-            b[iBand + 1] = self.get_metadata(bandID=iBand + 1)
+        for iBand in bandIndex.metadata:
+            b[iBand] = dict(bandIndex.metadata[iBand])
 
         return b
 
@@ -333,12 +868,7 @@ class Nansat(Domain):
             True/False if band exists or not
 
         '''
-        bandExists = False
-        for b in self.bands():
-            if self.bands()[b]['name'] == band:
-                bandExists = True
-
-        return bandExists
+        return band in self.vrt.get_band_index()
 
     def export(self, fileName, bands=None, rmMetadata=[], addGeolocArray=True,
                addGCPs=True, driver='netCDF', bottomup=False, options=None):
@@ -396,7 +926,7 @@ class Nansat(Domain):
         # export all bands into a GeoTiff
 
         '''
-        # temporary VRT for exporting
+        # temporary VRT for exporting (changed below)
         exportVRT = self.vrt.copy()
         exportVRT.real = []
         exportVRT.imag = []
@@ -608,25 +1138,39 @@ class Nansat(Domain):
         if maskName is not None:
             mask = self[maskName]
 
-        # add required bands to data
-        dstBands = {}
-        srcBands = [self.bands()[b]['name'] for b in self.bands()]
+        # skip non exiting bands
+        srcBands = self.vrt.get_band_index().names
         for iband in bands:
-            # skip non exiting bands
             if iband not in srcBands:
                 self.logger.error('%s is not found' % str(iband))
-                continue
+        bandNames = [iband for iband in bands if iband in srcBands]
 
-            array = self[iband]
+        # read all required bands at once
+        if len(bandNames) > 0:
+            bandsData, bandsDtypes = self._read_bands(bandNames)
+
+        # add required bands to data
+        dstBands = {}
+        for i, iband in enumerate(bandNames):
+            array = bandsData[i]
 
             # catch None band error
             if array is None:
                 raise GDALError('%s is None' % str(iband))
 
+            # restore data type of the band (e.g. integer band read
+            # together with float bands, where _FillValue was set to NaN)
+            if array.dtype != bandsDtypes[i]:
+                fillValue = self.get_metadata('_FillValue', iband)
+                if (bandsDtypes[i].kind in 'iub' and
+                        fillValue is not None):
+                    array[np.isnan(array)] = float(fillValue)
+                array = array.astype(bandsDtypes[i])
+
             # set type, scale and offset from input data or by default
             dstBands[iband] = {}
             dstBands[iband]['type'] = bands[iband].get('type',
-                                             array.dtype.str.replace('u', 'i'))
+                                        bandsDtypes[i].str.replace('u', 'i'))
             dstBands[iband]['scale'] = float(bands[iband].get('scale', 1.0))
             dstBands[iband]['offset'] = float(bands[iband].get('offset', 0.0))
             if '_FillValue' in bands[iband]:
@@ -902,10 +1446,8 @@ class Nansat(Domain):
         gcps = self.vrt.vrt.dataset.GetGCPs()
         if len(gcps) > 0:
             gcpPro = self.vrt.vrt.dataset.GetGCPProjection()
-            for gcp in gcps:
-                gcp.GCPPixel *= factor
-                gcp.GCPLine *= factor
-            self.vrt.dataset.SetGCPs(gcps, gcpPro)
+            gcps = gcptools.scale(gcptools.from_gdal(gcps), factor)
+            self.vrt.dataset.SetGCPs(gcptools.to_gdal(gcps), gcpPro)
             self.vrt._remove_geotransform()
         else:
             # change resultion in geotransform to keep spatial extent
@@ -950,6 +1492,58 @@ class Nansat(Domain):
         # the GDAL RasterBand of the corresponding band is returned
         return self.vrt.dataset.GetRasterBand(bandNumber)
 
+    def iter_blocks(self, bands=[1], blockShape=None):
+        ''' Iterate over aligned windows of several bands
+
+        The raster is split into blocks of equal size (blocks at the right
+        and bottom edges can be smaller). For each block the same window
+        is read from all given bands. _FillValue and expressions are
+        handled as in Nansat.__getitem__
+
+        Parameters
+        -----------
+        bands : list of int or str or int or str
+            numbers or names of bands to read
+        blockShape : (int, int), optional
+            number of rows and columns in one block. By default the GDAL
+            block size of the first band is used, but not less than 256
+            rows and 256 columns.
+
+        Yields
+        -------
+        window : tuple with 4 int
+            (xOff, yOff, xSize, ySize) of the block
+        arrays : list of NumPy arrays
+            data from each band in the block
+
+        Examples
+        --------
+        for window, (hh, hv) in n.iter_blocks(['sigma0_HH', 'sigma0_HV'],
+                                              (512, 512)):
+            xOff, yOff, xSize, ySize = window
+            ratio[yOff:yOff + ySize, xOff:xOff + xSize] = hh / hv
+
+        '''
+        if type(bands) not in [list, tuple]:
+            bands = [bands]
+        # find band numbers only once
+        bandNumbers = [self._get_band_number(b) for b in bands]
+
+        if blockShape is None:
+            blockXSize, blockYSize = (self.vrt.dataset.
+                                      GetRasterBand(bandNumbers[0]).
+                                      GetBlockSize())
+            blockShape = (max(blockYSize, 256), max(blockXSize, 256))
+
+        rasterYSize, rasterXSize = self.shape()
+        for yOff in range(0, rasterYSize, blockShape[0]):
+            ySize = min(blockShape[0], rasterYSize - yOff)
+            for xOff in range(0, rasterXSize, blockShape[1]):
+                xSize = min(blockShape[1], rasterXSize - xOff)
+                window = (xOff, yOff, xSize, ySize)
+                yield window, [self._read_band(b, window)
+                               for b in bandNumbers]
+
     def list_bands(self, doPrint=True):
         ''' Show band information of the given Nansat object
 
@@ -984,7 +1578,9 @@ class Nansat(Domain):
             return outString
 
     def reproject(self, dstDomain=None, eResampleAlg=0, blockSize=None,
-                  WorkingDataType=None, tps=None, **kwargs):
+                  WorkingDataType=None, tps=None, materialize=False,
+                  nThreads=None, nProcesses=1, tileSize=1024,
+                  resamplingPlan=None, **kwargs):
         ''' Change projection of the object based on the given Domain
 
         Create superVRT from self.vrt with AutoCreateWarpedVRT() using
@@ -1021,6 +1617,28 @@ class Nansat(Domain):
             If not given explicitly, 'skip_gcps' is fetched from the
             metadata of self, or from dstDomain (as set by mapper or user).
             [defaults to 1 if not specified, i.e. using all GCPs]
+        materialize : bool
+            If True, the reprojected data is computed at once, tile by tile,
+            and kept in arrays (see VRT.get_materialized_vrt()). Otherwise
+            data is reprojected by GDAL on every read.
+        nThreads : int or 'ALL_CPUS'
+            number of threads used by GDAL for warping (NUM_THREADS)
+        nProcesses : int
+            number of processes warping tiles in parallel (if materialize)
+        tileSize : int
+            width and height of tiles (if materialize)
+        resamplingPlan : ResamplingPlan or str
+            If given, data is resampled with the plan (source pixels and
+            weights for each destination pixel, see nansat.resamplingplan)
+            and kept in arrays. If a file name is given, the plan is loaded
+            from the file, or computed and saved into the file if the file
+            does not exist or the plan does not match geometry of self or
+            dstDomain. Only nearest neighbour and bilinear resampling
+            (eResampleAlg=0, 1) are supported. Bands are read with
+            expressions; pixels equal to _FillValue and NaN are not used.
+            Pixels outside of the source or without valid source pixels
+            are set to _FillValue of the band (if any), otherwise to NaN
+            (float bands) or 0 (integer bands).
 
         Modifies
         ---------
@@ -1038,6 +1656,9 @@ class Nansat(Domain):
         '''
         # if no domain: quit
         if dstDomain is None:
+            if resamplingPlan is not None:
+                raise OptionError('dstDomain is required for resampling '
+                                  'with a plan')
             return
 
         # if self spans from 0 to 360 and dstDomain is west of 0:
@@ -1093,6 +1714,14 @@ class Nansat(Domain):
             if src_skip_gcps is not None:  # ...or use setting from src
                 kwargs['skip_gcps'] = int(src_skip_gcps)
 
+        if resamplingPlan is not None:
+            self._reproject_with_plan(dstDomain, resamplingPlan,
+                                      eResampleAlg)
+            return
+
+        if nThreads is not None:
+            kwargs['nThreads'] = nThreads
+
         # create Warped VRT
         self.vrt = self.vrt.get_warped_vrt(dstSRS=dstSRS,
                                            dstGCPs=dstGCPs,
@@ -1108,23 +1737,79 @@ class Nansat(Domain):
         subMetaData.pop('fileName')
         self.set_metadata(subMetaData)
 
+        if materialize:
+            # one undo() restores the VRT before reprojection
+            materializedVRT = self.vrt.get_materialized_vrt(tileSize,
+                                                            nProcesses)
+            materializedVRT.vrt = self.vrt.vrt
+            self.vrt = materializedVRT
+
+    def _reproject_with_plan(self, dstDomain, resamplingPlan, eResampleAlg):
+        ''' Resample all bands with resampling plan (see reproject()) '''
+        if dstDomain is None:
+            raise OptionError('dstDomain is required for resampling '
+                              'with a plan')
+        plan = resamplingPlan
+        planFileName = None
+        if isinstance(resamplingPlan, basestring):
+            planFileName = resamplingPlan
+            plan = None
+            if os.path.exists(planFileName):
+                plan = ResamplingPlan.load(planFileName)
+
+        if plan is None or not plan.is_compatible(self.vrt, dstDomain.vrt):
+            if planFileName is None:
+                raise OptionError('Resampling plan does not match geometry '
+                                  'of the source or destination!')
+            self.logger.info('Compute resampling plan %s' % planFileName)
+            plan = ResamplingPlan(self.vrt, dstDomain.vrt, eResampleAlg)
+            plan.save(planFileName)
+        elif plan.method != METHODS.get(eResampleAlg):
+            self.logger.warning('Resampling plan with method %s is used'
+                                % plan.method)
+
+        arrays = []
+        expressionBands = []
+        for iBand in range(self.vrt.dataset.RasterCount):
+            bandData, mask = self._read_band(iBand + 1, masked=True)
+            fillValue = self.get_metadata('_FillValue', iBand + 1)
+            if fillValue is not None:
+                fillValue = float(fillValue)
+            arrays.append(plan.apply(bandData, fillValue, mask))
+            if self.get_metadata('expression', iBand + 1):
+                expressionBands.append(iBand + 1)
+        self.vrt = self.vrt.get_array_vrt(arrays, dstDomain.vrt.dataset,
+                                          copyArrays=False)
+        # the arrays keep values computed with expressions
+        for bandNumber in expressionBands:
+            self.set_metadata('expression', '', bandNumber)
+
     def undo(self, steps=1):
         '''Undo reproject, resize, add_band or crop of Nansat object
 
-        Restore the self.vrt from self.vrt.vrt
+        Restore the self.vrt from self.vrt.vrt or remove the bands appended
+        to self.vrt by add_bands()
 
         Parameters
         -----------
         steps : int
-            How many steps back to undo
+            How many steps back to undo (not more than self.undoDepth)
 
         Modifies
         --------
         self.vrt
 
         '''
-
-        self.vrt = self.vrt.get_sub_vrt(steps)
+        if self.undoDepth is not None:
+            steps = min(steps, self.undoDepth)
+        vrt = self.vrt
+        for step in range(steps):
+            if len(vrt.bandBatches) > 0:
+                # remove bands appended in place (see add_bands())
+                vrt = vrt.remove_band_batch()
+            else:
+                vrt = vrt.get_sub_vrt()
+        self.vrt = vrt
 
     def watermask(self, mod44path=None, dstDomain=None, **kwargs):
         ''' Create numpy array with watermask (water=1, land=0)
@@ -1281,16 +1966,7 @@ class Nansat(Domain):
             bands = [self._get_band_number(bands)]
 
         # == create 3D ARRAY ==
-        array = None
-        for band in bands:
-            # get array from band and reshape to (1,height,width)
-            iArray = self[band]
-            iArray = iArray.reshape(1, iArray.shape[0], iArray.shape[1])
-            # create new 3D array or append band
-            if array is None:
-                array = iArray
-            else:
-                array = np.append(array, iArray, axis=0)
+        array = self.get_bands(bands)
 
         # == CREATE FIGURE object and parse input parameters ==
         fig = Figure(array, **kwargs)
@@ -1459,15 +2135,8 @@ class Nansat(Domain):
             If time is the same for all bands, the list contains 1 item
 
         '''
-        time = []
-        for i in range(self.vrt.dataset.RasterCount):
-            band = self.get_GDALRasterBand(i + 1)
-            try:
-                time.append(dateutil.parser.parse(
-                            band.GetMetadataItem('time')))
-            except:
-                self.logger.debug('Band ' + str(i + 1) + ' has no time')
-                time.append(None)
+        # times are parsed once and kept in the index of band metadata
+        time = list(self.vrt.get_band_index().times)
 
         if bandID is not None:
             bandNumber = self._get_band_number(bandID)
@@ -1524,6 +2193,7 @@ class Nansat(Domain):
 
         '''
         # set all metadata to the dataset or to the band
+        self.vrt._unshare()
         if bandID is None:
             metaReceiverVRT = self.vrt.dataset
         else:
@@ -1537,6 +2207,12 @@ class Nansat(Domain):
         else:
             metaReceiverVRT.SetMetadataItem(key, value)
 
+        # band metadata (e.g. _FillValue, expression) affects read data
+        if bandID is not None:
+            self.vrt.bandIndex = None
+            if self.cache is not None:
+                self.cache.clear()
+
     def _get_mapper(self, mapperName, **kwargs):
         ''' Create VRT file in memory (VSI-file) with variable mapping
 
@@ -1573,15 +2249,17 @@ class Nansat(Domain):
                 test_openable(f)
         # lazy import of nansat mappers
         # if nansat mappers were not imported yet
-        global nansatMappers
+        global nansatMappers, nansatMapperIndex
         if nansatMappers is None:
-            nansatMappers = _import_mappers()
+            nansatMappers = _import_mappers(lazy=True)
+        if nansatMapperIndex is None:
+            nansatMapperIndex = MapperIndex(nansatMappers)
 
         # open GDAL dataset. It will be parsed to all mappers for testing
         gdalDataset = None
         if self.fileName[:4] != 'http':
             try:
-                gdalDataset = gdal.Open(self.fileName)
+                gdalDataset = datasetPool.get(self.fileName)
             except RuntimeError:
                 self.logger.error('GDAL could not open ' + self.fileName +
                                   ', trying to read with Nansat mappers...')
@@ -1601,7 +2279,8 @@ class Nansat(Domain):
                                                         '').replace('.py',
                                                                     '').lower()
             # check if the mapper is available
-            if mapperName not in nansatMappers:
+            if (mapperName not in nansatMappers or
+                    _load_mapper(mapperName) is None):
                 raise Error('Mapper ' + mapperName + ' not found')
 
             # check if mapper is importbale or raise an ImportError error
@@ -1617,10 +2296,17 @@ class Nansat(Domain):
                                                **kwargs)
             self.mapper = mapperName.replace('mapper_', '')
         else:
-            # We test all mappers, import one by one
-            for iMapper in nansatMappers:
+            # We test all mappers which match the file, import one by one
+            candidates = nansatMapperIndex.candidates(self.fileName,
+                                                      gdalDataset, metadata)
+            self.logger.debug('Mappers to try: %s' % str(candidates))
+            for iMapper in candidates:
+                # import mapper only when it is tried
+                mapper = _load_mapper(iMapper)
+                if mapper is None:
+                    continue
                 # skip non-importable mappers
-                if isinstance(nansatMappers[iMapper], tuple):
+                if isinstance(mapper, tuple):
                     # keep errors to show before use of generic mapper
                     importErrors.append(nansatMappers[iMapper][1])
                     continue
@@ -1664,6 +2350,42 @@ class Nansat(Domain):
 
         return tmpVRT
 
+    def _get_cached_mapper(self, cacheDir, mapperName, **kwargs):
+        ''' Get VRT from the persistent cache or create and cache it
+
+        Parameters
+        -----------
+        cacheDir : str or VRTCache
+            directory of the cache or the cache object
+        mapperName : str
+            see Nansat._get_mapper
+
+        Returns
+        --------
+        tmpVRT : VRT object
+
+        '''
+        if not isinstance(cacheDir, VRTCache):
+            cacheDir = VRTCache(cacheDir, logLevel=self.logger.level)
+        key = cacheDir.get_key(self.fileName, mapperName, kwargs)
+        if key is None:
+            # not a file or mapper arguments which cannot be hashed
+            return self._get_mapper(mapperName, **kwargs)
+
+        tmpVRT, mapper = cacheDir.get(key, _get_mapper_version)
+        if tmpVRT is not None:
+            self.logger.info('VRT is read from cache %s' % key)
+            self.mapper = mapper.replace('mapper_', '')
+            return tmpVRT
+
+        tmpVRT = self._get_mapper(mapperName, **kwargs)
+        # cache only VRTs created by mappers
+        if hasattr(self, 'mapper'):
+            mapper = 'mapper_' + self.mapper
+            cacheDir.put(key, tmpVRT, mapper, _get_mapper_version(mapper))
+
+        return tmpVRT
+
     def _get_pixelValue(self, val, defVal):
         if val == '':
             return defVal
@@ -1693,18 +2415,9 @@ class Nansat(Domain):
         if type(bandID) == str:
             bandID = {'name': bandID}
 
-        # if bandID is dict: search self.bands with seraching criteria
+        # if bandID is dict: search index of bands with seraching criteria
         if type(bandID) == dict:
-            bandsMeta = self.bands()
-            for b in bandsMeta:
-                numCorrectKeys = 0
-                for key in bandID:
-                    if (key in bandsMeta[b] and
-                            bandID[key] == bandsMeta[b][key]):
-                        numCorrectKeys = numCorrectKeys + 1
-                    if numCorrectKeys == len(bandID):
-                        bandNumber = b
-                        break
+            bandNumber = self.vrt.get_band_index().find(bandID)
 
         # if bandID is int and with bounds: return this number
         if (type(bandID) == int and bandID >= 1 and
@@ -1719,6 +2432,50 @@ class Nansat(Domain):
 
         return bandNumber
 
+    def _get_window(self, rows=None, cols=None):
+        '''Convert row and column indices into GDAL window
+
+        Parameters
+        ----------
+        rows, cols : int or slice or None
+            indices of rows and columns as in NumPy indexing.
+            None means all rows (or columns).
+
+        Returns
+        --------
+        xOff, yOff, xSize, ySize : int
+            window to be read with GDAL
+        rowIndex, colIndex : int or slice
+            indices to be applied to the read window (e.g. to take every
+            n-th row or to select a single row)
+
+        '''
+        rasterYSize, rasterXSize = self.shape()
+        window = []
+        indices = []
+        for index, rasterSize in [(cols, rasterXSize), (rows, rasterYSize)]:
+            if index is None:
+                index = slice(None)
+            if isinstance(index, slice):
+                positions = range(*index.indices(rasterSize))
+                if len(positions) == 0:
+                    raise OptionError('Empty window %s' % str(index))
+                indices.append(slice(None, None, index.step))
+            elif isinstance(index, (int, long, np.integer)):
+                if index < 0:
+                    index += rasterSize
+                if index < 0 or index >= rasterSize:
+                    raise IndexError('Index %d is out of range 0..%d'
+                                     % (index, rasterSize - 1))
+                positions = [index]
+                indices.append(0)
+            else:
+                raise OptionError('Wrong index %s' % str(index))
+            window += [min(positions), max(positions) - min(positions) + 1]
+
+        xOff, xSize, yOff, ySize = window
+        return xOff, yOff, xSize, ySize, indices[1], indices[0]
+
     def get_transect(self, points=None, bandList=[1], latlon=True,
                            returnOGR=False, layerNum=0,
                            smoothRadius=0, smoothAlg=0, transect=True,
@@ -2123,71 +2880,54 @@ class Nansat(Domain):
                                'larger or equal to image!'))
             return 2
 
-        # create super VRT and get its XML
+        # create super VRT and modify its XML
         self.vrt = self.vrt.get_super_vrt()
-        xml = self.vrt.read_xml()
-        node0 = Node.create(xml)
-
-        # change size
-        node0.node('VRTDataset').replaceAttribute('rasterXSize', str(xSize))
-        node0.node('VRTDataset').replaceAttribute('rasterYSize', str(ySize))
-
-        # replace x/y-Off and x/y-Size
-        #   in <SrcRect> and <DstRect> of each source
-        for iNode1 in node0.nodeList('VRTRasterBand'):
-            iNode2 = iNode1.node('ComplexSource')
-
-            iNode3 = iNode2.node('SrcRect')
-            iNode3.replaceAttribute('xOff', str(xOff))
-            iNode3.replaceAttribute('yOff', str(yOff))
-            iNode3.replaceAttribute('xSize', str(xSize))
-            iNode3.replaceAttribute('ySize', str(ySize))
-
-            iNode3 = iNode2.node('DstRect')
-            iNode3.replaceAttribute('xSize', str(xSize))
-            iNode3.replaceAttribute('ySize', str(ySize))
-
-        # write modified XML
-        xml = node0.rawxml()
-        self.vrt.write_xml(xml)
+        with self.vrt.xml_transaction() as node0:
+            # change size
+            node0.node('VRTDataset').replaceAttribute('rasterXSize',
+                                                      str(xSize))
+            node0.node('VRTDataset').replaceAttribute('rasterYSize',
+                                                      str(ySize))
+
+            # replace x/y-Off and x/y-Size
+            #   in <SrcRect> and <DstRect> of each source
+            for iNode1 in node0.nodeList('VRTRasterBand'):
+                iNode2 = iNode1.node('ComplexSource')
+
+                iNode3 = iNode2.node('SrcRect')
+                iNode3.replaceAttribute('xOff', str(xOff))
+                iNode3.replaceAttribute('yOff', str(yOff))
+                iNode3.replaceAttribute('xSize', str(xSize))
+                iNode3.replaceAttribute('ySize', str(ySize))
+
+                iNode3 = iNode2.node('DstRect')
+                iNode3.replaceAttribute('xSize', str(xSize))
+                iNode3.replaceAttribute('ySize', str(ySize))
 
         # modify GCPs or GeoTranfrom to fit the new shape of image
         gcps = self.vrt.dataset.GetGCPs()
         if len(gcps) > 0:
-            dstGCPs = []
-            i = 0
             # keep current GCPs
-            for igcp in gcps:
-                if (0 < igcp.GCPPixel - xOff and
-                        igcp.GCPPixel - xOff < xSize and
-                        0 < igcp.GCPLine - yOff and
-                        igcp.GCPLine - yOff < ySize):
-                    i += 1
-                    dstGCPs.append(gdal.GCP(igcp.GCPX, igcp.GCPY, 0,
-                                            igcp.GCPPixel - xOff,
-                                            igcp.GCPLine - yOff, '', str(i)))
-            numOfGCPs = i
+            dstGCPs = gcptools.crop(gcptools.from_gdal(gcps),
+                                    xOff, yOff, xSize, ySize)
+            numOfGCPs = dstGCPs.size
 
             if numOfGCPs < 100:
                 # create new 100 GPCs (10 x 10 regular matrix)
-                pixArray = []
-                linArray = []
-                for newPix in np.r_[0:xSize:10j]:
-                    for newLin in np.r_[0:ySize:10j]:
-                        pixArray.append(newPix + xOff)
-                        linArray.append(newLin + yOff)
-
-                lonArray, latArray = self.vrt.transform_points(pixArray,
-                                                               linArray)
-
-                for i in range(len(lonArray)):
-                    dstGCPs.append(gdal.GCP(lonArray[i], latArray[i], 0,
-                                            pixArray[i] - xOff,
-                                            linArray[i] - yOff,
-                                            '', str(numOfGCPs+i+1)))
+                newPix, newLin = np.meshgrid(np.r_[0:xSize:10j],
+                                             np.r_[0:ySize:10j],
+                                             indexing='ij')
+                lonArray, latArray = self.vrt.transform_points(
+                    (newPix.flatten() + xOff).tolist(),
+                    (newLin.flatten() + yOff).tolist())
+                newGCPs = gcptools.create(newPix, newLin, lonArray, latArray)
+                dstGCPs = np.hstack([dstGCPs, newGCPs])
+            dstGCPs['z'] = 0
+            dstGCPs['info'] = ''
+            dstGCPs['id'] = [str(i + 1) for i in range(dstGCPs.size)]
 
             # set new GCPss
-            self.vrt.dataset.SetGCPs(dstGCPs, NSR().wkt)
+            self.vrt.dataset.SetGCPs(gcptools.to_gdal(dstGCPs), NSR().wkt)
             # reproject new GCPs to the SRS of original GCPs
             nsr = NSR(self.vrt.dataset.GetGCPProjection())
             self.vrt.reproject_GCPs(nsr)
@@ -2209,14 +2949,38 @@ class Nansat(Domain):
         return 0, extent
 
 
-def _import_mappers(logLevel=None):
+class _LazyMapper(object):
+    ''' Mapper which is listed in the manifest and imported only when used '''
+    def __init__(self, finder, name, matchRules=None):
+        self.finder = finder
+        self.name = name
+        self.matchRules = matchRules
+
+    def load(self):
+        ''' Import mapper module and return class Mapper (None if absent) '''
+        loader = self.finder.find_module(self.name)
+        module = loader.load_module(self.name)
+        return getattr(module, 'Mapper', None)
+
+
+def _import_mappers(logLevel=None, lazy=False):
     ''' Import available mappers into a dictionary
 
+    Parameters
+    -----------
+    logLevel : int, optional
+    lazy : bool, optional, default=False
+        If True, mappers listed in the manifest of the mappers package
+        (see nansat.mapperindex) are not imported. _LazyMapper with
+        match rules from the manifest is kept instead and the mapper is
+        imported by _load_mapper when needed.
+
     Returns
     --------
     nansatMappers : dict
         key  : mapper name
         value: class Mapper(VRT) from the mapper module
+               (or _LazyMapper if <lazy> is True)
 
     '''
     logger = add_logger('import_mappers', logLevel=logLevel)
@@ -2239,9 +3003,20 @@ def _import_mappers(logLevel=None):
 
     for mappersPackage in mappersPackages:
         logger.debug('From package: %s' % mappersPackage.__path__)
+        manifest = None
+        if lazy:
+            manifest = read_manifest(mappersPackage.__path__[0])
         # scan through modules and load all modules that contain class Mapper
         for finder, name, ispkg in (pkgutil.
                                     iter_modules(mappersPackage.__path__)):
+            if manifest is not None:
+                # skip helper modules, don't import mappers from manifest
+                if name in manifest['modules']:
+                    continue
+                if name in manifest['mappers']:
+                    nansatMappers[name] = _LazyMapper(
+                                    finder, name, manifest['mappers'][name])
+                    continue
             logger.debug('Loading mapper %s' % name)
             loader = finder.find_module(name)
             # try to import mapper module
@@ -2265,3 +3040,72 @@ def _import_mappers(logLevel=None):
 
     return nansatMappers
 
+
+def _get_mapper_version(name):
+    ''' Get version of the mapper: MD5 hash of the source code
+
+    Parameters
+    -----------
+    name : str
+        name of the mapper module
+
+    Returns
+    --------
+    version : str or None
+        None, if the mapper or its source code is not found
+
+    '''
+    global nansatMappers
+    if nansatMappers is None:
+        nansatMappers = _import_mappers(lazy=True)
+    mapper = nansatMappers.get(name, None)
+    if isinstance(mapper, _LazyMapper):
+        fileName = os.path.join(mapper.finder.path, name + '.py')
+    elif mapper is not None and not isinstance(mapper, tuple):
+        fileName = os.path.splitext(sys.modules[mapper.__module__].
+                                    __file__)[0] + '.py'
+    else:
+        return None
+
+    if not os.path.exists(fileName):
+        return None
+
+    return hashlib.md5(open(fileName, 'rb').read()).hexdigest()
+
+
+def _load_mapper(name, logLevel=None):
+    ''' Import lazy mapper from nansatMappers (if not imported yet)
+
+    Parameters
+    -----------
+    name : str
+        name of the mapper module
+    logLevel : int, optional
+
+    Returns
+    --------
+    mapper : class Mapper(VRT) or exc_info tuple (if the mapper could not
+        be imported) or None (if the module has no class Mapper)
+
+    Modifies
+    ---------
+    nansatMappers : the lazy mapper is replaced with the imported one
+
+    '''
+    mapper = nansatMappers[name]
+    if not isinstance(mapper, _LazyMapper):
+        return mapper
+
+    logger = add_logger('import_mappers', logLevel=logLevel)
+    logger.debug('Loading mapper %s' % name)
+    try:
+        mapper = mapper.load()
+    except ImportError:
+        # keep ImportError instance instead of the mapper
+        mapper = sys.exc_info()
+        logger.error('Mapper %s could not be imported'
+                     % name, exc_info=mapper)
+
+    nansatMappers[name] = mapper
+    return mapper
+
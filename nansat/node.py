@@ -16,9 +16,15 @@
 # but WITHOUT ANY WARRANTY without even the implied warranty of
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 import os
-import re
+from bisect import bisect_left, bisect_right
+from io import BytesIO
 import xml.dom.minidom as xdm
 
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
 
 class Node(object):
     '''
@@ -57,15 +63,24 @@ class Node(object):
 
     You can find the first node with tag == 'tag' by saying
     node('tag'). If there are multiple nodes with the same tag
-    at the same level, use nodeList('tag').
+    at the same level, use nodeList('tag'). Nodes can also be found
+    by path, e.g. find('geolocationGrid/geolocationGridPointList') or
+    findall('//geolocationGridPoint').
 
     The Node class is also designed to create a kind of 'domain
     specific language' by subclassing Node to create Node types
     specific to your problem domain.
 
-    This implementation uses xml.dom.minidom which is available
-    in the standard Python 2.4 library. However, it can be
-    retargeted to use other XML libraries without much effort.
+    This implementation uses xml.etree for parsing and serialization.
+    The root Node of each tree keeps an index of all subnodes by tag
+    (in document order), so node(), find() and findall() do not walk
+    the tree. The index is dropped when the structure of the tree is
+    changed with +=, insert(), replaceNode(), delNode(), replaceTag() or
+    by setting a new tag; after that node() searches recursively until
+    the searches have visited as many nodes as there are in the tree, and
+    then the index is rebuilt. Values and attributes can be changed
+    without dropping the index. The list of children should not be
+    modified directly.
 
     '''
 
@@ -74,6 +89,10 @@ class Node(object):
         Python objects until an XML representation is needed.
 
         '''
+        self._parent = None
+        self._index = None
+        self._size = 0
+        self._scanned = 0
         self.tag = tag.strip()
         self.attributes = attributes
         self.children = []
@@ -81,6 +100,16 @@ class Node(object):
         if self.value:
             self.value = self.value.strip()
 
+    @property
+    def tag(self):
+        ''' Tag of the node '''
+        return self._tag
+
+    @tag.setter
+    def tag(self, tag):
+        self._tag = tag
+        self._invalidate()
+
     def getAttribute(self, name):
         ''' Read XML attribute of this node. '''
         return self.attributes[name]
@@ -103,19 +132,81 @@ class Node(object):
 
         elemNum : int
             if there are several same tag, specify which element to take.
+            Subnodes are counted per immediate child: elemNum=1 gives the
+            first subnode with this tag in the second child which has such
+            subnodes.
 
         '''
         if self.tag == tag:
             return self
+        root = self._root()
+        if root._index is None and root._scanned < root._size:
+            # the tree was changed: search without rebuilding the index
+            # until the searches have cost about as much as the rebuild
+            counter = [0]
+            result = self._search(tag, elemNum, counter)
+            root._scanned += counter[0]
+            return result
+        positions, nodes = self._get_index().get(tag, ((), ()))
+        iPos = bisect_right(positions, self._start)
         ielm = 0
-        for child in self.children:
-            result = child.node(tag)
-            if result and ielm == elemNum:
-                return result
-            elif result:
-                ielm += 1
+        while iPos < len(positions) and positions[iPos] < self._end:
+            if ielm == elemNum:
+                return nodes[iPos]
+            ielm += 1
+            # skip other subnodes in the same immediate child
+            child = nodes[iPos]
+            while child._parent is not self:
+                child = child._parent
+            iPos = bisect_left(positions, child._end, iPos)
         return False
 
+    def find(self, path):
+        ''' Find the first subnode matching <path> (see findall()).
+
+        Returns False if nothing is found.
+
+        '''
+        nodes = self.findall(path)
+        if nodes:
+            return nodes[0]
+        return False
+
+    def findall(self, path):
+        ''' Find all subnodes matching <path>, in document order
+
+        path : str
+            Tags separated by '/'. Each tag selects immediate children of
+            the nodes selected by the previous tag, '//' selects subnodes
+            at any depth, '*' selects any tag and '.' the node itself. E.g.
+            'geolocationGrid/geolocationGridPointList/*' or
+            '//geolocationGridPoint'
+
+        '''
+        nodes = [self]
+        anyDepth = False
+        for step in path.split('/'):
+            if step == '':
+                anyDepth = True
+                continue
+            if step == '.':
+                continue
+            found = []
+            seen = set()
+            for parent in nodes:
+                if anyDepth:
+                    subnodes = parent._subnodes(step)
+                else:
+                    subnodes = [n for n in parent.children
+                                if step == '*' or n.tag == step]
+                for subnode in subnodes:
+                    if id(subnode) not in seen:
+                        seen.add(id(subnode))
+                        found.append(subnode)
+            nodes = found
+            anyDepth = False
+        return nodes
+
     def replaceNode(self, tag, elemNum=0, newNode=None):
         ''' Find the first subnode with this tag and replace with given node.
 
@@ -125,75 +216,37 @@ class Node(object):
             number of subnode among other subnodes with similar tag
 
         '''
-        status = False
-        elemi = 0
-        for i in range(len(self.children)):
-            if str(self.children[i].tag) == tag:
-                if elemi == elemNum:
-                    self.children[i] = newNode
-                    status = True
-                    break
-                else:
-                    elemi += 1
-        return status
+        nodes = self.nodeList(tag)
+        if len(nodes) <= elemNum:
+            return False
+        oldNode = nodes[elemNum]
+        if newNode is not oldNode:
+            self._adopt(newNode)
+            i = [id(child) for child in self.children].index(id(oldNode))
+            self.children[i] = newNode
+            oldNode._parent = None
+            self._invalidate()
+        return True
 
     def delNode(self, tag, options=None):
         '''
-        Recursively find the all subnodes with this tag and remove
-        from self.children.
+        Remove immediate children which are or contain subnodes with this
+        tag.
 
         options : dictionary
             if there are several same tags, specify a node by their attributes.
 
         '''
-        for i, child in enumerate(self.children):
-            if child.node(tag) and options is None:
-                self.children.pop(i)
-            elif child.node(tag):
-                for j, jKey in enumerate(options.keys()):
-                    try:
-                        if (child.getAttribute(jKey) == str(options[jKey]) and
-                                len(options.keys()) == j+1):
-                            self.children.pop(i)
-                    except:
-                        break
+        children = []
+        for child in self.children:
+            if child.node(tag) and (options is None or
+                                    child._has_attributes(options)):
+                child._parent = None
             else:
-                child.delNode(tag)
-
-    def find_dom_child(self, dom, tagName, n=0):
-        '''Recoursively find child of the dom'''
-        children = dom.childNodes
-        theChild = None
-
-        chn = 0
-        for child in children:
-            print child, child.nodeType, chn
-            if child.nodeType == 1:
-                print child.tagName
-                if str(child.tagName) == tagName:
-                    print child.tagName, tagName, 'OK'
-                    if chn == n:
-                        theChild = child
-                    chn += 1
-
-            if theChild is not None:
-                break
-
-            if child.hasChildNodes():
-                print 'has childs'
-                theChild = self.find_dom_child(child, tagName, n)
-
-        return theChild
-
-    def _replace_dom_Node(self, tag, nodeNumber, contents):
-        '''Replace child node with new contents'''
-
-        dom0 = self.dom()
-        oldChild = self.find_dom_child(dom0, tag, nodeNumber)
-        newChild = xdm.parseString(contents).childNodes[0]
-        dom0.replaceChild(newChild, oldChild)
-
-        return Node.create(dom0)
+                children.append(child)
+        if len(children) < len(self.children):
+            self.children = children
+            self._invalidate()
 
     def nodeList(self, tag):
         '''
@@ -209,17 +262,13 @@ class Node(object):
 
     def tagList(self):
         ''' Produce a list of all tags of the immediate children '''
-        taglist = []
-        for iTag in range(len(self.children)):
-            taglist.append(str(self.children[iTag].tag))
-        return taglist
+        return [str(child.tag) for child in self.children]
 
     def replaceTag(self, oldTag, newTag):
         ''' Replace tag name '''
-        tags = self.tagList()
-        for itag, itagName in enumerate(tags):
-            if itagName == oldTag:
-                self.node(self.tag).children[itag].tag = newTag
+        for child in self.children:
+            if child.tag == oldTag:
+                child.tag = newTag
 
     def getAttributeList(self):
         ''' get attributes and valuse from the node and return their lists '''
@@ -231,12 +280,30 @@ class Node(object):
         return nameList, valList
 
     def insert(self, contents):
-        ''' return Node of the node with inserted <contents>'''
-        dom2 = xdm.parseString(contents)
-        dom1 = xdm.parseString(self.dom().toxml())
-        dom1.childNodes[0].appendChild(dom1.importNode(dom2.childNodes[0],
-                                                       True))
-        return Node.create(dom1)
+        ''' return copy of the node with inserted <contents>
+
+        contents : str or Node
+            XML or Node to add as the last child
+
+        '''
+        if isinstance(contents, Node):
+            newChild = contents.copy()
+        else:
+            newChild = Node._parse(BytesIO(_to_bytes(contents)), False)
+        newNode = self.copy()
+        newNode += newChild
+        return newNode
+
+    def copy(self):
+        ''' Return deep copy of the node (without parent) '''
+        newNode = Node(self.tag)
+        newNode.attributes = dict(self.attributes)
+        newNode.value = self.value
+        for child in self.children:
+            newChild = child.copy()
+            newChild._parent = newNode
+            newNode.children.append(newChild)
+        return newNode
 
     def __getitem__(self, tag):
         '''
@@ -265,9 +332,15 @@ class Node(object):
         subnode.value = newValue
 
     def __iadd__(self, other):
-        ''' Add child nodes using operator += '''
+        ''' Add child nodes using operator +=
+
+        If <other> is already a child of another node, it is moved.
+
+        '''
         assert isinstance(other, Node), 'Tried to += ' + str(other)
+        self._adopt(other)
         self.children.append(other)
+        self._invalidate()
         return self
 
     def __add__(self, other):
@@ -283,68 +356,219 @@ class Node(object):
             result += '    value: [%s]' % self.value
         return result
 
+    def _adopt(self, other):
+        ''' Detach <other> from its parent and make self its parent '''
+        if other._parent is not None:
+            oldParent = other._parent
+            oldParent.children = [child for child in oldParent.children
+                                   if child is not other]
+            oldParent._invalidate()
+        other._parent = self
+        other._index = None
+
+    def _root(self):
+        ''' Return root node of the tree '''
+        root = self
+        while root._parent is not None:
+            root = root._parent
+        return root
+
+    def _invalidate(self):
+        ''' Drop tag index of the tree after change of its structure '''
+        root = self._root()
+        if root._index is not None:
+            root._index = None
+            root._scanned = 0
+
+    def _search(self, tag, elemNum, counter):
+        ''' Recursively find subnode with this tag without the index '''
+        counter[0] += 1
+        if self.tag == tag:
+            return self
+        ielm = 0
+        for child in self.children:
+            result = child._search(tag, 0, counter)
+            if result and ielm == elemNum:
+                return result
+            elif result:
+                ielm += 1
+        return False
+
+    def _get_index(self):
+        ''' Return tag index of the tree, build it if needed
+
+        The index is a dictionary {tag: ([positions], [nodes])} of all
+        nodes of the tree in document order. Each node gets position of
+        its start (_start) and end of its subtree (_end).
+
+        '''
+        root = self._root()
+        if root._index is None:
+            index = {}
+            position = 0
+            stack = [(root, False)]
+            while stack:
+                node, isEnd = stack.pop()
+                if isEnd:
+                    node._end = position
+                    continue
+                node._start = position
+                positions, nodes = index.setdefault(node.tag, ([], []))
+                positions.append(position)
+                nodes.append(node)
+                position += 1
+                stack.append((node, True))
+                stack.extend((child, False)
+                             for child in reversed(node.children))
+            root._index = index
+            root._size = position
+        return root._index
+
+    def _subnodes(self, tag):
+        ''' Return all subnodes with the tag ('*' for any) in document order
+        '''
+        index = self._get_index()
+        if tag == '*':
+            subnodes = [n for positions, nodes in index.values()
+                        for n in nodes if self._start < n._start < self._end]
+            return sorted(subnodes, key=lambda n: n._start)
+        positions, nodes = index.get(tag, ((), ()))
+        return nodes[bisect_right(positions, self._start):
+                     bisect_left(positions, self._end)]
+
+    def _has_attributes(self, options):
+        ''' Check if node has all attributes with values from <options> '''
+        for key in options:
+            if self.attributes.get(key) != str(options[key]):
+                return False
+        return True
+
     # The following are the only methods that rely on the underlying
     # Implementation, and thus the only methods that need to change
     # in order to retarget to a different underlying implementation.
 
-    # A static dom implementation object, used to create elements:
-    doc = xdm.getDOMImplementation().createDocument(None, None, None)
-
-    def dom(self):
+    def element(self):
         '''
-        Lazily create a minidom from the information stored
+        Create an xml.etree Element from the information stored
         in this Node object.
 
         '''
-        element = Node.doc.createElement(self.tag)
-        for key, val in self.attributes.items():
-            element.setAttribute(key, val)
-        if self.value:
-            assert not self.children, ('cannot have value and children: %s'
-                                       % str(self))
-            element.appendChild(Node.doc.createTextNode(self.value))
-        else:
-            for child in self.children:
-                element.appendChild(child.dom())  # Generate children as well
+        element = ET.Element(self.tag, self.attributes)
+        stack = [(self, element)]
+        while stack:
+            node, elem = stack.pop()
+            if node.value:
+                assert not node.children, ('cannot have value and '
+                                           'children: %s' % str(node))
+                elem.text = node.value
+            for child in node.children:
+                subElem = ET.SubElement(elem, child.tag, child.attributes)
+                stack.append((child, subElem))
         return element
 
+    def dom(self):
+        ''' Create a minidom element (kept for compatibility) '''
+        return xdm.parseString(self.rawxml()).documentElement
+
     def xml(self, separator='  '):
-        return self.dom().toprettyxml(separator)
+        element = self.element()
+        _indent(element, separator)
+        return '<?xml version="1.0" ?>\n' + ET.tostring(element) + '\n'
 
     def rawxml(self):
-        return str(self.dom().toxml())
+        return str(ET.tostring(self.element()))
 
     @staticmethod
     def create(dom):
         '''
         Create a Node representation, given either
-        a string representation of an XML doc, or a dom.
+        a string representation of an XML doc (or name of XML file),
+        an xml.etree Element or a minidom.
+
+        Whitespace in values is collapsed when the XML doc is given as
+        string.
 
         '''
-        if isinstance(dom, str):
+        if isinstance(dom, basestring):
             if os.path.exists(dom):
-                # parse input file
-                dom = xdm.parse(dom)
-            else:
-                # Strip all extraneous whitespace so that
-                # text input is handled consistently:
-                dom = re.sub('\s+', ' ', dom)
-                dom = dom.replace('> ', '>')
-                dom = dom.replace(' <', '<')
-                return Node.create(xdm.parseString(dom))
-        if dom.nodeType == dom.DOCUMENT_NODE:
-            return Node.create(dom.childNodes[0])
-        if dom.nodeName == '#text':
-            return
-        node = Node(dom.nodeName)
-        if dom.attributes:
-            for name, val in dom.attributes.items():
-                node.setAttribute(name, val)
-        for n in dom.childNodes:
-            if n.nodeType == n.TEXT_NODE and n.wholeText.strip():
-                node.value = n.wholeText
+                return Node._parse(dom, False)
+            return Node._parse(BytesIO(_to_bytes(dom)), True)
+        if ET.iselement(dom):
+            return Node._parse(BytesIO(ET.tostring(dom)), False)
+        if hasattr(dom, 'toxml'):
+            return Node._parse(BytesIO(_to_bytes(dom.toxml())), False)
+        raise TypeError('Cannot create Node from %s' % str(dom))
+
+    @staticmethod
+    def _parse(source, collapse):
+        ''' Parse XML from file name or file object into tree of Nodes
+
+        Namespace prefixes and declarations are kept as in the source:
+        tags are e.g. 'safe:startTime' and not '{uri}startTime'.
+
+        '''
+        prefixes = {}
+        newNamespaces = []
+        stack = []
+        root = None
+        for event, elem in ET.iterparse(source,
+                                        events=('start-ns', 'start', 'end')):
+            if event == 'start-ns':
+                prefixes[elem[1]] = elem[0]
+                newNamespaces.append(elem)
+            elif event == 'start':
+                node = Node(_qualified_name(elem.tag, prefixes))
+                for prefix, uri in newNamespaces:
+                    node.attributes['xmlns:' + prefix if prefix
+                                    else 'xmlns'] = uri
+                newNamespaces = []
+                for key, val in elem.attrib.items():
+                    node.attributes[_qualified_name(key, prefixes)] = val
+                if stack:
+                    node._parent = stack[-1]
+                    stack[-1].children.append(node)
+                else:
+                    root = node
+                stack.append(node)
             else:
-                subnode = Node.create(n)
-                if subnode:
-                    node += subnode
-        return node
+                node = stack.pop()
+                text = elem.text
+                if text and text.strip():
+                    if collapse:
+                        text = ' '.join(text.split())
+                    node.value = text
+                # free memory taken by the parsed element
+                elem.clear()
+        return root
+
+
+def _to_bytes(text):
+    ''' Encode unicode XML text for the parser '''
+    if isinstance(text, unicode):
+        return text.encode('utf-8')
+    return text
+
+
+def _qualified_name(name, prefixes):
+    ''' Convert '{uri}name' into 'prefix:name' '''
+    if name[0] != '{':
+        return name
+    uri, name = name[1:].split('}', 1)
+    prefix = prefixes.get(uri)
+    if prefix:
+        return prefix + ':' + name
+    return name
+
+
+def _indent(elem, separator, level=0):
+    ''' Add whitespace to the element for pretty printing '''
+    indent = '\n' + level * separator
+    if len(elem):
+        if not elem.text or not elem.text.strip():
+            elem.text = indent + separator
+        for subElem in elem:
+            _indent(subElem, separator, level + 1)
+        if not subElem.tail or not subElem.tail.strip():
+            subElem.tail = indent
+    if level and (not elem.tail or not elem.tail.strip()):
+        elem.tail = indent
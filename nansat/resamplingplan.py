@@ -0,0 +1,324 @@
+# Name:    resamplingplan.py
+# Purpose: Precomputed resampling of one source grid onto a destination grid
+# Created:      17.10.2026
+# Copyright:    (c) NERSC 2011 - 2026
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+'''Resampling plans for repeated reprojection onto the same grid
+
+A plan keeps, for each destination pixel, the index of the source pixel
+(nearest neighbour) or of the upper left of four source pixels and the
+weights along columns and rows (bilinear). The plan is computed once with
+the GDAL transformer and applied to any band of a source with the same
+geometry (geotransform, projection, GCPs within tolerance, geolocation
+array) by vectorized gather (see ResamplingPlan.apply()).
+
+Examples
+--------
+plan = ResamplingPlan(n.vrt, d.vrt, eResampleAlg=1)
+plan.save('plan.npz')
+...
+plan = ResamplingPlan.load('plan.npz')
+if plan.is_compatible(n2.vrt, d.vrt):
+    array = plan.apply(n2[1])
+
+'''
+from __future__ import absolute_import
+
+import numpy as np
+
+from nansat import gcps as gcptools
+from nansat.tools import gdal, OptionError
+
+# methods of resampling by GDALResampleAlg
+METHODS = {0: 'nearest', 1: 'bilinear'}
+
+
+def get_geometry(dataset):
+    '''Get properties of a GDAL dataset which define its grid
+
+    Returns
+    --------
+    geometry : dict
+        shape, geoTransform, projection, gcpProjection, gcps (4 x N array
+        with pixel, line, x, y) and geolocation (list of metadata items)
+
+    '''
+    gcps = gcptools.from_gdal(dataset.GetGCPs())
+    return {'shape': (dataset.RasterYSize, dataset.RasterXSize),
+            'geoTransform': tuple(dataset.GetGeoTransform()),
+            'projection': str(dataset.GetProjection()),
+            'gcpProjection': str(dataset.GetGCPProjection()),
+            'gcps': np.array([gcps['pixel'], gcps['line'],
+                              gcps['x'], gcps['y']], 'float64'),
+            'geolocation': sorted('%s=%s' % item for item in
+                                  (dataset.GetMetadata('GEOLOCATION') or
+                                   {}).items())}
+
+
+def same_geometry(geometry1, geometry2, tolerance=0):
+    '''Check if two geometries (see get_geometry()) define the same grid
+
+    Size, geotransform, projections and geolocation arrays should be equal,
+    GCPs should have equal pixel/line and X/Y within <tolerance>.
+
+    '''
+    for key in ['shape', 'geoTransform', 'projection', 'gcpProjection',
+                'geolocation']:
+        if geometry1[key] != geometry2[key]:
+            return False
+    gcps1 = geometry1['gcps']
+    gcps2 = geometry2['gcps']
+    if gcps1.shape != gcps2.shape:
+        return False
+    return (np.array_equal(gcps1[:2], gcps2[:2]) and
+            np.all(np.abs(gcps1[2:] - gcps2[2:]) <= tolerance))
+
+
+class ResamplingPlan(object):
+    '''Source pixels and weights for each destination pixel
+
+    Attributes
+    -----------
+    method : str
+        'nearest' or 'bilinear'
+    srcGeometry, dstGeometry : dict
+        geometries of source and destination (see get_geometry())
+    tolerance : float
+        maximum difference of X/Y of GCPs of compatible sources
+    index : 1D numpy array (int32)
+        index of the source pixel in the flattened source array for each
+        destination pixel (upper left pixel for bilinear), -1 outside of
+        the source
+    fx, fy : 1D numpy arrays (float32)
+        weights of the right and lower source pixels (bilinear only)
+
+    '''
+    # number of destination pixels processed at once
+    blockSize = 2 ** 20
+
+    def __init__(self, srcVRT=None, dstVRT=None, eResampleAlg=0,
+                 tolerance=1e-4):
+        '''Compute plan for resampling from <srcVRT> onto <dstVRT>
+
+        Parameters
+        -----------
+        srcVRT, dstVRT : VRT
+            source and destination (e.g. Nansat.vrt and Domain.vrt). If
+            None, empty plan is created (see load())
+        eResampleAlg : int
+            0 (nearest neighbour) or 1 (bilinear)
+        tolerance : float
+            maximum difference of X/Y of GCPs of compatible sources
+
+        '''
+        self.tolerance = tolerance
+        self.method = None
+        self.srcGeometry = None
+        self.dstGeometry = None
+        self.index = None
+        self.fx = None
+        self.fy = None
+        if srcVRT is None or dstVRT is None:
+            return
+
+        if eResampleAlg not in METHODS:
+            raise OptionError('Resampling plan supports only nearest '
+                              'neighbour (0) and bilinear (1) resampling')
+        self.method = METHODS[eResampleAlg]
+        self.srcGeometry = get_geometry(srcVRT.dataset)
+        self.dstGeometry = get_geometry(dstVRT.dataset)
+        srcYSize, srcXSize = self.srcGeometry['shape']
+        dstYSize, dstXSize = self.dstGeometry['shape']
+        if self.method == 'bilinear' and min(srcXSize, srcYSize) < 2:
+            raise OptionError('Bilinear resampling needs at least 2 x 2 '
+                              'source pixels')
+
+        options = []
+        if srcVRT.tps and srcVRT.dataset.GetGCPCount() > 0:
+            options.append('METHOD=GCP_TPS')
+        transformer = gdal.Transformer(srcVRT.dataset, dstVRT.dataset,
+                                       options)
+
+        nDst = dstXSize * dstYSize
+        self.index = np.empty(nDst, 'int32')
+        if self.method == 'bilinear':
+            self.fx = np.empty(nDst, 'float32')
+            self.fy = np.empty(nDst, 'float32')
+
+        # source pixel/line of centers of destination pixels
+        nRows = max(1, self.blockSize // dstXSize)
+        for row0 in range(0, dstYSize, nRows):
+            rows, cols = np.mgrid[row0:min(row0 + nRows, dstYSize),
+                                  0:dstXSize] + 0.5
+            points, success = transformer.TransformPoints(
+                1, np.column_stack([cols.ravel(), rows.ravel()]))
+            points = np.array(points)
+            x = points[:, 0]
+            y = points[:, 1]
+            valid = (np.array(success, bool) * (x >= 0) * (x <= srcXSize) *
+                     (y >= 0) * (y <= srcYSize))
+            block = slice(row0 * dstXSize, row0 * dstXSize + x.size)
+            if self.method == 'nearest':
+                x0 = np.clip(np.floor(x), 0, srcXSize - 1)
+                y0 = np.clip(np.floor(y), 0, srcYSize - 1)
+            else:
+                # interpolate between centers of source pixels
+                x = np.clip(x - 0.5, 0, srcXSize - 1)
+                y = np.clip(y - 0.5, 0, srcYSize - 1)
+                x0 = np.minimum(np.floor(x), srcXSize - 2)
+                y0 = np.minimum(np.floor(y), srcYSize - 2)
+                self.fx[block] = x - x0
+                self.fy[block] = y - y0
+            self.index[block] = np.where(valid, y0 * srcXSize + x0, -1)
+
+    def is_compatible(self, srcVRT, dstVRT, tolerance=None):
+        '''Check if the plan can be used for <srcVRT> and <dstVRT>
+
+        Parameters
+        -----------
+        srcVRT, dstVRT : VRT
+            source and destination
+        tolerance : float
+            maximum difference of X/Y of source GCPs (self.tolerance by
+            default)
+
+        '''
+        if tolerance is None:
+            tolerance = self.tolerance
+        return (same_geometry(self.srcGeometry,
+                              get_geometry(srcVRT.dataset), tolerance) and
+                same_geometry(self.dstGeometry,
+                              get_geometry(dstVRT.dataset)))
+
+    def apply(self, array, fillValue=None, mask=None):
+        '''Resample source array onto the destination grid
+
+        Invalid source pixels (see <mask>) are not used: nearest neighbour
+        of an invalid pixel is invalid, bilinear weights are normalized
+        over the valid pixels of the four neighbours.
+
+        Parameters
+        -----------
+        array : 2D numpy array
+            data on the source grid
+        fillValue : int or float
+            value of destination pixels outside of the source or without
+            valid source pixels. By default NaN for float arrays and 0 for
+            integer arrays
+        mask : 2D numpy array (bool)
+            True for valid source pixels. By default all finite values are
+            valid
+
+        Returns
+        --------
+        dstArray : 2D numpy array
+            data on the destination grid with the same data type
+
+        '''
+        if array.shape != self.srcGeometry['shape']:
+            raise OptionError('Shape of array %s does not match the plan %s'
+                              % (str(array.shape),
+                                 str(self.srcGeometry['shape'])))
+        if fillValue is None:
+            if array.dtype.kind in 'fc':
+                fillValue = np.nan
+            else:
+                fillValue = 0
+        if mask is None and array.dtype.kind in 'fc':
+            mask = np.isfinite(array)
+        srcXSize = array.shape[1]
+        srcData = array.ravel()
+        if mask is not None:
+            srcMask = np.asarray(mask, bool).ravel()
+        dstData = np.empty(self.index.size, array.dtype)
+        for start in range(0, self.index.size, self.blockSize):
+            block = slice(start, start + self.blockSize)
+            index = self.index[block]
+            valid = index >= 0
+            index = index[valid]
+            if self.method == 'nearest':
+                values = srcData[index]
+                if mask is not None:
+                    validValues = srcMask[index]
+                    values = values[validValues]
+                    valid[valid] = validValues
+            else:
+                fx = self.fx[block][valid]
+                fy = self.fy[block][valid]
+                neighbours = [(index, (1 - fx) * (1 - fy)),
+                              (index + 1, fx * (1 - fy)),
+                              (index + srcXSize, (1 - fx) * fy),
+                              (index + srcXSize + 1, fx * fy)]
+                values = 0
+                weights = 0
+                for neighbour, weight in neighbours:
+                    neighbourValues = srcData[neighbour]
+                    if mask is not None:
+                        weight = weight * srcMask[neighbour]
+                        neighbourValues = np.where(srcMask[neighbour],
+                                                   neighbourValues, 0)
+                    values = values + neighbourValues * weight
+                    weights = weights + weight
+                if mask is not None:
+                    # only pixels with valid neighbours
+                    validValues = weights > 0
+                    values = values[validValues] / weights[validValues]
+                    valid[valid] = validValues
+                if array.dtype.kind in 'iub':
+                    values = np.round(values)
+            blockData = dstData[block]
+            blockData[:] = fillValue
+            blockData[valid] = values
+        return dstData.reshape(self.dstGeometry['shape'])
+
+    def save(self, fileName):
+        '''Save the plan into a NumPy .npz file'''
+        arrays = {'method': np.array(self.method),
+                  'tolerance': np.array(self.tolerance),
+                  'index': self.index}
+        if self.method == 'bilinear':
+            arrays['fx'] = self.fx
+            arrays['fy'] = self.fy
+        for prefix, geometry in [('src_', self.srcGeometry),
+                                 ('dst_', self.dstGeometry)]:
+            for key in geometry:
+                arrays[prefix + key] = np.array(geometry[key])
+        # file object: numpy does not add extension .npz
+        outFile = open(fileName, 'wb')
+        try:
+            np.savez_compressed(outFile, **arrays)
+        finally:
+            outFile.close()
+
+    @classmethod
+    def load(cls, fileName):
+        '''Load plan saved by save()'''
+        plan = cls()
+        data = np.load(fileName)
+        plan.method = str(data['method'])
+        plan.tolerance = float(data['tolerance'])
+        plan.index = data['index']
+        if plan.method == 'bilinear':
+            plan.fx = data['fx']
+            plan.fy = data['fy']
+        geometries = []
+        for prefix in ['src_', 'dst_']:
+            geometries.append({
+                'shape': tuple(int(i) for i in data[prefix + 'shape']),
+                'geoTransform': tuple(float(i) for i in
+                                      data[prefix + 'geoTransform']),
+                'projection': str(data[prefix + 'projection']),
+                'gcpProjection': str(data[prefix + 'gcpProjection']),
+                'gcps': data[prefix + 'gcps'].reshape(4, -1),
+                'geolocation': [str(i) for i in
+                                data[prefix + 'geolocation']]})
+        plan.srcGeometry, plan.dstGeometry = geometries
+        return plan
@@ -0,0 +1,50 @@
+#------------------------------------------------------------------------------
+# Name:         test_arraycache.py
+# Purpose:      Test the ArrayCache class
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import numpy as np
+
+from nansat.arraycache import ArrayCache
+
+
+class ArrayCacheTest(unittest.TestCase):
+    def test_get_put(self):
+        c = ArrayCache(1000)
+        c.put(('a', 1, None), np.zeros(10))
+
+        self.assertTrue(c.get(('a', 1, None)) is not None)
+        self.assertTrue(c.get(('a', 2, None)) is None)
+        self.assertEqual(c.hits, 1)
+        self.assertEqual(c.misses, 1)
+        self.assertEqual(c.nBytes, 80)
+
+    def test_evict_least_recently_used(self):
+        c = ArrayCache(200)
+        c.put(1, np.zeros(10))
+        c.put(2, np.zeros(10))
+        c.get(1)
+        c.put(3, np.zeros(10))
+
+        self.assertTrue(1 in c)
+        self.assertFalse(2 in c)
+        self.assertTrue(3 in c)
+        self.assertEqual(c.evictedBytes, 80)
+        self.assertEqual(c.nBytes, 160)
+
+    def test_too_large_array_not_cached(self):
+        c = ArrayCache(100)
+        c.put(1, np.zeros(100))
+
+        self.assertEqual(len(c), 0)
+        self.assertEqual(c.nBytes, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
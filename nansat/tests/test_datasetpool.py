@@ -0,0 +1,93 @@
+#------------------------------------------------------------------------------
+# Name:         test_datasetpool.py
+# Purpose:      Test the DatasetPool class
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import os
+import shutil
+import tempfile
+
+from nansat import Nansat
+from nansat.datasetpool import DatasetPool, datasetPool
+from nansat.vrt import VRT
+from nansat.tools import GDALError
+
+import nansat_test_data as ntd
+
+
+class DatasetPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.test_file_gcps = os.path.join(ntd.test_data_path, 'gcps.tif')
+        self.test_file_stere = os.path.join(ntd.test_data_path, 'stere.tif')
+
+    def test_acquire_opens_once(self):
+        p = DatasetPool()
+        ds1 = p.acquire(self.test_file_gcps)
+        ds2 = p.acquire(self.test_file_gcps)
+
+        self.assertTrue(ds1 is ds2)
+        self.assertEqual(p.nOpens, 1)
+
+    def test_unused_datasets_closed(self):
+        p = DatasetPool(maxSize=0)
+        with p.borrow(self.test_file_gcps) as ds:
+            p.acquire(self.test_file_stere)
+            p.release(self.test_file_stere)
+
+            self.assertEqual(ds.RasterCount, 3)
+            self.assertTrue(self.test_file_gcps in p)
+            self.assertFalse(self.test_file_stere in p)
+
+        self.assertEqual(len(p), 0)
+
+    def test_discard(self):
+        p = DatasetPool()
+        p.get(self.test_file_gcps)
+        p.discard(self.test_file_gcps)
+        p.get(self.test_file_gcps)
+
+        self.assertEqual(p.nOpens, 2)
+
+    def test_changed_file_reopened(self):
+        tmpDir = tempfile.mkdtemp()
+        fileName = os.path.join(tmpDir, 'test.tif')
+        shutil.copy(self.test_file_gcps, fileName)
+        p = DatasetPool()
+        ds1 = p.get(fileName)
+        shutil.copy(self.test_file_stere, fileName)
+        ds2 = p.get(os.path.relpath(fileName))
+
+        self.assertEqual(p.nOpens, 2)
+        self.assertEqual(len(p), 1)
+        self.assertEqual(ds2.RasterXSize,
+                         p.get(self.test_file_stere).RasterXSize)
+        shutil.rmtree(tmpDir)
+
+    def test_nansat_opens_source_once(self):
+        datasetPool.clear()
+        nOpens = datasetPool.nOpens
+        n = Nansat(self.test_file_gcps, logLevel=40)
+
+        self.assertEqual(datasetPool.nOpens - nOpens, 1)
+
+    def test_create_band_releases_source_on_error(self):
+        vrt = VRT(srcRasterXSize=10, srcRasterYSize=10)
+
+        self.assertRaises(GDALError, vrt._create_band,
+                          {'SourceFilename': self.test_file_gcps,
+                           'SourceBand': 10})
+        self.assertEqual(datasetPool._counts[
+                            datasetPool._key(self.test_file_gcps)], 0)
+        self.assertRaises(GDALError, vrt._create_band,
+                          {'SourceFilename': 'no_such_file.tif'})
+        self.assertFalse('no_such_file.tif' in datasetPool)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,6 +20,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 from nansat import Domain
+from nansat import gcps as gcptools
+from nansat.nsr import NSR
 from nansat.tools import OptionError, gdal, ogr
 from nansat.figure import Image
 
@@ -136,6 +138,82 @@ class DomainTest(unittest.TestCase):
         self.assertTrue(all(np.round(x) == [0, 50, 100]))
         self.assertTrue(all(np.round(y) == [500, 250, 0]))
 
+    def test_transform_points_reuses_transformer(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
+        lon1, lat1 = d.transform_points([1, 2, 3], [1, 2, 3])
+        transformer = d.vrt.get_transformer()
+        lon2, lat2 = d.transform_points([1, 2, 3], [1, 2, 3])
+
+        self.assertTrue(d.vrt.get_transformer() is transformer)
+        np.testing.assert_array_equal(lon1, lon2)
+        np.testing.assert_array_equal(lat1, lat2)
+
+    def test_transformer_reset_after_reproject_GCPs(self):
+        ds = gdal.Open(self.test_file)
+        d = Domain(ds=ds)
+        lon1, lat1 = d.transform_points([10, 20], [10, 20])
+        transformer = d.vrt.get_transformer()
+        d.reproject_GCPs('+proj=stere +datum=WGS84 +ellps=WGS84 '
+                         '+lat_0=75 +lon_0=10 +no_defs')
+        lon2, lat2 = d.transform_points([10, 20], [10, 20])
+
+        self.assertFalse(d.vrt.get_transformer() is transformer)
+        np.testing.assert_allclose(lon1, lon2, atol=0.01)
+        np.testing.assert_allclose(lat1, lat2, atol=0.01)
+
+    def test_transformer_reset_after_SetGCPs(self):
+        ds = gdal.Open(self.test_file)
+        d = Domain(ds=ds)
+        lon1, lat1 = d.transform_points([10, 20], [10, 20])
+        # each GCP twice: the number of GCPs changes, the fit does not
+        gcps = [gdal.GCP(gcp.GCPX + 1, gcp.GCPY, gcp.GCPZ,
+                         gcp.GCPPixel, gcp.GCPLine)
+                for gcp in d.vrt.dataset.GetGCPs()] * 2
+        d.vrt.dataset.SetGCPs(gcps, d.vrt.dataset.GetGCPProjection())
+        lon2, lat2 = d.transform_points([10, 20], [10, 20])
+
+        np.testing.assert_allclose(lon2, lon1 + 1, atol=0.01)
+        np.testing.assert_allclose(lat2, lat1, atol=0.01)
+
+    def test_transform_arrays(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
+        cols, rows = np.meshgrid([0, 50, 100], [0, 250, 500])
+        lon, lat = d.vrt.transform_arrays(cols, rows)
+        lonVec, latVec = d.transform_points(cols.flatten(), rows.flatten())
+
+        self.assertEqual(lon.shape, (3, 3))
+        np.testing.assert_array_equal(lon.flatten(), lonVec)
+        np.testing.assert_array_equal(lat.flatten(), latVec)
+        np.testing.assert_allclose(lon[0], [25, 26, 27])
+
+    def test_get_geolocation_grids_from_tie_points(self):
+        # synthetic domain with GCPs in stereographic projection
+        ds = gdal.GetDriverByName('MEM').Create('', 300, 200)
+        pixel, line = np.meshgrid(np.arange(0, 301, 20.),
+                                  np.arange(0, 201, 20.))
+        gcps = gcptools.transform(
+            gcptools.create(pixel, line, 1e6 + pixel * 1000,
+                            -1e6 - line * 1000),
+            '+proj=stere +lat_0=90 +lon_0=0 +datum=WGS84', NSR())
+        ds.SetGCPs(gcptools.to_gdal(gcps), NSR().wkt)
+        d = Domain(ds=ds)
+        lon0, lat0 = d.get_geolocation_grids()
+        lon1, lat1, error1 = d.get_geolocation_grids(tiePointStep=50,
+                                                     returnError=True)
+        lon2, lat2, error2 = d.get_geolocation_grids(accuracy=1e-4,
+                                                     returnError=True)
+        lon3, lat3 = d.get_geolocation_grids(stepSize=3, tiePointStep=10,
+                                             interpolation='cubic')
+
+        self.assertEqual(lon1.shape, (200, 300))
+        self.assertTrue(error1 > error2)
+        self.assertTrue(error2 <= 1e-4)
+        self.assertTrue(np.abs(lon2 - lon0).max() < 1e-3)
+        self.assertTrue(np.abs(lat2 - lat0).max() < 1e-3)
+        self.assertTrue(np.abs(lon1 - lon0).max() < 0.05)
+        self.assertEqual(lon3.shape, lon0[::3, ::3].shape)
+        self.assertTrue(np.abs(lat3 - lat0[::3, ::3]).max() < 1e-3)
+
     def test_azimuth_y(self):
         d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
         au = d.azimuth_y()
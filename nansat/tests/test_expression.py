@@ -0,0 +1,95 @@
+#------------------------------------------------------------------------------
+# Name:         test_expression.py
+# Purpose:      Test parsing and evaluation of band expressions
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+
+import numpy as np
+
+from nansat import expression as bandexpression
+from nansat.tools import OptionError
+
+
+class ExpressionTest(unittest.TestCase):
+    def setUp(self):
+        self.bands = {'chl_log': np.array([[0., 1.], [2., -1.]], 'float32'),
+                      1: np.array([[1, 2], [3, 4]], 'int16')}
+
+    def read_band(self, bandID, out):
+        if out is None:
+            return self.bands[bandID].copy()
+        out[...] = self.bands[bandID]
+        return out
+
+    def test_parse_once(self):
+        expr = bandexpression.parse('np.power(10., self["chl_log"])')
+
+        self.assertTrue(bandexpression.parse(expr.text) is expr)
+        self.assertEqual(expr.bands, ['chl_log'])
+        self.assertFalse(expr.usesBandData)
+
+    def test_evaluate(self):
+        expr = bandexpression.parse('np.power(10., self["chl_log"])')
+        result = expr.evaluate(self.read_band)
+
+        self.assertEqual(result.dtype, np.float32)
+        np.testing.assert_allclose(result, [[1, 10], [100, 0.1]], rtol=1e-6)
+
+    def test_evaluate_operators(self):
+        expr = bandexpression.parse('-self[1] * 2 + sqrt(self[1]) / pi '
+                                    '+ (self["chl_log"] > 0)')
+        result = expr.evaluate(self.read_band)
+        band = self.bands[1]
+
+        np.testing.assert_allclose(result, -band * 2 + np.sqrt(band) / np.pi
+                                   + (self.bands['chl_log'] > 0), rtol=1e-6)
+
+    def test_evaluate_bandData(self):
+        expr = bandexpression.parse('bandData / 2')
+        result = expr.evaluate(None, lambda out: np.ones((2, 2)) * 4)
+
+        self.assertTrue(expr.usesBandData)
+        np.testing.assert_array_equal(result, 2)
+
+    def test_buffers_reused(self):
+        expr = bandexpression.parse('np.log10(self["chl_log"] + 2) * 3')
+        buffers = {}
+        result1 = expr.evaluate(self.read_band, buffers=buffers)
+        result1 = result1.copy()
+        result2 = expr.evaluate(self.read_band, buffers=buffers)
+
+        np.testing.assert_array_equal(result1, result2)
+        self.assertTrue(any(result2 is buf for buf in buffers.values()))
+        self.assertEqual(len(buffers), 1)
+
+    def test_buffers_dropped_if_shape_changes(self):
+        expr = bandexpression.parse('self[1] * 2')
+        buffers = {}
+        expr.evaluate(self.read_band, buffers=buffers, shape=(2, 2))
+        self.bands[1] = np.array([[5, 6]], 'int16')
+        result = expr.evaluate(self.read_band, buffers=buffers, shape=(1, 2))
+
+        np.testing.assert_array_equal(result, [[10, 12]])
+
+    def test_not_allowed(self):
+        for text in ['__import__("os").system("ls")',
+                     'np.load("file.npy")',
+                     'self.vrt',
+                     'open("file")',
+                     'self["a"].sum()',
+                     'np.sqrt(self["a"], out=self["b"])',
+                     '[x for x in self]',
+                     'lambda: 0',
+                     'bandID',
+                     'np.sqrt(']:
+            self.assertRaises(OptionError, bandexpression.parse, text)
+
+
+if __name__ == "__main__":
+    unittest.main()
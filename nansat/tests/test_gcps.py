@@ -0,0 +1,95 @@
+#------------------------------------------------------------------------------
+# Name:         test_gcps.py
+# Purpose:      Test vectorized operations on GCPs
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+
+import numpy as np
+
+from nansat import gcps as gcptools
+from nansat.nsr import NSR
+from nansat.tools import gdal, osr
+
+
+class GCPsTest(unittest.TestCase):
+    def setUp(self):
+        self.lon, self.lat = np.meshgrid(np.linspace(10, 20, 30),
+                                         np.linspace(60, 70, 20))
+
+    def test_from_grids(self):
+        gcps = gcptools.from_grids(self.lon, self.lat,
+                                   range(0, 20, 5), range(0, 30, 10),
+                                   pixelOffset=.5, lineStep=2)
+
+        self.assertEqual(gcps.size, 12)
+        self.assertEqual(gcps[1]['pixel'], 10.5)
+        self.assertEqual(gcps[3]['line'], 10)
+        self.assertEqual(gcps[3]['x'], self.lon[5, 0])
+        self.assertEqual(gcps[3]['y'], self.lat[5, 0])
+
+    def test_gdal_roundtrip(self):
+        gdalGCPs = [gdal.GCP(10., 60., 1., 5., 6., 'info', 'id1'),
+                    gdal.GCP(11., 61., 0., 7., 8., '', 'id2')]
+        gdalGCPs2 = gcptools.to_gdal(gcptools.from_gdal(gdalGCPs))
+
+        for g1, g2 in zip(gdalGCPs, gdalGCPs2):
+            for attr in ['GCPX', 'GCPY', 'GCPZ', 'GCPPixel', 'GCPLine',
+                         'Info', 'Id']:
+                self.assertEqual(getattr(g1, attr), getattr(g2, attr))
+
+    def test_transform(self):
+        gcps = gcptools.from_grids(self.lon, self.lat,
+                                   range(0, 20, 5), range(0, 30, 10))
+        dstSRS = NSR('+proj=stere +lat_0=90 +lon_0=0')
+        dstGCPs = gcptools.transform(gcps, NSR(), dstSRS)
+        transformer = osr.CoordinateTransformation(NSR(), dstSRS)
+        x, y, z = transformer.TransformPoint(gcps[5]['x'], gcps[5]['y'])
+
+        self.assertAlmostEqual(dstGCPs[5]['x'], x)
+        self.assertAlmostEqual(dstGCPs[5]['y'], y)
+        self.assertEqual(dstGCPs[5]['pixel'], gcps[5]['pixel'])
+
+    def test_crop_and_valid_lonlat(self):
+        gcps = gcptools.create([0, 10, 20], [0, 10, 20],
+                               [10, 200, 30], [60, 60, 100])
+
+        self.assertEqual(gcptools.valid_lonlat(gcps).size, 1)
+        cropped = gcptools.crop(gcps, 5, 5, 10, 10)
+        self.assertEqual(cropped.size, 1)
+        self.assertEqual(cropped[0]['pixel'], 5)
+        self.assertEqual(cropped[0]['x'], 200)
+
+    def test_metadata_roundtrip(self):
+        gcps = gcptools.from_grids(self.lon, self.lat,
+                                   range(0, 20, 5), range(0, 30, 10))
+        gcps2 = gcptools.from_metadata(gcptools.to_metadata(gcps,
+                                                            chunkLength=100))
+        gcps3 = gcptools.from_metadata(gcptools.to_metadata(gcps,
+                                                            bottomup=True))
+
+        for field in ['pixel', 'line', 'x', 'y']:
+            np.testing.assert_array_equal(gcps2[field], gcps[field])
+        np.testing.assert_array_equal(gcps3['pixel'], gcps['pixel'])
+        self.assertEqual(gcps3[0]['y'], gcps[-1]['y'])
+
+    def test_from_text_metadata(self):
+        metadata = {'GCPPixel_000': '00000| 00010| ',
+                    'GCPLine_000': '00000| 0000',
+                    'GCPLine_001': '5| ',
+                    'GCPX_000': '010.50000000| 011.00000000| ',
+                    'GCPY_000': '060.00000000| 061.00000000| '}
+        gcps = gcptools.from_metadata(metadata)
+
+        self.assertEqual(gcps.size, 2)
+        self.assertEqual(gcps[1]['line'], 5)
+        self.assertEqual(gcps[0]['x'], 10.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#------------------------------------------------------------------------------
+# Name:         test_mapperindex.py
+# Purpose:      Test the MapperIndex class
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import os
+import tarfile
+import tempfile
+import collections
+
+import nansat.mappers
+from nansat.mapperindex import MapperIndex, build_manifest, read_manifest
+from nansat.tools import gdal
+
+import nansat_test_data as ntd
+
+
+class NameMapper(object):
+    matchRules = {'fileNames': ['ascat_*.nc']}
+
+
+class DriverMapper(object):
+    matchRules = {'drivers': ['GTiff']}
+
+
+class MetadataMapper(object):
+    matchRules = {'metadataKeys': ['Title', 'Sensor']}
+
+
+class ArchiveMapper(object):
+    matchRules = {'archiveMembers': ['L*.TIF']}
+
+
+class AnyMapper(object):
+    pass
+
+
+class MapperIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.mappers = collections.OrderedDict([
+                        ('mapper_name', NameMapper),
+                        ('mapper_driver', DriverMapper),
+                        ('mapper_metadata', MetadataMapper),
+                        ('mapper_archive', ArchiveMapper),
+                        ('mapper_broken', (ImportError, ImportError(), None)),
+                        ('mapper_generic', AnyMapper)])
+        self.index = MapperIndex(self.mappers)
+
+    def test_filename_rule(self):
+        names = self.index.candidates('/data/ascat_20100101.nc')
+
+        self.assertEqual(names, ['mapper_name', 'mapper_broken',
+                                 'mapper_generic'])
+
+    def test_driver_rule(self):
+        fileName = os.path.join(ntd.test_data_path, 'gcps.tif')
+        names = self.index.candidates(fileName, gdal.Open(fileName), {})
+
+        self.assertEqual(names, ['mapper_driver', 'mapper_broken',
+                                 'mapper_generic'])
+
+    def test_metadata_rule(self):
+        names = self.index.candidates('file.hdf', None, {'Title': 'L2'})
+        self.assertTrue('mapper_metadata' not in names)
+
+        names = self.index.candidates('file.hdf', None, {'Title': 'L2',
+                                                         'Sensor': 'MODIS'})
+        self.assertEqual(names, ['mapper_metadata', 'mapper_broken',
+                                 'mapper_generic'])
+
+    def test_archive_rule(self):
+        fd, member = tempfile.mkstemp(suffix='.TIF', prefix='LC8_')
+        os.close(fd)
+        fd, fileName = tempfile.mkstemp(suffix='.tar')
+        os.close(fd)
+        tarFile = tarfile.open(fileName, 'w')
+        tarFile.add(member, os.path.basename(member))
+        tarFile.close()
+
+        names = self.index.candidates(fileName)
+        os.remove(member)
+        os.remove(fileName)
+
+        self.assertEqual(names, ['mapper_archive', 'mapper_broken',
+                                 'mapper_generic'])
+
+    def test_without_rules(self):
+        index = MapperIndex(self.mappers, useRules=False)
+
+        self.assertEqual(index.candidates('file.hdf'), self.mappers.keys())
+
+    def test_manifest_is_up_to_date(self):
+        ''' manifest.json should be updated after changes of mappers:
+        python -m nansat.mapperindex '''
+        packagePath = nansat.mappers.__path__[0]
+
+        self.assertEqual(build_manifest(packagePath),
+                         read_manifest(packagePath))
+
+
+if __name__ == "__main__":
+    unittest.main()
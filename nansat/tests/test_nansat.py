@@ -17,11 +17,14 @@ import warnings
 import os
 import sys
 import glob
+import gc
+import subprocess
 from types import ModuleType, FloatType
 import datetime
 import matplotlib.pyplot as plt
 import numpy as np
 
+import nansat
 from nansat import Nansat, Domain
 from nansat.tools import gdal, OptionError
 
@@ -104,6 +107,150 @@ class NansatTest(unittest.TestCase):
         self.assertEqual(n.get_metadata('name', 1), 'band1')
         self.assertEqual(n.get_metadata('name', 2), 'band2')
 
+    def test_add_bands_appended_in_place(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
+        arr = np.random.randn(500, 500)
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(arr, {'name': 'band1'})
+        vrt = n.vrt
+        n.add_band(arr + 1, {'name': 'band2'})
+        n.add_bands([arr + 2, arr + 3],
+                    [{'name': 'band3'}, {'name': 'band4'}])
+
+        self.assertTrue(n.vrt is vrt)
+        self.assertEqual(n.vrt.dataset.RasterCount, 4)
+        np.testing.assert_allclose(n['band4'], arr + 3, rtol=1e-6)
+
+        n.undo()
+        self.assertEqual(n.vrt.dataset.RasterCount, 2)
+        self.assertFalse(n.has_band('band3'))
+        np.testing.assert_allclose(n['band2'], arr + 1, rtol=1e-6)
+        n.undo()
+        self.assertEqual(n.vrt.dataset.RasterCount, 1)
+        n.undo()
+        self.assertEqual(n.vrt.dataset.RasterCount, 0)
+
+    def test_add_band_after_undo_of_crop(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
+        arr = np.random.randn(500, 500)
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(arr, {'name': 'band1'})
+        n.crop(10, 20, 100, 200)
+        n.undo()
+        n.add_band(arr + 1, {'name': 'band2'})
+        n.crop(10, 20, 100, 200)
+
+        self.assertEqual(n.vrt.dataset.RasterCount, 2)
+        self.assertEqual(n.shape(), (200, 100))
+        np.testing.assert_allclose(n['band2'], arr[20:220, 10:110] + 1,
+                                   rtol=1e-6)
+
+    def test_add_virtual_bands(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 200")
+        n = Nansat(domain=d, logLevel=40)
+        n.add_virtual_band('constant', {'name': 'mask'}, value=64,
+                           dtype='uint8')
+        n.add_virtual_band('pixel', {'name': 'pixel'})
+        n.add_virtual_band('line', {'name': 'line'})
+
+        self.assertEqual(n['mask'].shape, (200, 500))
+        self.assertTrue((n['mask'] == 64).all())
+        self.assertEqual(n['pixel'][5, 123], 123)
+        self.assertEqual(n['line'][123, 5], 123)
+        self.assertTrue(len(n.vrt.bandVRTs['mask'].read_xml()) < 10000)
+
+        n.crop(10, 20, 50, 60)
+        self.assertEqual(n['pixel'][0, 0], 10)
+        self.assertEqual(n['line'][0, 0], 20)
+        self.assertTrue((n['mask'] == 64).all())
+
+    def test_add_virtual_lonlat_bands(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        n.add_virtual_band('longitude', {'name': 'lon'}, tiePointStep=10)
+        n.add_virtual_band('latitude', {'name': 'lat'}, tiePointStep=10)
+        lon, lat = n.get_geolocation_grids()
+
+        np.testing.assert_allclose(n['lon'], lon, atol=0.01)
+        np.testing.assert_allclose(n['lat'], lat, atol=0.01)
+
+    def test_add_band_expression(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 200")
+        arr = np.random.randn(200, 500).astype('float32')
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(arr, {'name': 'log'})
+        n.add_band(expression='np.power(10., self["log"]) + 1',
+                   parameters={'name': 'exp'})
+        n.expressionBlockSize = 1000
+        expected = np.power(10., arr) + 1
+
+        np.testing.assert_allclose(n['exp'], expected, rtol=1e-5)
+        np.testing.assert_allclose(n['exp', 10:20, 30:40],
+                                   expected[10:20, 30:40], rtol=1e-5)
+        self.assertRaises(OptionError, n.add_band,
+                          expression='__import__("os")')
+
+    def test_add_band_expression_partial_window(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 200")
+        arr = np.random.randn(200, 500).astype('float32')
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(arr, {'name': 'log'})
+        n.add_band(expression='np.power(10., self["log"]) + 1',
+                   parameters={'name': 'exp'})
+        # 3 rows per window, last window has 2 rows
+        n.expressionBlockSize = 1500
+
+        np.testing.assert_allclose(n['exp'], np.power(10., arr) + 1,
+                                   rtol=1e-5)
+
+    def test_add_band_peak_memory(self):
+        try:
+            import resource
+        except ImportError:
+            self.skipTest('resource module is not available')
+        # ru_maxrss is the peak of the whole process: measure in a new one
+        script = '\n'.join([
+            'import resource, sys',
+            'import numpy as np',
+            'from nansat import Nansat, Domain',
+            'd = Domain(4326, "-te 25 70 35 72 -ts 10000 10000")',
+            'n = Nansat(domain=d, logLevel=40)',
+            'try:',
+            '    arr = np.ones((10000, 10000), "float32")',
+            'except MemoryError:',
+            '    sys.exit(77)',
+            'maxRSS0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss',
+            'n.add_band(arr, {"name": "band1"})',
+            'maxRSS1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss',
+            'band = n.vrt.dataset.GetRasterBand(1)',
+            'print maxRSS0, maxRSS1, arr.nbytes, '
+            'band.ReadAsArray(0, 0, 10, 10).sum()'])
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [os.path.dirname(os.path.dirname(nansat.__file__))] +
+            env.get('PYTHONPATH', '').split(os.pathsep))
+        process = subprocess.Popen([sys.executable, '-c', script], env=env,
+                                   stdout=subprocess.PIPE)
+        output = process.communicate()[0]
+        if process.returncode == 77:
+            self.skipTest('not enough memory for the test')
+        self.assertEqual(process.returncode, 0)
+        maxRSS0, maxRSS1, nBytes, bandSum = output.split()[-4:]
+
+        # ru_maxrss is in kilobytes; the array takes 390625 kB and is
+        # copied only once
+        self.assertTrue(int(maxRSS1) - int(maxRSS0) <
+                        int(nBytes) / 1024 * 1.5)
+        self.assertEqual(float(bandSum), 100)
+
+    def test_add_band_array_copied(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 50 40")
+        arr = np.ones((40, 50), 'float32')
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(arr, {'name': 'band1'})
+        arr[:] = 2
+
+        self.assertEqual(n['band1'].max(), 1)
+
     def test_add_subvrts_only_to_one_nansat(self):
         d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
         arr = np.random.randn(500, 500)
@@ -131,6 +278,28 @@ class NansatTest(unittest.TestCase):
 
         self.assertTrue(hb)
 
+    def test_has_band_false(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+
+        self.assertFalse(n.has_band('no_such_band'))
+
+    def test_band_index_updated_after_set_metadata(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        n.set_metadata('name', 'new_name', 'L_645')
+
+        self.assertTrue(n.has_band('new_name'))
+        self.assertFalse(n.has_band('L_645'))
+        self.assertEqual(n._get_band_number('new_name'), 1)
+
+    def test_band_index_updated_after_add_band(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        self.assertFalse(n.has_band('band_new'))
+        n.add_band(np.zeros(n.shape()), {'name': 'band_new'})
+
+        self.assertTrue(n.has_band('band_new'))
+        self.assertEqual(n._get_band_number('band_new'),
+                         n.vrt.dataset.RasterCount)
+
     def test_export(self):
         n = Nansat(self.test_file_gcps, logLevel=40)
         tmpfilename = os.path.join(ntd.tmp_data_path, 'nansat_export.nc')
@@ -138,6 +307,19 @@ class NansatTest(unittest.TestCase):
 
         self.assertTrue(os.path.exists(tmpfilename))
 
+    def test_export_gcps_metadata(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        tmpfilename = os.path.join(ntd.tmp_data_path,
+                                   'nansat_export_gcps.nc')
+        n.export(tmpfilename)
+        n2 = Nansat(tmpfilename, mapperName='generic')
+        gcps = n.vrt.dataset.GetGCPs()
+        gcps2 = n2.vrt.dataset.GetGCPs()
+
+        self.assertEqual(len(gcps2), len(gcps))
+        np.testing.assert_allclose(sorted([g.GCPX for g in gcps2]),
+                                   sorted([g.GCPX for g in gcps]))
+
     def test_export_gtiff(self):
         n = Nansat(self.test_file_gcps, logLevel=40)
         tmpfilename = os.path.join(ntd.tmp_data_path, 'nansat_export.tif')
@@ -155,6 +337,31 @@ class NansatTest(unittest.TestCase):
         self.assertTrue(os.path.exists(tmpfilename))
         self.assertEqual(n.vrt.dataset.RasterCount, 1)
 
+    def test_export_bands_deleted_in_one_transaction(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        n.add_band(n[1], parameters={'name': 'L_645_copy'})
+        vrt = n.vrt.copy()
+        writeXML = vrt.write_xml
+        written = []
+        vrt.write_xml = lambda xml=None: written.append(xml) or writeXML(xml)
+        vrt.delete_bands([2, 3, 4])
+
+        self.assertEqual(len(written), 1)
+        self.assertEqual(vrt.dataset.RasterCount, 1)
+        self.assertEqual(vrt.dataset.GetRasterBand(1).GetMetadataItem('name'),
+                         'L_645')
+
+    def test_xml_transaction_discards_edits_on_error(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        vrt = n.vrt.copy()
+        with self.assertRaises(ValueError):
+            with vrt.xml_transaction() as node0:
+                node0.replaceAttribute('rasterXSize', '10')
+                raise ValueError
+
+        self.assertEqual(vrt.dataset.RasterXSize, n.vrt.dataset.RasterXSize)
+        self.assertEqual(vrt._xmlDepth, 0)
+
     def test_export2thredds_stere_one_band(self):
         # skip the test if anaconda is used
         if IS_CONDA:
@@ -183,6 +390,22 @@ class NansatTest(unittest.TestCase):
 
         self.assertTrue(os.path.exists(tmpfilename))
 
+    def test_export2thredds_int_and_float_bands(self):
+        # skip the test if anaconda is used
+        if IS_CONDA:
+            return
+        n = Nansat(self.test_file_stere, logLevel=40)
+        n.add_band(np.ones(n.shape(), 'float32'), {'name': 'ones'})
+        tmpfilename = os.path.join(ntd.tmp_data_path,
+                                   'nansat_export2thredds_int_float.nc')
+        n.export2thredds(tmpfilename, ['L_469', 'ones'])
+        ds = gdal.Open('NETCDF:"%s":L_469' % tmpfilename)
+
+        self.assertFalse(ds.GetRasterBand(1).DataType in [gdal.GDT_Float32,
+                                                          gdal.GDT_Float64])
+        self.assertEqual(ds.ReadAsArray().astype('uint8').sum(dtype='int64'),
+                         n['L_469'].sum(dtype='int64'))
+
     def test_dont_export2thredds_gcps(self):
         n = Nansat(self.test_file_gcps, logLevel=40)
         tmpfilename = os.path.join(ntd.tmp_data_path,
@@ -267,6 +490,128 @@ class NansatTest(unittest.TestCase):
 
         self.assertTrue(np.any(n[1].imag!=0))
 
+    def test_getitem_window(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        full = n[1]
+        window = n[1, 10:20, 5:15]
+
+        self.assertEqual(window.shape, (10, 10))
+        np.testing.assert_array_equal(window, full[10:20, 5:15])
+
+    def test_getitem_window_step_and_row(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        full = n['L_645']
+
+        np.testing.assert_array_equal(n['L_645', ::-3, 1:50:7],
+                                      full[::-3, 1:50:7])
+        np.testing.assert_array_equal(n['L_645', -1], full[-1])
+        self.assertRaises(IndexError, n.__getitem__, ('L_645', 10000))
+
+    def test_iter_blocks(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        full1 = n[1]
+        full2 = n[2]
+        result1 = np.zeros(full1.shape, full1.dtype)
+        result2 = np.zeros(full2.shape, full2.dtype)
+        for window, arrays in n.iter_blocks([1, 'L_555'], (30, 40)):
+            xOff, yOff, xSize, ySize = window
+            self.assertTrue(ySize <= 30)
+            self.assertTrue(xSize <= 40)
+            result1[yOff:yOff + ySize, xOff:xOff + xSize] = arrays[0]
+            result2[yOff:yOff + ySize, xOff:xOff + xSize] = arrays[1]
+
+        np.testing.assert_array_equal(result1, full1)
+        np.testing.assert_array_equal(result2, full2)
+
+    def test_cache_hits_and_copies(self):
+        n = Nansat(self.test_file_gcps, cacheSize=10 ** 7, logLevel=40)
+        a1 = n[1]
+        a1[:] = 0
+        a2 = n['L_645']
+
+        self.assertEqual(n.cache.misses, 1)
+        self.assertEqual(n.cache.hits, 1)
+        self.assertTrue(a2.any())
+
+    def test_cache_invalidated_by_vrt_change(self):
+        n = Nansat(self.test_file_gcps, cacheSize=10 ** 7, logLevel=40)
+        a1 = n[1]
+        n.crop(10, 20, 50, 60)
+
+        self.assertEqual(len(n.cache), 0)
+        self.assertEqual(n[1].shape, (60, 50))
+        n.undo()
+        self.assertEqual(len(n.cache), 0)
+        self.assertEqual(n[1].shape, a1.shape)
+
+    def test_cache_disabled_by_default(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        a = n[1]
+
+        self.assertTrue(n.cache is None)
+
+    def test_read_band_out(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        buf = np.zeros((20, 30), 'float32')
+        a = n.read_band(1, window=(5, 10, 30, 20), out=buf)
+
+        self.assertTrue(a is buf)
+        np.testing.assert_array_equal(buf, n[1][10:30, 5:35])
+
+    def test_read_band_out_wrong_shape(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        buf = np.zeros((10, 10), 'float32')
+
+        self.assertRaises(OptionError, n.read_band, 1, out=buf)
+
+    def test_read_band_masked(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        n.set_metadata('_FillValue', '0', 1)
+        full = n.vrt.dataset.GetRasterBand(1).ReadAsArray()
+        a, mask = n.read_band(1, masked=True)
+
+        self.assertEqual(a.dtype, full.dtype)
+        self.assertEqual(mask.dtype, bool)
+        np.testing.assert_array_equal(mask, full != 0)
+
+    def test_read_band_masked_packed(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        a, mask = n.read_band(1, masked='packed')
+
+        self.assertEqual(mask.dtype, np.uint8)
+        self.assertEqual(mask.shape, (a.shape[0], (a.shape[1] + 7) // 8))
+        np.testing.assert_array_equal(np.unpackbits(mask, axis=1)
+                                      [:, :a.shape[1]],
+                                      np.ones(a.shape, 'uint8'))
+
+    def test_get_bands(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        data = n.get_bands([1, 'L_469'])
+
+        self.assertEqual(data.shape, (2, ) + n.shape())
+        np.testing.assert_array_equal(data[0], n[1])
+        np.testing.assert_array_equal(data[1], n['L_469'])
+
+    def test_get_bands_window_out(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        buf = np.zeros((3, 20, 30), 'float32')
+        data = n.get_bands(window=(5, 10, 30, 20), out=buf)
+
+        self.assertTrue(data is buf)
+        for i in range(3):
+            np.testing.assert_array_equal(buf[i], n[i + 1][10:30, 5:35])
+        self.assertRaises(OptionError, n.get_bands, [1], out=buf)
+
+    def test_mappers_imported_lazily(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        nansatMappers = sys.modules['nansat.nansat'].nansatMappers
+
+        self.assertEqual(n.mapper, 'generic')
+        self.assertNotEqual(type(nansatMappers['mapper_generic']).__name__,
+                            '_LazyMapper')
+        self.assertEqual(type(nansatMappers['mapper_ascat_nasa']).__name__,
+                         '_LazyMapper')
+
     def test_get_GDALRasterBand(self):
         n = Nansat(self.test_file_gcps, logLevel=40)
         b = n.get_GDALRasterBand(1)
@@ -292,6 +637,28 @@ class NansatTest(unittest.TestCase):
         self.assertEqual(n.shape(), (500, 500))
         self.assertEqual(type(n[1]), np.ndarray)
 
+    def test_reproject_materialize(self):
+        n1 = Nansat(self.test_file_gcps, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 500 500")
+        n1.reproject(d, eResampleAlg=1)
+        n2.reproject(d, eResampleAlg=1, materialize=True, nThreads=2,
+                     nProcesses=2, tileSize=128)
+
+        self.assertEqual(n2.shape(), (500, 500))
+        self.assertEqual(n2.vrt.dataset.GetProjection(),
+                         n1.vrt.dataset.GetProjection())
+        for iBand in range(1, n1.vrt.dataset.RasterCount + 1):
+            self.assertEqual(n2.get_metadata('name', iBand),
+                             n1.get_metadata('name', iBand))
+            data1 = n1[iBand].astype('float64')
+            data2 = n2[iBand].astype('float64')
+            valid = np.isfinite(data1) * np.isfinite(data2)
+            self.assertTrue(valid.sum() > 0)
+            self.assertTrue(np.abs(data1 - data2)[valid].max() <= 1)
+        n2.undo()
+        self.assertEqual(n2.shape(), Nansat(self.test_file_gcps).shape())
+
     def test_reproject_stere(self):
         n1 = Nansat(self.test_file_gcps, logLevel=40)
         n2 = Nansat(self.test_file_stere, logLevel=40)
@@ -492,6 +859,95 @@ class NansatTest(unittest.TestCase):
         self.assertEqual(ext, (31, 89, 110, 111))
         self.assertEqual(type(n1[1]), np.ndarray)
 
+    def test_flatten_crop_chain(self):
+        n1 = Nansat(self.test_file_gcps, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, logLevel=40, flattenVRT=True)
+        for n in [n1, n2]:
+            n.crop(10, 20, 150, 100)
+            n.crop(5, 10, 50, 40)
+            n.add_band(n[1], parameters={'name': 'L_645_copy'})
+        flatVRT = n1.vrt.flatten()
+
+        self.assertFalse(flatVRT is n1.vrt)
+        self.assertTrue(self.test_file_gcps in flatVRT.read_xml())
+        self.assertEqual(flatVRT.dataset.RasterXSize, 50)
+        np.testing.assert_array_equal(n2[1], n1[1])
+        np.testing.assert_array_equal(n2['L_645_copy'], n1['L_645_copy'])
+        np.testing.assert_array_equal(n2.get_bands([1, 2]),
+                                      n1.get_bands([1, 2]))
+
+    def test_flatten_warped_vrt_not_changed(self):
+        n1 = Nansat(self.test_file_stere, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, logLevel=40)
+        n1.reproject(n2)
+
+        self.assertTrue(n1.vrt.flatten() is n1.vrt)
+
+    def test_vrt_copy_independent(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        vrt = n.vrt.copy()
+        vrt.dataset.SetMetadataItem('test', 'value')
+
+        self.assertNotEqual(vrt.fileName, n.vrt.fileName)
+        self.assertEqual(n.vrt.dataset.GetMetadataItem('test'), None)
+        self.assertEqual(vrt.dataset.GetMetadataItem('test'), 'value')
+
+    def test_vrt_shared_copy_shares_file_until_changed(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        vrt = n.vrt._shared_copy()
+
+        self.assertEqual(vrt.fileName, n.vrt.fileName)
+        vrt.dataset.SetMetadataItem('test', 'value')
+        vrt._unshare()
+        vrt.dataset.SetMetadataItem('test', 'new')
+
+        self.assertNotEqual(vrt.fileName, n.vrt.fileName)
+        self.assertEqual(n.vrt.dataset.GetMetadataItem('test'), 'value')
+        self.assertEqual(vrt.dataset.GetMetadataItem('test'), 'new')
+
+    def test_undoDepth(self):
+        n1 = Nansat(self.test_file_gcps, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, logLevel=40, undoDepth=1)
+        for n in [n1, n2]:
+            n.crop(10, 20, 150, 100)
+            n.crop(5, 10, 50, 40)
+            n.resize(0.5)
+            n.add_band(n[1], parameters={'name': 'L_645_copy'})
+
+        self.assertTrue(len(repr(n2.vrt).split('=>')) <
+                        len(repr(n1.vrt).split('=>')))
+        np.testing.assert_array_equal(n2[1], n1[1])
+        np.testing.assert_array_equal(n2['L_645_copy'], n1['L_645_copy'])
+        n1.undo(2)
+        n2.undo(2)
+        np.testing.assert_array_equal(n2[1], n1[1])
+
+    def test_undoDepth_after_reproject(self):
+        d = Domain(4326, "-te 27 70 30 72 -ts 200 100")
+        n1 = Nansat(self.test_file_gcps, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, logLevel=40, undoDepth=1)
+        for n in [n1, n2]:
+            n.crop(10, 20, 150, 100)
+            n.crop(5, 10, 50, 40)
+            n.reproject(d)
+            n.crop(10, 10, 150, 80)
+            n.crop(5, 5, 100, 50)
+
+        self.assertTrue(len(repr(n2.vrt).split('=>')) <
+                        len(repr(n1.vrt).split('=>')))
+        np.testing.assert_array_equal(n2[1], n1[1])
+
+    def test_undoDepth_keeps_array_bands(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 50 40")
+        arr = np.random.randn(40, 50).astype('float32')
+        n = Nansat(domain=d, logLevel=40, undoDepth=0)
+        n.add_band(arr, {'name': 'band1'})
+        n.crop(5, 10, 30, 20)
+        n.crop(2, 3, 20, 10)
+        gc.collect()
+
+        np.testing.assert_array_equal(n['band1'], arr[13:23, 7:27])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,104 @@
+#------------------------------------------------------------------------------
+# Name:         test_node.py
+# Purpose:      Test the Node class
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+
+from nansat.node import Node
+
+VRT_XML = '''<?xml version="1.0"?>
+<VRTDataset rasterXSize="10" rasterYSize="20">
+  <GeoTransform>  0,  1, 0, 0, 0, -1 </GeoTransform>
+  <VRTRasterBand band="1">
+    <ComplexSource>
+      <SrcRect xOff="0" yOff="0"/>
+      <DstRect xOff="0" yOff="0"/>
+    </ComplexSource>
+  </VRTRasterBand>
+  <VRTRasterBand band="2">
+    <ComplexSource>
+      <SrcRect xOff="1" yOff="1"/>
+      <DstRect xOff="1" yOff="1"/>
+    </ComplexSource>
+  </VRTRasterBand>
+</VRTDataset>'''
+
+
+class NodeTest(unittest.TestCase):
+    def test_create_and_rawxml(self):
+        node0 = Node.create(VRT_XML)
+        node1 = Node.create(node0.rawxml())
+
+        self.assertEqual(node0['GeoTransform'], '0, 1, 0, 0, 0, -1')
+        self.assertEqual(node1.rawxml(), node0.rawxml())
+        self.assertEqual(node0.tagList(),
+                         ['GeoTransform', 'VRTRasterBand', 'VRTRasterBand'])
+
+    def test_node(self):
+        node0 = Node.create(VRT_XML)
+
+        self.assertTrue(node0.node('VRTDataset') is node0)
+        self.assertEqual(node0.node('VRTRasterBand', 1).getAttribute('band'),
+                         '2')
+        self.assertEqual(node0.node('SrcRect', 1).getAttribute('xOff'), '1')
+        self.assertEqual(node0.node('VRTRasterBand', 1).node('SrcRect').
+                         getAttribute('xOff'), '1')
+        self.assertFalse(node0.node('SrcRect', 2))
+        self.assertFalse(node0.node('MaskBand'))
+
+    def test_find_findall(self):
+        node0 = Node.create(VRT_XML)
+
+        self.assertEqual(len(node0.findall('//SrcRect')), 2)
+        self.assertEqual(len(node0.findall('VRTRasterBand/*')), 2)
+        self.assertEqual(len(node0.findall('*')), 3)
+        self.assertEqual(node0.find('VRTRasterBand/ComplexSource/DstRect').
+                         getAttribute('xOff'), '0')
+        self.assertFalse(node0.find('VRTRasterBand/SrcRect'))
+
+    def test_index_updated_after_edits(self):
+        node0 = Node.create(VRT_XML)
+        self.assertFalse(node0.node('Extra'))
+        node0.node('VRTRasterBand', 1).node('SrcRect').tag = 'Extra'
+        node0 += Node('MaskBand')
+
+        self.assertEqual(node0.node('Extra').getAttribute('xOff'), '1')
+        self.assertFalse(node0.node('SrcRect', 1))
+        self.assertTrue(node0.node('MaskBand'))
+
+    def test_insert(self):
+        node0 = Node.create(VRT_XML)
+        node1 = node0.node('VRTRasterBand').insert('<Extra>value</Extra>')
+
+        self.assertEqual(node1['Extra'], 'value')
+        self.assertFalse(node0.node('Extra'))
+        node0.replaceNode('VRTRasterBand', 0, node1)
+        self.assertEqual(node0['Extra'], 'value')
+
+    def test_delNode(self):
+        node0 = Node.create(VRT_XML)
+        node0.delNode('VRTRasterBand', options={'band': 2})
+
+        self.assertEqual(node0.tagList(), ['GeoTransform', 'VRTRasterBand'])
+        self.assertEqual(node0.node('VRTRasterBand').getAttribute('band'), '1')
+        node0.delNode('GeoTransform')
+        self.assertEqual(node0.tagList(), ['VRTRasterBand'])
+
+    def test_namespace_prefixes_kept(self):
+        node0 = Node.create('<a xmlns:safe="http://www.esa.int/safe">'
+                            '<safe:b safe:id="1">value</safe:b></a>')
+
+        self.assertEqual(node0['safe:b'], 'value')
+        self.assertEqual(node0.node('safe:b').getAttribute('safe:id'), '1')
+        self.assertTrue('xmlns:safe="http://www.esa.int/safe"' in
+                        node0.rawxml())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#------------------------------------------------------------------------------
+# Name:         test_resamplingplan.py
+# Purpose:      Test resampling plans for repeated reprojection
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import os
+
+import numpy as np
+
+from nansat import Nansat, Domain, ResamplingPlan
+from nansat.tools import OptionError
+
+import nansat_test_data as ntd
+
+
+class ResamplingPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.srcDomain = Domain(4326, '-te 0 70 40 80 -ts 400 200')
+        self.dstDomain = Domain('+proj=stere +lat_0=90 +lon_0=20 '
+                                '+datum=WGS84',
+                                '-te -600000 -2000000 600000 -1200000 '
+                                '-ts 300 200')
+        rows, cols = np.mgrid[0:200, 0:400]
+        self.array = (np.sin(cols / 50.) + np.cos(rows / 30.)).astype(
+                                                                 'float32')
+        self.planFileName = os.path.join(ntd.tmp_data_path,
+                                         'resampling_plan.npz')
+        if os.path.exists(self.planFileName):
+            os.remove(self.planFileName)
+
+    def reproject(self, eResampleAlg, **kwargs):
+        n = Nansat(domain=self.srcDomain, array=self.array, logLevel=40)
+        n.reproject(self.dstDomain, eResampleAlg=eResampleAlg, **kwargs)
+        return n[1]
+
+    def test_nearest_matches_warping(self):
+        plan = ResamplingPlan(Nansat(domain=self.srcDomain).vrt,
+                              self.dstDomain.vrt, eResampleAlg=0)
+        data = plan.apply(self.array)
+        dataWarped = self.reproject(0)
+
+        inside = np.isfinite(data)
+
+        self.assertEqual(data.shape, (200, 300))
+        self.assertEqual(data.dtype, self.array.dtype)
+        self.assertTrue(inside.mean() > 0.5)
+        self.assertTrue((data == dataWarped)[inside].mean() > 0.95)
+
+    def test_bilinear_matches_warping(self):
+        data = self.reproject(1, resamplingPlan=self.planFileName)
+        dataWarped = self.reproject(1)
+        inside = (dataWarped != 0) * np.isfinite(data)
+
+        self.assertTrue(inside.mean() > 0.5)
+        self.assertTrue(np.abs(data - dataWarped)[inside].max() < 0.05)
+
+    def test_plan_saved_and_reused(self):
+        n = Nansat(domain=self.srcDomain, array=self.array, logLevel=40)
+        n.reproject(self.dstDomain, eResampleAlg=1,
+                    resamplingPlan=self.planFileName)
+        mtime = os.path.getmtime(self.planFileName)
+        plan = ResamplingPlan.load(self.planFileName)
+        n2 = Nansat(domain=self.srcDomain, array=self.array * 2,
+                    logLevel=40)
+        n2.reproject(self.dstDomain, eResampleAlg=1,
+                     resamplingPlan=self.planFileName)
+
+        self.assertEqual(plan.method, 'bilinear')
+        self.assertTrue(plan.is_compatible(n2.vrt.vrt, self.dstDomain.vrt))
+        self.assertEqual(os.path.getmtime(self.planFileName), mtime)
+        np.testing.assert_allclose(n2[1], n[1] * 2, rtol=1e-5)
+        n2.undo()
+        self.assertEqual(n2.shape(), (200, 400))
+
+    def test_invalid_source_pixels_not_used(self):
+        plan = ResamplingPlan(Nansat(domain=self.srcDomain).vrt,
+                              self.dstDomain.vrt, eResampleAlg=1)
+        array = self.array.copy()
+        array[:, :200] = np.nan
+        data = plan.apply(array)
+        dataFull = plan.apply(self.array)
+        valid = np.isfinite(data)
+
+        dataInt = plan.apply((array * 10).astype('int16'), -100,
+                             np.isfinite(array))
+
+        self.assertTrue(valid.any())
+        self.assertTrue(np.abs(data - dataFull)[valid].max() < 0.1)
+        np.testing.assert_array_equal(dataInt == -100, ~valid)
+
+    def test_fill_value_and_expression(self):
+        n = Nansat(domain=self.srcDomain, array=self.array, logLevel=40)
+        n.set_metadata('_FillValue', '-10', 1)
+        n.add_band(expression='self[1] * 2', parameters={'name': 'double'})
+        n.reproject(self.dstDomain, eResampleAlg=0,
+                    resamplingPlan=self.planFileName)
+        band1 = n[1]
+        outside = np.isnan(band1)
+
+        self.assertTrue(outside.any())
+        self.assertEqual(n.get_metadata('expression', 2), '')
+        np.testing.assert_allclose(n['double'][~outside],
+                                   band1[~outside] * 2, rtol=1e-6)
+        self.assertRaises(OptionError, n.reproject,
+                          resamplingPlan=self.planFileName)
+
+    def test_incompatible_plan(self):
+        plan = ResamplingPlan(Nansat(domain=self.srcDomain).vrt,
+                              self.dstDomain.vrt)
+        n = Nansat(domain=Domain(4326, '-te 0 70 41 80 -ts 400 200'),
+                   array=self.array, logLevel=40)
+
+        self.assertFalse(plan.is_compatible(n.vrt, self.dstDomain.vrt))
+        self.assertRaises(OptionError, n.reproject, self.dstDomain,
+                          resamplingPlan=plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#------------------------------------------------------------------------------
+# Name:         test_vrtcache.py
+# Purpose:      Test the VRTCache class
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from nansat import Nansat
+from nansat.nansat import _get_mapper_version
+from nansat.vrt import VRT
+from nansat.vrtcache import VRTCache, _VSIMemFiles
+
+import nansat_test_data as ntd
+
+
+class VRTCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.test_file_gcps = os.path.join(ntd.test_data_path, 'gcps.tif')
+        self.cacheDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir, ignore_errors=True)
+
+    def test_cold_and_warm_open(self):
+        n1 = Nansat(self.test_file_gcps, cacheDir=self.cacheDir, logLevel=40)
+        cache = VRTCache(self.cacheDir)
+        self.assertEqual(len(cache.entries()), 1)
+        self.assertFalse(any(isinstance(f, _VSIMemFiles)
+                             for f in n1.vrt._keptFiles))
+
+        n2 = Nansat(self.test_file_gcps, cacheDir=self.cacheDir, logLevel=40)
+        self.assertTrue(any(isinstance(f, _VSIMemFiles)
+                            for f in n2.vrt._keptFiles))
+        self.assertEqual(n2.mapper, n1.mapper)
+        self.assertEqual(n2.bands(), n1.bands())
+        self.assertEqual(len(n2.vrt.dataset.GetGCPs()),
+                         len(n1.vrt.dataset.GetGCPs()))
+        np.testing.assert_array_equal(n2[1], n1[1])
+
+    def test_cache_with_added_band(self):
+        n1 = Nansat(self.test_file_gcps, cacheDir=self.cacheDir, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, cacheDir=self.cacheDir, logLevel=40)
+        n2.add_band(np.ones(n2.shape()), {'name': 'ones'})
+
+        self.assertEqual(n2['ones'].sum(), n2.shape()[0] * n2.shape()[1])
+
+    def test_corrupt_entry(self):
+        n1 = Nansat(self.test_file_gcps, cacheDir=self.cacheDir, logLevel=40)
+        cache = VRTCache(self.cacheDir, logLevel=50)
+        key = cache.entries()[0][0]
+        entryDir = os.path.join(self.cacheDir, key)
+        for fileName in os.listdir(entryDir):
+            if fileName != cache.entryName:
+                os.remove(os.path.join(entryDir, fileName))
+
+        self.assertEqual(cache.get(key, _get_mapper_version), (None, None))
+        self.assertEqual(cache.entries(), [])
+
+        open(os.path.join(self.cacheDir, 'key'), 'w').write('not a dir')
+        os.mkdir(entryDir)
+        open(os.path.join(entryDir, cache.entryName), 'w').write('{')
+        n2 = Nansat(self.test_file_gcps, cacheDir=cache, logLevel=40)
+
+        self.assertEqual(n2.bands(), n1.bands())
+        self.assertEqual(len(cache.entries()), 1)
+
+    def test_other_mapper_arguments(self):
+        Nansat(self.test_file_gcps, cacheDir=self.cacheDir, logLevel=40)
+        Nansat(self.test_file_gcps, cacheDir=self.cacheDir, logLevel=40,
+               someArgument=1)
+
+        self.assertEqual(len(VRTCache(self.cacheDir).entries()), 2)
+
+    def test_key_of_array_arguments(self):
+        cache = VRTCache(self.cacheDir)
+        grid1 = np.zeros((100, 100))
+        grid2 = grid1.copy()
+        grid2[50, 50] = 1
+        key1 = cache.get_key(self.test_file_gcps, '', {'latlonGrid': grid1})
+        key2 = cache.get_key(self.test_file_gcps, '', {'latlonGrid': grid2})
+        key3 = cache.get_key(self.test_file_gcps, '',
+                             {'latlonGrid': grid1.copy()})
+
+        self.assertNotEqual(key1, key2)
+        self.assertEqual(key1, key3)
+
+    def test_key_of_other_arguments(self):
+        cache = VRTCache(self.cacheDir)
+
+        self.assertEqual(cache.get_key(self.test_file_gcps, '',
+                                       {'someArgument': object()}), None)
+        self.assertNotEqual(cache.get_key(self.test_file_gcps, '',
+                                          {'someArgument': [1, 'a']}), None)
+
+    def test_purge(self):
+        Nansat(self.test_file_gcps, cacheDir=self.cacheDir, logLevel=40)
+        cache = VRTCache(self.cacheDir)
+
+        self.assertEqual(cache.purge(10 ** 9), 0)
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(cache.entries(), [])
+
+    def test_size_limit(self):
+        cache = VRTCache(self.cacheDir, maxBytes=1)
+        Nansat(self.test_file_gcps, cacheDir=cache, logLevel=40)
+
+        self.assertEqual(cache.entries(), [])
+
+    def test_vrt_from_array(self):
+        cache = VRTCache(self.cacheDir)
+        array = np.arange(200, dtype='float32').reshape(10, 20)
+        cache.put('array', VRT(array=array), 'test', '1')
+        array = None
+        vrt, mapper = cache.get('array', lambda mapper: '1')
+
+        np.testing.assert_array_equal(vrt.dataset.ReadAsArray(),
+                                      np.arange(200).reshape(10, 20))
+
+
+if __name__ == "__main__":
+    unittest.main()
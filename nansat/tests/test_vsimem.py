@@ -0,0 +1,100 @@
+#------------------------------------------------------------------------------
+# Name:         test_vsimem.py
+# Purpose:      Test accounting of VSI memory and spilling to disk
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from nansat import Nansat, Domain, vsimem_usage, set_vsimem_limit
+from nansat import vsimem
+from nansat.vrt import VRT
+
+
+class VSIMemTest(unittest.TestCase):
+    def setUp(self):
+        self.spillDir = tempfile.mkdtemp()
+        self.memDataPointer = VRT._memDataPointer
+        self.array = np.arange(10000, dtype='float32').reshape(100, 100)
+
+    def tearDown(self):
+        set_vsimem_limit(None)
+        VRT._memDataPointer = self.memDataPointer
+        shutil.rmtree(self.spillDir, ignore_errors=True)
+
+    def test_usage_of_added_band(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 100 100")
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(self.array, {'name': 'band1'})
+        bandVRT = n.vrt.bandVRTs.values()[0]
+
+        self.assertTrue(vsimem_usage()[bandVRT.fileName] >= 40000)
+
+    def test_new_band_on_disk_above_limit(self):
+        set_vsimem_limit(0, self.spillDir)
+        vrt = VRT(array=self.array)
+
+        self.assertEqual(os.path.dirname(vrt._file.rawFileName),
+                         self.spillDir)
+        self.assertTrue(vsimem_usage()[vrt.fileName] < 40000)
+        np.testing.assert_array_equal(vrt.dataset.ReadAsArray(), self.array)
+
+    def test_total_bytes(self):
+        total0 = vsimem.total_bytes()
+        vrt = VRT(array=self.array)
+        self.assertTrue(vsimem.total_bytes() - total0 >= 40000)
+        vrt = None
+
+        self.assertTrue(vsimem.total_bytes() - total0 < 40000)
+
+    def test_spill_raw_file(self):
+        VRT._memDataPointer = False
+        vrt = VRT(array=self.array)
+        self.assertTrue(vsimem_usage()[vrt.fileName] >= 40000)
+        set_vsimem_limit(0, self.spillDir)
+        rawFileName = vrt._file.rawFileName
+
+        self.assertEqual(os.path.dirname(rawFileName), self.spillDir)
+        self.assertTrue(vsimem_usage()[vrt.fileName] < 40000)
+        np.testing.assert_array_equal(vrt.dataset.ReadAsArray(), self.array)
+        vrt = None
+        self.assertFalse(os.path.exists(rawFileName))
+
+    def test_spill_array(self):
+        vrt = VRT(array=self.array)
+        self.assertTrue(vsimem_usage()[vrt.fileName] >= 40000)
+        set_vsimem_limit(0, self.spillDir)
+        rawFileName = vrt._file.rawFileName
+
+        self.assertEqual(os.path.dirname(rawFileName), self.spillDir)
+        self.assertTrue(vrt._file.array is None)
+        self.assertTrue(vsimem_usage().get(vrt.fileName, 0) < 40000)
+        np.testing.assert_array_equal(vrt.dataset.ReadAsArray(), self.array)
+        vrt = None
+        self.assertFalse(os.path.exists(rawFileName))
+
+    def test_spill_added_band(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 100 100")
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(self.array, {'name': 'band1'})
+        set_vsimem_limit(0, self.spillDir)
+        bandVRT = n.vrt.bandVRTs.values()[0]
+
+        self.assertTrue(vsimem_usage().get(bandVRT.fileName, 0) < 40000)
+        np.testing.assert_array_equal(n['band1'], self.array)
+        n.add_band(self.array + 1, {'name': 'band2'})
+        np.testing.assert_array_equal(n['band1'], self.array)
+        np.testing.assert_array_equal(n['band2'], self.array + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+#------------------------------------------------------------------------------
+# Name:         test_wkv.py
+# Purpose:      Test the WKVIndex class
+#
+# Created:      17.10.2026
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+
+from nansat.wkv import WKVIndex, get_wkv_index
+
+
+class WKVIndexTest(unittest.TestCase):
+    def test_get_wkv_index_built_once(self):
+        self.assertTrue(get_wkv_index() is get_wkv_index())
+
+    def test_get(self):
+        wkvDict = get_wkv_index().get('surface_backwards_scattering_'
+                                      'coefficient_of_radar_wave')
+
+        self.assertEqual(wkvDict['short_name'], 'sigma0')
+        self.assertEqual(wkvDict['units'], 'm/m')
+        self.assertEqual(get_wkv_index().get('no_such_wkv'), {})
+
+    def test_get_returns_copy(self):
+        wkvIndex = WKVIndex()
+        wkvIndex.get('grayscale')['units'] = 'm'
+
+        self.assertEqual(wkvIndex.get('grayscale')['units'], '1')
+
+    def test_find_short_name_and_units(self):
+        wkvIndex = get_wkv_index()
+        sigma0 = wkvIndex.find_short_name('sigma0')
+        unitsMM = wkvIndex.find_units('m/m')
+
+        self.assertEqual(len(sigma0), 1)
+        self.assertTrue(sigma0[0] in unitsMM)
+        self.assertTrue('grayscale' in wkvIndex)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -21,12 +21,20 @@ from string import Template, ascii_uppercase, digits
 from random import choice
 import datetime
 import warnings
+import weakref
+import multiprocessing
+from contextlib import contextmanager
+import dateutil.parser
 
 import numpy as np
 
 from nansat.node import Node
+from nansat.datasetpool import datasetPool
+from nansat.wkv import get_wkv_index
+from nansat import vsimem
+from nansat import gcps as gcptools
 from nansat.nsr import NSR
-from nansat.tools import add_logger, gdal, osr
+from nansat.tools import add_logger, gdal, osr, OptionError, GDALError
 
 
 class GeolocationArray():
@@ -111,6 +119,288 @@ class GeolocationArray():
         return lonGrid, latGrid
 
 
+class BandIndex(object):
+    '''Index of band metadata of a GDAL dataset
+
+    Metadata of all bands is fetched from the dataset once and kept in
+    dictionaries for fast queries:
+    self.metadata : band number => dictionary with band metadata
+    self.names : band name => band number
+    self.wkvs : wkv => list of band numbers
+    self.times : list with time of each band (parsed on first access)
+
+    Instance of BandIndex is created by VRT.get_band_index() and is
+    rebuilt after the bands of the VRT are changed.
+    '''
+    def __init__(self, dataset):
+        '''Read metadata of all bands from the dataset
+
+        Parameters
+        -----------
+        dataset : GDAL Dataset
+
+        '''
+        self.rasterCount = dataset.RasterCount
+        self.metadata = {}
+        self.names = {}
+        self.wkvs = {}
+        self._times = None
+        for iBand in range(self.rasterCount):
+            bandNumber = iBand + 1
+            bandMetadata = dataset.GetRasterBand(bandNumber).GetMetadata()
+            self.metadata[bandNumber] = bandMetadata
+            # if several bands have the same name, the last one is kept
+            if 'name' in bandMetadata:
+                self.names[bandMetadata['name']] = bandNumber
+            if 'wkv' in bandMetadata:
+                self.wkvs.setdefault(bandMetadata['wkv'], []).append(
+                                                                bandNumber)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+        return self.names[name]
+
+    def __len__(self):
+        return self.rasterCount
+
+    @property
+    def times(self):
+        '''List with datetime (or None) for each band'''
+        if self._times is None:
+            self._times = []
+            for bandNumber in range(1, self.rasterCount + 1):
+                try:
+                    bandTime = dateutil.parser.parse(
+                                        self.metadata[bandNumber]['time'])
+                except:
+                    bandTime = None
+                self._times.append(bandTime)
+        return self._times
+
+    def find(self, query):
+        '''Find band with given metadata
+
+        Parameters
+        -----------
+        query : dict
+            metadata keys and values which the band should have
+
+        Returns
+        --------
+        bandNumber : int
+            number of the last band which matches all items of the query
+            or 0 if no band is found
+
+        '''
+        # fast path for the most common query
+        if query.keys() == ['name']:
+            return self.names.get(query['name'], 0)
+
+        for bandNumber in range(self.rasterCount, 0, -1):
+            bandMetadata = self.metadata[bandNumber]
+            if all(key in bandMetadata and bandMetadata[key] == query[key]
+                   for key in query):
+                return bandNumber
+        return 0
+
+
+class _VRTFile(object):
+    '''VRT file and GDAL dataset shared by copies of VRT (copy-on-write)
+
+    self.users keeps (weak references to) the VRT objects which use the
+    file. The VRT and RAW files are deleted together with the object, i.e.
+    when the last VRT using the file is deleted.
+
+    The object is registered in nansat.vsimem for accounting of memory:
+    VSI files and the array used by the dataset are counted (updated by VRT
+    when the files are written). RAW files and arrays can be moved to disk
+    (see spill()).
+    '''
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.dataset = None
+        self.users = weakref.WeakSet()
+        # array used by the dataset (see VRT.create_dataset_from_array)
+        self.array = None
+        # arrays moved to disk, kept for datasets opened before (see spill)
+        self.spilledArrays = []
+        # RAW file with data of the band (see VRT.create_dataset_from_array)
+        self.rawFileName = None
+        vsimem.register(self)
+
+    @property
+    def name(self):
+        return self.fileName
+
+    def vsimem_bytes(self):
+        '''Number of bytes of VSI files and array used by the dataset'''
+        nBytes = vsimem.file_size(self.fileName)
+        if self.rawFileName is not None:
+            nBytes += vsimem.file_size(self.rawFileName)
+        if self.array is not None:
+            nBytes += self.array.nbytes
+        return nBytes
+
+    def spill(self):
+        '''Move RAW file or array from memory to disk and update the VRT file
+
+        Datasets of other VRTs which have already opened self.dataset as a
+        source keep the RAW file in memory until they are re-opened. GDAL
+        may keep such datasets open (and reuse them) as long as the VRT file
+        exists, therefore a spilled array is not counted any more, but is
+        kept until the VRT file is deleted.
+
+        Returns
+        --------
+        nBytes : int
+            number of freed bytes (0 if there is no RAW file or array in
+            memory)
+
+        '''
+        if self.array is not None and self.dataset is not None:
+            return self._spill_array()
+        if (self.rawFileName is None or self.dataset is None or
+                not self.rawFileName.startswith('/vsimem/')):
+            return 0
+        diskFileName = vsimem.make_spill_filename()
+        nBytes = _copy_vsi_file(self.rawFileName, diskFileName)
+
+        # point VRT to the new RAW file and re-open dataset
+        self.dataset.FlushCache()
+        vrtXML = _read_vsi_file(self.fileName)
+        self.dataset = None
+        datasetPool.discard(self.fileName)
+        gdal.FileFromMemBuffer(self.fileName,
+                               vrtXML.replace(self.rawFileName,
+                                              diskFileName))
+        self.dataset = gdal.Open(self.fileName)
+        gdal.Unlink(self.rawFileName)
+        self.rawFileName = diskFileName
+
+        return nBytes
+
+    def _spill_array(self):
+        '''Write the array into a RAW file on disk and replace the band which
+        uses the array (see VRT.create_dataset_from_array) with RawRasterBand
+        '''
+        array = self.array
+        diskFileName = vsimem.make_spill_filename()
+        array.tofile(diskFileName)
+
+        self.dataset.FlushCache()
+        vrtXML = _read_vsi_file(self.fileName)
+        if 'MEM:::' not in vrtXML:
+            os.remove(diskFileName)
+            return 0
+        bands = vrtXML.split('</VRTRasterBand>')
+        for i, band in enumerate(bands):
+            if 'MEM:::' not in band:
+                continue
+            start = band.index('<SimpleSource>')
+            end = band.index('</SimpleSource>') + len('</SimpleSource>')
+            rawSource = ('<SourceFilename relativeToVRT="0">%s'
+                         '</SourceFilename><ImageOffset>0</ImageOffset>'
+                         '<PixelOffset>%d</PixelOffset>'
+                         '<LineOffset>%d</LineOffset>'
+                         % (diskFileName, array.itemsize,
+                            array.itemsize * array.shape[1]))
+            bands[i] = (band[:start].replace(
+                            '<VRTRasterBand ',
+                            '<VRTRasterBand subClass="VRTRawRasterBand" ',
+                            1) +
+                        rawSource + band[end:])
+
+        # point VRT to the RAW file and re-open dataset
+        self.dataset = None
+        datasetPool.discard(self.fileName)
+        gdal.FileFromMemBuffer(self.fileName,
+                               '</VRTRasterBand>'.join(bands))
+        self.dataset = gdal.Open(self.fileName)
+        self.rawFileName = diskFileName
+        self.spilledArrays.append(array)
+        self.array = None
+
+        return array.nbytes
+
+    def __del__(self):
+        ''' Destructor deletes VRT and RAW files'''
+        vsimem.unregister(self)
+        # close dataset before removing the files
+        self.dataset = None
+        datasetPool.discard(self.fileName)
+        try:
+            gdal.Unlink(self.fileName)
+            gdal.Unlink(self.fileName.replace('vrt', 'raw'))
+        except:
+            pass
+        if (self.rawFileName is not None and
+                not self.rawFileName.startswith('/vsimem/')):
+            try:
+                os.remove(self.rawFileName)
+            except OSError:
+                pass
+
+
+def _read_vsi_file(fileName):
+    '''Read whole content of a VSI file'''
+    vsiFile = gdal.VSIFOpenL(fileName, 'rb')
+    gdal.VSIFSeekL(vsiFile, 0, 2)
+    vsiFileSize = gdal.VSIFTellL(vsiFile)
+    gdal.VSIFSeekL(vsiFile, 0, 0)
+    content = gdal.VSIFReadL(vsiFileSize, 1, vsiFile)
+    gdal.VSIFCloseL(vsiFile)
+    return content
+
+
+def _copy_vsi_file(srcFileName, dstFileName, blockSize=2 ** 24):
+    '''Copy VSI file into a file on disk block by block
+
+    Returns
+    --------
+    nBytes : int
+        size of the file
+
+    '''
+    srcFile = gdal.VSIFOpenL(srcFileName, 'rb')
+    dstFile = open(dstFileName, 'wb')
+    nBytes = 0
+    while True:
+        block = gdal.VSIFReadL(1, blockSize, srcFile)
+        if not block:
+            break
+        dstFile.write(block)
+        nBytes += len(block)
+    dstFile.close()
+    gdal.VSIFCloseL(srcFile)
+    return nBytes
+
+
+def _read_window(args):
+    '''Read all bands of a VRT file in a window
+
+    Used in worker processes (see VRT.get_materialized_vrt()): the VRT file
+    and its sources in /vsimem are inherited from the parent process.
+
+    Parameters
+    -----------
+    args : tuple
+        name of the VRT file and window (xOff, yOff, xSize, ySize)
+
+    Returns
+    --------
+    window : tuple
+    data : list with numpy arrays (one per band)
+
+    '''
+    fileName, window = args
+    dataset = gdal.Open(fileName)
+    data = [dataset.GetRasterBand(iBand + 1).ReadAsArray(*window)
+            for iBand in range(dataset.RasterCount)]
+    return window, data
+
+
 class VRT(object):
     '''Wrapper around GDAL VRT-file
 
@@ -175,6 +465,22 @@ class VRT(object):
               </VRTRasterBand>
             </VRTDataset> ''')
 
+    MemRasterBandSource = Template('''
+            <VRTDataset rasterXSize="$XSize" rasterYSize="$YSize">
+              <VRTRasterBand dataType="$DataType" band="1">
+                <SimpleSource>
+                  <SourceFilename relativeToVRT="0">$SrcFileName</SourceFilename>
+                  <SourceBand>1</SourceBand>
+                </SimpleSource>
+              </VRTRasterBand>
+            </VRTDataset> ''')
+
+    # can GDAL open MEM datasets from a data pointer? (see
+    # create_dataset_from_array())
+    _memDataPointer = None
+    # size of blocks written into raw files from arrays
+    _rawBlockBytes = 2 ** 24
+
     ReprojectTransformer = Template('''
         <ReprojectTransformer>
           <ReprojectionTransformer>
@@ -189,6 +495,48 @@ class VRT(object):
     bandVRTs = None
     # use Thin Spline Transformation of the VRT has GCPs?
     tps = False
+    # index of band metadata (see get_band_index())
+    bandIndex = None
+    # XML tree and depth of the open transaction (see xml_transaction())
+    _xmlNode = None
+    _xmlDepth = 0
+    # VRT file and dataset (shared by copies, see _shared_copy())
+    _file = None
+    # files kept while the VRT exists: shared file replaced by own copy
+    # (see _unshare()), VSI files restored from cache (see VRTCache.get())
+    _keptFiles = ()
+    # flattened copy of the VRT chain for reading (see flatten()),
+    # False if the VRT cannot be flattened
+    flatVRT = None
+    # can bands be appended to self in place (see get_append_vrt())?
+    bandsAppendable = False
+    # number of bands before each batch of bands appended in place
+    bandBatches = ()
+    # cached transformer pixel/line => lon/lat and georeference of the
+    # dataset it was created for (see transform_points())
+    _transformer = None
+    _transformerKey = None
+
+    # sources which can be composed with sources of the sub-VRTs
+    _flatSourceTypes = ['SimpleSource', 'ComplexSource', 'AveragedSource']
+    # elements of a band which do not affect reading of its source
+    _flatBandTags = ['Metadata', 'Description', 'ColorInterp', 'UnitType',
+                     'Offset', 'Scale', 'CategoryNames', 'ColorTable',
+                     'Histograms']
+    # elements of a source which can be composed
+    _flatSourceTags = ['SourceFilename', 'SourceBand', 'SourceProperties',
+                       'SrcRect', 'DstRect', 'ScaleOffset', 'ScaleRatio',
+                       'NODATA', 'LUT']
+    # data types of an intermediate band which keep values of a source
+    # band exactly
+    _flatHeldTypes = {
+        'UInt16': ['Byte'],
+        'Int16': ['Byte'],
+        'UInt32': ['Byte', 'UInt16'],
+        'Int32': ['Byte', 'UInt16', 'Int16'],
+        'Float32': ['Byte', 'UInt16', 'Int16'],
+        'Float64': ['Byte', 'UInt16', 'Int16', 'UInt32', 'Int32',
+                    'Float32']}
 
     def __init__(self, gdalDataset=None, vrtDataset=None,
                  array=None,
@@ -201,7 +549,8 @@ class VRT(object):
                  srcMetadata='',
                  geolocationArray=None,
                  nomem=False,
-                 lat=None, lon=None):
+                 lat=None, lon=None,
+                 copyArray=True):
         ''' Create VRT dataset from GDAL dataset, or from given parameters
 
         If vrtDataset is given, creates full copy of VRT content
@@ -236,6 +585,10 @@ class VRT(object):
             grid with longitudes
         lat : Numpy array
             grid with latitudes
+        copyArray : bool
+            copy <array> if its data would be used directly (see
+            create_dataset_from_array())? False only for arrays which are
+            not used anywhere else
         bandVRTs : dict
             dictionary with VRTs that are used inside VRT
 
@@ -253,11 +606,6 @@ class VRT(object):
         if self.bandVRTs is None:
             self.bandVRTs = {}
 
-        # open and parse wkv.xml
-        fileNameWKV = os.path.join(os.path.dirname(
-                                   os.path.realpath(__file__)), 'wkv.xml')
-        self.wkvNode0 = Node.create(fileNameWKV)
-
         # default empty geolocation array of source
         srcGeolocationArray = GeolocationArray()
         if vrtDataset is not None:
@@ -301,7 +649,7 @@ class VRT(object):
                                                      srcRasterYSize,
                                                      bands=0)
             else:
-                self.create_dataset_from_array(array)
+                self.create_dataset_from_array(array, copyArray)
 
             # set geo-metadata in the VRT dataset
             self.dataset.SetGCPs(srcGCPs, srcGCPProjection)
@@ -330,13 +678,49 @@ class VRT(object):
         self.logger.debug('VRT RasterXSize %d' % self.dataset.RasterXSize)
         self.logger.debug('VRT RasterYSize %d' % self.dataset.RasterYSize)
 
-    def __del__(self):
-        ''' Destructor deletes VRT and RAW files'''
-        try:
-            gdal.Unlink(self.fileName)
-            gdal.Unlink(self.fileName.replace('vrt', 'raw'))
-        except:
-            pass
+    @property
+    def fileName(self):
+        '''Name of the VRT file'''
+        return self._file.fileName
+
+    @fileName.setter
+    def fileName(self, fileName):
+        '''Start using new VRT file (deleted together with the last user)'''
+        if self._file is not None:
+            self._file.users.discard(self)
+        self._file = _VRTFile(fileName)
+        self._file.users.add(self)
+
+    @property
+    def dataset(self):
+        '''GDAL dataset opened from the VRT file
+
+        The dataset can be shared with copies of self (see _shared_copy())
+
+        '''
+        return self._file.dataset
+
+    @dataset.setter
+    def dataset(self, dataset):
+        self._file.dataset = dataset
+        self._transformer = None
+
+    def _unshare(self):
+        '''Make own copy of the VRT file if it is shared with copies of self
+
+        Should be called before any change of self.dataset or of the VRT
+        file (copy-on-write). The shared file is kept while self exists:
+        its RAW file and sub-VRTs can be referenced by the copy.
+
+        '''
+        oldFile = self._file
+        if len(oldFile.users) < 2:
+            return
+        self.fileName = self._make_filename()
+        self.dataset = self.vrtDriver.CreateCopy(self.fileName,
+                                                 oldFile.dataset)
+        self.dataset.SetMetadataItem('fileName', self.fileName)
+        self._keptFiles = tuple(self._keptFiles) + (oldFile, )
 
     def _make_filename(self, extention='vrt', nomem=False):
         '''Create random VSI file name
@@ -456,6 +840,7 @@ class VRT(object):
         # Check if dst is given, or create empty dict
         if dst is None:
             dst = {}
+        self._unshare()
 
         # process all sources: check, set defaults, make XML
         srcDefaults = {'SourceBand': 1,
@@ -474,29 +859,35 @@ class VRT(object):
                 if srcDefault not in src:
                     src[srcDefault] = srcDefaults[srcDefault]
 
-            # Find DataType of source (if not given in src)
-            if src['SourceBand'] > 0 and 'DataType' not in src:
-                self.logger.debug('SRC[SourceFilename]: %s'
-                                  % src['SourceFilename'])
-                srcDataset = gdal.Open(src['SourceFilename'])
-                srcRasterBand = srcDataset.GetRasterBand(src['SourceBand'])
-                src['DataType'] = srcRasterBand.DataType
-                self.logger.debug('SRC[DataType]: %d' % src['DataType'])
-
-            srcDs = gdal.Open(src['SourceFilename'])
-            # create XML for each source
-            src['XML'] = self.ComplexSource.substitute(
-                Dataset=src['SourceFilename'],
-                SourceBand=src['SourceBand'],
-                SourceType=src['SourceType'],
-                NODATA=src['NODATA'],
-                ScaleOffset=src['ScaleOffset'],
-                ScaleRatio=src['ScaleRatio'],
-                LUT=src['LUT'],
-                srcXSize=srcDs.RasterXSize,
-                srcYSize=srcDs.RasterYSize,
-                dstXSize=srcDs.RasterXSize,
-                dstYSize=srcDs.RasterYSize)
+            with datasetPool.borrow(src['SourceFilename']) as srcDs:
+                if srcDs is None:
+                    raise GDALError('Cannot open source %s'
+                                    % src['SourceFilename'])
+                # Find DataType of source (if not given in src)
+                if src['SourceBand'] > 0 and 'DataType' not in src:
+                    self.logger.debug('SRC[SourceFilename]: %s'
+                                      % src['SourceFilename'])
+                    srcRasterBand = srcDs.GetRasterBand(src['SourceBand'])
+                    if srcRasterBand is None:
+                        raise GDALError('Source %s has no band %s'
+                                        % (src['SourceFilename'],
+                                           src['SourceBand']))
+                    src['DataType'] = srcRasterBand.DataType
+                    self.logger.debug('SRC[DataType]: %d' % src['DataType'])
+
+                # create XML for each source
+                src['XML'] = self.ComplexSource.substitute(
+                    Dataset=src['SourceFilename'],
+                    SourceBand=src['SourceBand'],
+                    SourceType=src['SourceType'],
+                    NODATA=src['NODATA'],
+                    ScaleOffset=src['ScaleOffset'],
+                    ScaleRatio=src['ScaleRatio'],
+                    LUT=src['LUT'],
+                    srcXSize=srcDs.RasterXSize,
+                    srcYSize=srcDs.RasterYSize,
+                    dstXSize=srcDs.RasterXSize,
+                    dstYSize=srcDs.RasterYSize)
 
         # create destination options
         if 'PixelFunctionType' in dst and len(dst['PixelFunctionType']) > 0:
@@ -596,10 +987,31 @@ class VRT(object):
         dst['SourceFilename'] = srcs[0]['SourceFilename']
         dst['SourceBand'] = str(srcs[0]['SourceBand'])
         dstRasterBand = self._put_metadata(dstRasterBand, dst)
+        self.bandIndex = None
+        self.flatVRT = None
+        # pooled handles of the file (e.g. opened by get_super_vrt() of a
+        # previous copy) do not have the new band
+        datasetPool.discard(self.fileName)
 
         # return name of the created band
         return dst['name']
 
+    def get_band_index(self):
+        '''Get index of band metadata
+
+        The index is created on the first call and kept until bands
+        or their metadata are changed by VRT methods
+
+        Returns
+        --------
+        bandIndex : BandIndex
+
+        '''
+        if (self.bandIndex is None or
+                self.bandIndex.rasterCount != self.dataset.RasterCount):
+            self.bandIndex = BandIndex(self.dataset)
+        return self.bandIndex
+
     def _set_time(self, time):
         ''' Set time of dataset and/or its bands
 
@@ -626,9 +1038,11 @@ class VRT(object):
                               % (str(numBands), str(len(time))))
 
         # Store time as metadata key 'time' in each band
+        self._unshare()
         for i in range(numBands):
             iBand = self.dataset.GetRasterBand(i + 1)
             iBand.SetMetadataItem('time', str(time[i].isoformat()))
+        self.bandIndex = None
 
         return
 
@@ -646,14 +1060,7 @@ class VRT(object):
             WKV corresponds to the given wkv_name
 
         '''
-        wkvDict = {}
-        for iNode in self.wkvNode0.nodeList('wkv'):
-            tagsList = iNode.tagList()
-            if iNode.node('standard_name').value == wkvName:
-                wkvDict = {'standard_name': wkvName}
-                for iTag in tagsList:
-                    wkvDict[iTag] = str(iNode.node(iTag).value)
-        return wkvDict
+        return get_wkv_index().get(wkvName)
 
     def _put_metadata(self, rasterBand, metadataDict):
         ''' Put all metadata into a raster band
@@ -685,33 +1092,38 @@ class VRT(object):
 
         return rasterBand
 
-    def create_dataset_from_array(self, array):
+    def create_dataset_from_array(self, array, copyArray=True):
         '''Create a dataset with a band from an array
 
-        Write contents of the array into flat binary file (VSI)
-        Write VRT file with RawRastesrBand, which points to the binary file
+        If GDAL can open MEM datasets from a data pointer, write VRT file
+        with SimpleSource which points to the data of an array kept while
+        the VRT file exists: a copy of <array>, or <array> itself if
+        <copyArray> is False (then it should not be changed afterwards).
+        Otherwise (or if the VRT is not in memory) write contents of the
+        array block by block into flat binary file and write VRT file with
+        RawRasterBand, which points to the binary file.
         Open the VRT file as self.dataset with GDAL
 
         Parameters
         -----------
         array : numpy array
+        copyArray : bool
+            copy the array if its data is used directly?
 
         Modifies
         ---------
-        binary file is written (VSI)
+        binary file is written (VSI) if data pointer is not used
         VRT file is written (VSI)
         self.dataset is opened
 
         '''
+        # the data should be contiguous and in native byte order
+        inputArray = array
+        if not array.dtype.isnative:
+            array = array.astype(array.dtype.newbyteorder('='))
+        array = np.ascontiguousarray(array)
         arrayDType = array.dtype.name
         arrayShape = array.shape
-        # create flat binary file from array (in VSI)
-        binaryFile = self.fileName.replace('.vrt', '.raw')
-        ofile = gdal.VSIFOpenL(binaryFile, 'wb')
-        gdal.VSIFWriteL(array.tostring(), len(array.tostring()), 1, ofile)
-        gdal.VSIFCloseL(ofile)
-        array = None
-
         self.logger.debug('arrayDType: %s', arrayDType)
 
         #create conents of VRT-file pointing to the binary file
@@ -738,6 +1150,37 @@ class VRT(object):
 
         self.logger.debug('DataType: %s', dataType)
 
+        # above the high-water mark of memory data is written to disk
+        toDisk = vsimem.is_over_limit(array.nbytes)
+        if (self.fileName.startswith('/vsimem/') and not toDisk and
+                dataType is not None and self._mem_data_pointer()):
+            if copyArray and array is inputArray:
+                # changes of the input array should not change the band
+                array = array.copy()
+            contents = self.MemRasterBandSource.substitute(
+                XSize=arrayShape[1],
+                YSize=arrayShape[0],
+                DataType=dataType,
+                SrcFileName=self._mem_filename(array, dataType))
+            self.write_xml(contents)
+            # keep the array while the VRT file is used
+            self._file.array = array
+            vsimem.update(self._file)
+            return
+
+        # create flat binary file from array (in VSI or on disk)
+        if toDisk:
+            binaryFile = vsimem.make_spill_filename()
+        else:
+            binaryFile = self.fileName.replace('.vrt', '.raw')
+        self._file.rawFileName = binaryFile
+        ofile = gdal.VSIFOpenL(binaryFile, 'wb')
+        blockRows = max(1, self._rawBlockBytes // max(1, array[0].nbytes))
+        for row in range(0, arrayShape[0], blockRows):
+            blockData = array[row:row + blockRows].tostring()
+            gdal.VSIFWriteL(blockData, len(blockData), 1, ofile)
+        gdal.VSIFCloseL(ofile)
+
         lineOffset = str(int(pixelOffset) * arrayShape[1])
         contents = self.RawRasterBandSource.substitute(
             XSize=arrayShape[1],
@@ -749,6 +1192,28 @@ class VRT(object):
             LineOffset=lineOffset)
         #write XML contents to
         self.write_xml(contents)
+        vsimem.update(self._file)
+        vsimem.spill()
+
+    def _mem_filename(self, array, dataType):
+        '''Name of GDAL MEM dataset which uses data of 2D C-contiguous array'''
+        return ('MEM:::DATAPOINTER=%d,PIXELS=%d,LINES=%d,BANDS=1,'
+                'DATATYPE=%s' % (array.ctypes.data, array.shape[1],
+                                 array.shape[0], dataType))
+
+    def _mem_data_pointer(self):
+        '''Check (once) if GDAL can open MEM datasets from data pointer'''
+        if VRT._memDataPointer is None:
+            testArray = np.zeros((1, 1), 'uint8')
+            gdal.PushErrorHandler('CPLQuietErrorHandler')
+            try:
+                testDataset = gdal.Open(self._mem_filename(testArray,
+                                                           'Byte'))
+            except RuntimeError:
+                testDataset = None
+            gdal.PopErrorHandler()
+            VRT._memDataPointer = testDataset is not None
+        return VRT._memDataPointer
 
     def read_xml(self, inFileName=None):
         '''Read XML content of the VRT-file
@@ -767,6 +1232,8 @@ class VRT(object):
         if inFileName is None:
             inFileName = str(self.fileName)
             self.dataset.FlushCache()
+            # pooled handles of the file may be outdated
+            datasetPool.discard(inFileName)
 
         #read from the vsi-file
         # open
@@ -796,43 +1263,97 @@ class VRT(object):
 
         '''
         #write to the vsi-file
-
+        self._unshare()
         vsiFile = gdal.VSIFOpenL(self.fileName, 'w')
         gdal.VSIFWriteL(vsiFileContent,
                         len(vsiFileContent), 1, vsiFile)
         gdal.VSIFCloseL(vsiFile)
+        datasetPool.discard(self.fileName)
+        vsimem.update(self._file)
         # re-open self.dataset with new content
         self.dataset = gdal.Open(self.fileName)
+        self.bandIndex = None
+        self.flatVRT = None
+
+    @contextmanager
+    def xml_transaction(self):
+        '''Collect edits of the VRT XML and write them at once
+
+        Yields root Node of the parsed XML. All edits of the Node (also
+        made by nested transactions, e.g. in delete_band() or
+        _remove_geotransform()) are written into the VRT file and the
+        dataset is re-opened only once, at the end of the outermost
+        transaction. If an exception is raised, nothing is written.
+        Inside the transaction the dataset should not be modified with
+        GDAL API (e.g. SetGCPs, AddBand): these changes would be lost.
+
+        Examples
+        --------
+        with vrt.xml_transaction() as node0:
+            node0.replaceAttribute('rasterXSize', '100')
+            vrt.delete_bands([2, 3])
+        # XML is written and the dataset is re-opened here
+
+        '''
+        if self._xmlDepth == 0:
+            self._xmlNode = Node.create(self.read_xml())
+        self._xmlDepth += 1
+        try:
+            yield self._xmlNode
+        except:
+            # discard the edits
+            self._xmlDepth -= 1
+            if self._xmlDepth == 0:
+                self._xmlNode = None
+            raise
+
+        self._xmlDepth -= 1
+        if self._xmlDepth == 0:
+            node0 = self._xmlNode
+            self._xmlNode = None
+            self.write_xml(node0.rawxml())
 
     def export(self, fileName):
         '''Export VRT file as XML into given <fileName>'''
         self.vrtDriver.CreateCopy(fileName, self.dataset)
 
     def copy(self):
-        '''Creates full copy of VRT dataset'''
-        try:
-            # deep copy (everything including bands)
-            vrt = VRT(vrtDataset=self.dataset,
-                      geolocationArray=self.geolocationArray)
-        except:
-            # shallow copy (only geometadata)
-            vrt = VRT(gdalDataset=self.dataset,
-                      geolocationArray=self.geolocationArray)
+        '''Creates copy of VRT dataset
+
+        The copy has its own VRT file and GDAL dataset, which can be changed
+        without changing self. Sub-VRTs are shared with self until they are
+        changed by VRT methods (see _shared_copy()).
+
+        '''
+        vrt = self._shared_copy()
+        vrt._unshare()
 
-        # add bandVRTs: dictionary with several VRTs generated in mappers
-        # or with added bands
-        vrt.bandVRTs = self.bandVRTs
+        return vrt
+
+    def _shared_copy(self):
+        '''Creates copy of VRT dataset which shares the VRT file with self
+
+        The copy shares the VRT file (and sub-VRTs) with self until the copy
+        or self is changed (copy-on-write, see _unshare()). No files are
+        written. Methods of VRT call _unshare() before changes, but changes
+        of the shared GDAL dataset made directly (e.g.
+        vrt.dataset.SetMetadataItem()) are seen by all copies: used only
+        inside VRT, where the copy is changed only by VRT methods.
+
+        '''
+        vrt = VRT.__new__(VRT)
+        vrt.__dict__.update(self.__dict__)
+        vrt._file.users.add(vrt)
+        vrt._xmlNode = None
+        vrt._xmlDepth = 0
+        vrt.flatVRT = None
 
         # set TPS flag
         vrt.tps = bool(self.tps)
 
         # iterative copy of self.vrt
         if self.vrt is not None:
-            vrt.vrt = self.vrt.copy()
-            vrtXML = vrt.read_xml()
-            vrtXML = vrtXML.replace(os.path.split(self.vrt.fileName)[1],
-                                    os.path.split(vrt.vrt.fileName)[1])
-            vrt.write_xml(vrtXML)
+            vrt.vrt = self.vrt._shared_copy()
 
         return vrt
 
@@ -855,7 +1376,9 @@ class VRT(object):
 
         # add GEOLOCATION ARRAY metadata  if geolocationArray is not empty
         if len(geolocationArray.d) > 0:
+            self._unshare()
             self.dataset.SetMetadata(geolocationArray.d, 'GEOLOCATION')
+            self._transformer = None
 
     def remove_geolocationArray(self):
         ''' Remove GEOLOCATION ARRAY from the VRT
@@ -869,7 +1392,9 @@ class VRT(object):
         self.geolocationArray.d = {}
 
         # add GEOLOCATION ARRAY metadata (empty if geolocationArray is empty)
+        self._unshare()
         self.dataset.SetMetadata('', 'GEOLOCATION')
+        self._transformer = None
 
     def _remove_geotransform(self):
         '''Remove GeoTransfomr from VRT Object
@@ -879,90 +1404,37 @@ class VRT(object):
         The tag <GeoTransform> is revoved from the VRT-file
 
         '''
-        # read XML content from VRT
-        tmpVRTXML = self.read_xml()
         # find and remove GeoTransform
-        node0 = Node.create(tmpVRTXML)
-        node1 = node0.delNode('GeoTransform')
-        # Write the modified elemements back into temporary VRT
-        self.write_xml(node0.rawxml())
+        with self.xml_transaction() as node0:
+            node0.delNode('GeoTransform')
 
     def _add_gcp_metadata(self, bottomup=True):
         '''Add GCPs to metadata (required e.g. by Nansat.export())
 
-        Creates string representation of GCPs line/pixel/X/Y
-        Adds these string to metadata
+        Encodes line/pixel/X/Y of GCPs (see nansat.gcps.to_metadata)
+        Adds the encoded GCPs and GCP projection to metadata
 
         Modifies
         ---------
         Add self.vrd.dataset.Metadata
 
         '''
-        gcpNames = ['GCPPixel', 'GCPLine', 'GCPX', 'GCPY']
         gcps = self.dataset.GetGCPs()
         srs = self.dataset.GetGCPProjection()
-        chunkLength = 5000
 
         # exit if no GCPs
         if len(gcps) == 0:
             return
 
         # add GCP Projection
+        self._unshare()
         self.dataset.SetMetadataItem('NANSAT_GCPProjection',
                                      srs.replace(',',  '|').replace('"', '&'))
 
-        # make empty strings
-        gspStrings = ['', '', '', '']
-
-        column = 0
-        for gcp in gcps:
-            if gcps[0].GCPLine == gcp.GCPLine:
-                column += 1
-            else:
-                break
-
-        # change the shape of gcps. (from 1D to 2D)
-        row = len(gcps) / column
-        gcps = list(gcps)
-        gcps = zip(*[iter(gcps)]*column)
-
-        # fill string with values
-        for iRow in range(row):
-            for jColumn in range(column):
-                gspStrings[0] = ('%s%05d| ' %
-                                 (gspStrings[0],
-                                  int(gcps[iRow][jColumn].GCPPixel)))
-                gspStrings[1] = ('%s%05d| ' %
-                                 (gspStrings[1],
-                                  int(gcps[iRow][jColumn].GCPLine)))
-                # if bottomup is True (=image is filpped), gcps are flipped
-                if bottomup:
-                    gspStrings[2] = ('%s%012.8f| ' %
-                                     (gspStrings[2],
-                                      gcps[row-iRow-1][jColumn].GCPX))
-                    gspStrings[3] = ('%s%012.8f| ' %
-                                     (gspStrings[3],
-                                      gcps[row-iRow-1][jColumn].GCPY))
-                else:
-                    gspStrings[2] = ('%s%012.8f| ' %
-                                     (gspStrings[2],
-                                      gcps[iRow][jColumn].GCPX))
-                    gspStrings[3] = ('%s%012.8f| ' %
-                                     (gspStrings[3],
-                                      gcps[iRow][jColumn].GCPY))
-
-        for i, gspString in enumerate(gspStrings):
-            #split string into chunks
-            numberOfChunks = int(float(len(gspString)) / chunkLength)
-            chunki = 0
-            for chunki in range(0, numberOfChunks + 1):
-                chunk = gspString[(chunki * chunkLength):
-                                  min(((chunki + 1) * chunkLength),
-                                      len(gspString))]
-                # add chunk to metadata
-                self.dataset.SetMetadataItem('NANSAT_%s_%03d'
-                                             % (gcpNames[i], chunki),
-                                             chunk)
+        # add encoded GCPs
+        gcpMetadata = gcptools.to_metadata(gcptools.from_gdal(gcps), bottomup)
+        for key in sorted(gcpMetadata):
+            self.dataset.SetMetadataItem('NANSAT_' + key, gcpMetadata[key])
 
     def get_warped_vrt(self, dstSRS=None, eResampleAlg=0,
                        xSize=0, ySize=0, blockSize=None,
@@ -970,7 +1442,8 @@ class VRT(object):
                        use_geolocationArray=True,
                        use_gcps=True, skip_gcps=1,
                        use_geotransform=True,
-                       dstGCPs=[], dstGeolocationArray=None):
+                       dstGCPs=[], dstGeolocationArray=None,
+                       nThreads=None):
 
         ''' Create VRT object with WarpedVRT
 
@@ -1038,6 +1511,9 @@ class VRT(object):
             GCPs of the destination image
         dstGeolocationArray : GeolocationArray object
             Geolocation array of the destination object
+        nThreads : int or 'ALL_CPUS'
+            number of threads used by GDAL for warping each block
+            (warping option NUM_THREADS)
         use_geolocationArray : Boolean (True)
             Use geolocation array in input dataset (if present) for warping
         use_gcps : Boolean (True)
@@ -1053,7 +1529,7 @@ class VRT(object):
         warpedVRT : VRT object with WarpedVRT
 
         '''
-        # VRT to be warped
+        # VRT to be warped (changed below)
         srcVRT = self.copy()
 
         # srs to be used in AutoCreateWarpedVRT
@@ -1113,56 +1589,69 @@ class VRT(object):
         # set x/y size, geoTransform, blockSize
         self.logger.debug('set x/y size, geoTransform, blockSize')
 
-        # Modify rasterXsize, rasterYsize and geotranforms in the warped VRT
-        warpedXML = warpedVRT.read_xml()
-        node0 = Node.create(warpedXML)
-
-        if xSize > 0:
-            node0.replaceAttribute('rasterXSize', str(xSize))
-        if ySize > 0:
-            node0.replaceAttribute('rasterYSize', str(ySize))
-
-        if geoTransform is not None:
-            invGeotransform = gdal.InvGeoTransform(geoTransform)
-            # convert proper string style and set to the GeoTransform element
-            node0.node('GeoTransform').value = str(geoTransform).strip('()')
-            node0.node('DstGeoTransform').value = str(geoTransform).strip('()')
-            node0.node('DstInvGeoTransform').value = (
-                str(invGeotransform[1]).strip('()'))
-
-            if node0.node('SrcGeoLocTransformer'):
-                node0.node('BlockXSize').value = str(xSize)
-                node0.node('BlockYSize').value = str(ySize)
-
-            if blockSize is not None:
-                node0.node('BlockXSize').value = str(blockSize)
-                node0.node('BlockYSize').value = str(blockSize)
-
-            if WorkingDataType is not None:
-                node0.node('WorkingDataType').value = WorkingDataType
-
-        """
-        # TODO: test thoroughly and implement later
-        if srcSRS is not None and dstSRS is not None:
-            rt = self.ReprojectTransformer.substitute(SourceSRS=None,
-                                                      TargetSRS=None)
-            print 'rt', rt
-            rtNode = Node.create(rt)
-            print 'rtNode.xml()', rtNode.xml()
-            giptNode = node0.node('GenImgProjTransformer')
-            print 'giptNode', giptNode
-            giptNode += rtNode
-            print 'node0.xml()', node0.xml()
-        """
-        # overwrite XML of the warped VRT file with uprated size
-        # and geotranform
-        warpedVRT.write_xml(node0.rawxml())
-
-        # apply thin-spline-transformation option
-        if use_gcps and self.tps:
-            tmpVRTXML = warpedVRT.read_xml()
-            tmpVRTXML = tmpVRTXML.replace('GCPTransformer', 'TPSTransformer')
-            warpedVRT.write_xml(tmpVRTXML)
+        # Copy self to warpedVRT
+        warpedVRT.vrt = self._shared_copy()
+
+        # Modify rasterXsize, rasterYsize and geotranforms, apply
+        # thin-spline-transformation option and replace the reference from
+        # srcVRT to self in the warped VRT (XML is written only once)
+        with warpedVRT.xml_transaction() as node0:
+            if xSize > 0:
+                node0.replaceAttribute('rasterXSize', str(xSize))
+            if ySize > 0:
+                node0.replaceAttribute('rasterYSize', str(ySize))
+
+            if geoTransform is not None:
+                invGeotransform = gdal.InvGeoTransform(geoTransform)
+                # convert proper string style and set to the GeoTransform
+                # element
+                geoTransformStr = str(geoTransform).strip('()')
+                node0.node('GeoTransform').value = geoTransformStr
+                node0.node('DstGeoTransform').value = geoTransformStr
+                node0.node('DstInvGeoTransform').value = (
+                    str(invGeotransform[1]).strip('()'))
+
+                if node0.node('SrcGeoLocTransformer'):
+                    node0.node('BlockXSize').value = str(xSize)
+                    node0.node('BlockYSize').value = str(ySize)
+
+                if blockSize is not None:
+                    node0.node('BlockXSize').value = str(blockSize)
+                    node0.node('BlockYSize').value = str(blockSize)
+
+                if WorkingDataType is not None:
+                    node0.node('WorkingDataType').value = WorkingDataType
+
+            if nThreads is not None:
+                warpOptions = node0.node('GDALWarpOptions')
+                warpOptions += Node('Option', str(nThreads),
+                                    name='NUM_THREADS')
+
+            """
+            # TODO: test thoroughly and implement later
+            if srcSRS is not None and dstSRS is not None:
+                rt = self.ReprojectTransformer.substitute(SourceSRS=None,
+                                                          TargetSRS=None)
+                print 'rt', rt
+                rtNode = Node.create(rt)
+                print 'rtNode.xml()', rtNode.xml()
+                giptNode = node0.node('GenImgProjTransformer')
+                print 'giptNode', giptNode
+                giptNode += rtNode
+                print 'node0.xml()', node0.xml()
+            """
+            # apply thin-spline-transformation option
+            if use_gcps and self.tps:
+                transformerNode = node0.node('GCPTransformer')
+                while transformerNode:
+                    transformerNode.tag = 'TPSTransformer'
+                    transformerNode = node0.node('GCPTransformer')
+
+            # replace the reference from srcVRT to self
+            self.logger.debug('replace the reference from srcVRT to self')
+            rawFileName = str(os.path.basename(warpedVRT.vrt.fileName))
+            node1 = node0.node('GDALWarpOptions')
+            node1.node('SourceDataset').value = '/vsimem/' + rawFileName
 
         """
         # TODO: implement the below option for proper handling stereo
@@ -1189,18 +1678,6 @@ class VRT(object):
             warpedVRT.add_geolocationArray(dstGeolocationArray)
             warpedVRT.dataset.SetProjection('')
 
-        # Copy self to warpedVRT
-        warpedVRT.vrt = self.copy()
-
-        # replace the reference from srcVRT to self
-        self.logger.debug('replace the reference from srcVRT to self')
-        rawFileName = str(os.path.basename(warpedVRT.vrt.fileName))
-        warpedXML = str(warpedVRT.read_xml())
-        node0 = Node.create(warpedXML)
-        node1 = node0.node('GDALWarpOptions')
-        node1.node('SourceDataset').value = '/vsimem/' + rawFileName
-        warpedVRT.write_xml(node0.rawxml())
-
         return warpedVRT
 
     def _create_fake_gcps(self, gcps, skip_gcps):
@@ -1232,20 +1709,20 @@ class VRT(object):
                                           ['SRC_SRS=' + self.get_projection(),
                                            'DST_SRS=' + NSR().wkt])
 
-        # create 'fake' GCPs
-        fakeGCPs = []
-        for g in gcps[::skip_gcps]:
-            # transform DST lat/lon to SRC pixel/line
-            succ, point = srcTransformer.TransformPoint(1, g.GCPX, g.GCPY)
-            srcPixel = point[0]
-            srcLine = point[1]
+        # transform DST lat/lon to SRC pixel/line (all GCPs at once)
+        dstGCPs = gcptools.from_gdal(gcps[::skip_gcps])
+        points, succ = srcTransformer.TransformPoints(
+            1, np.column_stack([dstGCPs['x'], dstGCPs['y']]).tolist())
+        points = np.array(points).reshape(-1, 3)
 
-            # swap coordinates in GCPs:
-            # pix1/line1 -> lat/lon  =>=>  pix2/line2 -> pix1/line1
-            fakeGCPs.append(gdal.GCP(g.GCPPixel, g.GCPLine,
-                                     0, srcPixel, srcLine))
+        # create 'fake' GCPs. swap coordinates in GCPs:
+        # pix1/line1 -> lat/lon  =>=>  pix2/line2 -> pix1/line1
+        fakeGCPs = gcptools.create(points[:, 0], points[:, 1],
+                                   dstGCPs['pixel'], dstGCPs['line'],
+                                   ids=[''] * dstGCPs.size)
 
-        return {'gcps': fakeGCPs, 'srs': NSR('+proj=stere').wkt}
+        return {'gcps': gcptools.to_gdal(fakeGCPs),
+                'srs': NSR('+proj=stere').wkt}
 
     def _latlon2gcps(self, lat, lon, numOfGCPs=100):
         ''' Create list of GCPs from given grids of latitude and longitude
@@ -1275,22 +1752,12 @@ class VRT(object):
         self.logger.debug('gcpCount: %d %d %f %d %d',
                           lat.shape[0], lat.shape[1], gcpSize, step0, step1)
 
-        # generate list of GCPs
-        gcps = []
-        k = 0
-        for i0 in range(0, lat.shape[0], step0):
-            for i1 in range(0, lat.shape[1], step1):
-                # create GCP with X,Y,pixel,line from lat/lon matrices
-                gcp = gdal.GCP(float(lon[i0, i1]),
-                               float(lat[i0, i1]),
-                               0, i1, i0)
-                self.logger.debug('%d %d %d %f %f',
-                                  k, gcp.GCPPixel, gcp.GCPLine,
-                                  gcp.GCPX, gcp.GCPY)
-                gcps.append(gcp)
-                k += 1
-
-        return gcps
+        # generate GCPs with X,Y,pixel,line from lat/lon matrices
+        gcps = gcptools.from_grids(lon, lat,
+                                   range(0, lat.shape[0], step0),
+                                   range(0, lat.shape[1], step1))
+
+        return gcptools.to_gdal(gcps)
 
     def convert_GeolocationArray2GPCs(self, stepX=1, stepY=1):
         ''' Converting geolocation arrays to GCPs, and deleting the former
@@ -1324,21 +1791,21 @@ class VRT(object):
         PIXEL_STEP = int(geolocArray['PIXEL_STEP'])
         LINE_OFFSET = int(geolocArray['LINE_OFFSET'])
         LINE_STEP = int(geolocArray['LINE_STEP'])
-        pixels = np.linspace(PIXEL_OFFSET, PIXEL_OFFSET + (numx - 1) *
-                             PIXEL_STEP, numx)
-        lines = np.linspace(LINE_OFFSET, LINE_OFFSET + (numy - 1) *
-                            LINE_STEP, numy)
         # Make GCPs
-        GCPs = []
         # Subsample (if requested), but use linspace to
         # make sure endpoints are ntained
-        for p in np.around(np.linspace(0, len(pixels) - 1, numx / stepX)):
-            for l in np.around(np.linspace(0, len(lines) - 1, numy / stepY)):
-                g = gdal.GCP(float(x[l, p]), float(y[l, p]), 0,
-                             pixels[p], lines[l])
-                GCPs.append(g)
+        cols = np.around(np.linspace(0, numx - 1, numx / stepX)).astype(int)
+        rows = np.around(np.linspace(0, numy - 1, numy / stepY)).astype(int)
+        # GCPs are ordered column by column
+        cols, rows = np.meshgrid(cols, rows, indexing='ij')
+        GCPs = gcptools.create(PIXEL_OFFSET + cols * PIXEL_STEP,
+                               LINE_OFFSET + rows * LINE_STEP,
+                               x[rows, cols], y[rows, cols],
+                               ids=[''] * cols.size)
         # Insert GCPs
-        self.dataset.SetGCPs(GCPs, geolocArray['SRS'])
+        self._unshare()
+        self.dataset.SetGCPs(gcptools.to_gdal(GCPs), geolocArray['SRS'])
+        self._transformer = None
         # Delete geolocation array
         self.add_geolocationArray()
 
@@ -1372,9 +1839,8 @@ class VRT(object):
             band number
 
         '''
-        node0 = Node.create(self.read_xml())
-        node0.delNode('VRTRasterBand', options={'band': bandNum})
-        self.write_xml(node0.rawxml())
+        with self.xml_transaction() as node0:
+            node0.delNode('VRTRasterBand', options={'band': bandNum})
 
     def delete_bands(self, bandNums):
         ''' Delete bands
@@ -1387,8 +1853,10 @@ class VRT(object):
         '''
         bandNums.sort()
         bandNums.reverse()
-        for iBand in bandNums:
-            self.delete_band(iBand)
+        # XML is parsed and written only once for all bands
+        with self.xml_transaction():
+            for iBand in bandNums:
+                self.delete_band(iBand)
 
     def set_subsetMask(self, maskDs, xOff, yOff, dstXSize, dstYSize):
         ''' Add maskband and modify xml to proper size
@@ -1404,6 +1872,7 @@ class VRT(object):
 
         '''
         # create empty maskband
+        self._unshare()
         self.dataset.CreateMaskBand(gdal.GMF_PER_DATASET)
         self.dataset = self.vrtDriver.CreateCopy(self.fileName, self.dataset)
 
@@ -1411,45 +1880,41 @@ class VRT(object):
         srcXSize = self.dataset.RasterXSize
         srcYSize = self.dataset.RasterYSize
 
-        # read xml and create the node
-        XML = self.read_xml()
-        node0 = Node.create(XML)
-
-        # replace the rastersize to the masked raster size
-        node0.replaceAttribute('rasterXSize', str(dstXSize))
-        node0.replaceAttribute('rasterYSize', str(dstYSize))
-
-        # replace source band data to masked band data
-        for iNode in node0.nodeList('VRTRasterBand'):
-            node1 = iNode.node('ComplexSource').node('SrcRect')
-            node1.replaceAttribute('xOff', str(xOff))
-            node1.replaceAttribute('yOff', str(yOff))
-            node1.replaceAttribute('xSize', str(dstXSize))
-            node1.replaceAttribute('ySize', str(dstYSize))
-            node1 = iNode.node('ComplexSource').node('DstRect')
-            node1.replaceAttribute('xSize', str(dstXSize))
-            node1.replaceAttribute('ySize', str(dstYSize))
-
-        # create contents for mask band
-        contents = self.ComplexSource.substitute(
-            SourceType='SimpleSource',
-            Dataset=maskDs.GetDescription(),
-            SourceBand='mask,1',
-            NODATA='',
-            ScaleOffset='',
-            ScaleRatio='',
-            LUT='',
-            srcXSize=srcXSize,
-            srcYSize=srcYSize,
-            dstXSize=dstXSize,
-            dstYSize=dstYSize)
-
-        # add mask band contents to xml
-        node1 = node0.node('MaskBand').node('VRTRasterBand').insert(contents)
-        node0.replaceNode('VRTRasterBand', 0, node1)
-
-        # write contents
-        self.write_xml(node0.rawxml())
+        # read xml, modify the node and write xml
+        with self.xml_transaction() as node0:
+            # replace the rastersize to the masked raster size
+            node0.replaceAttribute('rasterXSize', str(dstXSize))
+            node0.replaceAttribute('rasterYSize', str(dstYSize))
+
+            # replace source band data to masked band data
+            for iNode in node0.nodeList('VRTRasterBand'):
+                node1 = iNode.node('ComplexSource').node('SrcRect')
+                node1.replaceAttribute('xOff', str(xOff))
+                node1.replaceAttribute('yOff', str(yOff))
+                node1.replaceAttribute('xSize', str(dstXSize))
+                node1.replaceAttribute('ySize', str(dstYSize))
+                node1 = iNode.node('ComplexSource').node('DstRect')
+                node1.replaceAttribute('xSize', str(dstXSize))
+                node1.replaceAttribute('ySize', str(dstYSize))
+
+            # create contents for mask band
+            contents = self.ComplexSource.substitute(
+                SourceType='SimpleSource',
+                Dataset=maskDs.GetDescription(),
+                SourceBand='mask,1',
+                NODATA='',
+                ScaleOffset='',
+                ScaleRatio='',
+                LUT='',
+                srcXSize=srcXSize,
+                srcYSize=srcYSize,
+                dstXSize=dstXSize,
+                dstYSize=dstYSize)
+
+            # add mask band contents to xml
+            node1 = (node0.node('MaskBand').node('VRTRasterBand').
+                     insert(contents))
+            node0.replaceNode('VRTRasterBand', 0, node1)
 
     def get_shifted_vrt(self, shiftDegree):
         ''' Roll data in bands westwards or eastwards
@@ -1471,7 +1936,7 @@ class VRT(object):
         '''
         # Copy self into self.vrt
         shiftVRT = VRT(gdalDataset=self.dataset)
-        shiftVRT.vrt = self.copy()
+        shiftVRT.vrt = self._shared_copy()
 
         if shiftDegree < 0:
             shiftDegree += 360.0
@@ -1493,40 +1958,35 @@ class VRT(object):
             dst = shiftVRT.vrt.dataset.GetRasterBand(iBand+1).GetMetadata()
             shiftVRT._create_band(src, dst)
 
-        # read xml and create the node
-        XML = shiftVRT.read_xml()
-        node0 = Node.create(XML)
-
         # divide into two bands and switch the bands
-        for i in range(len(node0.nodeList('VRTRasterBand'))):
-            # create i-th 'VRTRasterBand' node
-            node1 = node0.node('VRTRasterBand', i)
-            node1Band = node1.getAttribute('band')
-            # modify the 1st band
-            shiftStr = str(shiftPixel)
-            sizeStr = str(shiftVRT.vrt.dataset.RasterXSize - shiftPixel)
-            (node1.node('ComplexSource').node('DstRect').
-                replaceAttribute('xOff', shiftStr))
-            (node1.node('ComplexSource').node('DstRect').
-                replaceAttribute('xSize', sizeStr))
-            (node1.node('ComplexSource').node('SrcRect').
-                replaceAttribute('xSize', sizeStr))
-
-            # add the 2nd band
-            xmlSource = node1.rawxml()
-            cloneNode = Node.create(xmlSource).node('ComplexSource')
-            #cloneNode = node1.node('ComplexSource')
-            cloneNode.node('SrcRect').replaceAttribute('xOff', sizeStr)
-            cloneNode.node('DstRect').replaceAttribute('xOff', str(0))
-            cloneNode.node('SrcRect').replaceAttribute('xSize', shiftStr)
-            cloneNode.node('DstRect').replaceAttribute('xSize', shiftStr)
-
-            # get VRTRasterBand with inserted ComplexSource
-            node1 = node1.insert(cloneNode.rawxml())
-            node0.replaceNode('VRTRasterBand', i, node1)
-
-        # write down XML contents
-        shiftVRT.write_xml(node0.rawxml())
+        # (XML is written when the transaction is closed)
+        with shiftVRT.xml_transaction() as node0:
+            for i in range(len(node0.nodeList('VRTRasterBand'))):
+                # create i-th 'VRTRasterBand' node
+                node1 = node0.node('VRTRasterBand', i)
+                node1Band = node1.getAttribute('band')
+                # modify the 1st band
+                shiftStr = str(shiftPixel)
+                sizeStr = str(shiftVRT.vrt.dataset.RasterXSize - shiftPixel)
+                (node1.node('ComplexSource').node('DstRect').
+                    replaceAttribute('xOff', shiftStr))
+                (node1.node('ComplexSource').node('DstRect').
+                    replaceAttribute('xSize', sizeStr))
+                (node1.node('ComplexSource').node('SrcRect').
+                    replaceAttribute('xSize', sizeStr))
+
+                # add the 2nd band
+                xmlSource = node1.rawxml()
+                cloneNode = Node.create(xmlSource).node('ComplexSource')
+                #cloneNode = node1.node('ComplexSource')
+                cloneNode.node('SrcRect').replaceAttribute('xOff', sizeStr)
+                cloneNode.node('DstRect').replaceAttribute('xOff', str(0))
+                cloneNode.node('SrcRect').replaceAttribute('xSize', shiftStr)
+                cloneNode.node('DstRect').replaceAttribute('xSize', shiftStr)
+
+                # get VRTRasterBand with inserted ComplexSource
+                node1 = node1.insert(cloneNode.rawxml())
+                node0.replaceNode('VRTRasterBand', i, node1)
 
         return shiftVRT
 
@@ -1567,6 +2027,96 @@ class VRT(object):
         # return restored sub-VRT
         return self.vrt.get_sub_vrt(steps)
 
+    def free_sub_vrts(self, depth):
+        '''Remove sub-VRTs deeper than <depth> if not needed for reading
+
+        The sub-VRT at <depth> is replaced by its flattened version (see
+        flatten()), which refers to the shallowest deeper sub-VRT that is
+        still needed for reading data (if any). The sub-VRTs in between
+        (and their VSI files) are freed. The needed sub-VRT keeps only its
+        own sub-VRT (e.g. a warped VRT keeps its source) and the deeper
+        ones are freed in the same way. The sub-VRTs above <depth> get new
+        VRT files with updated references (GDAL may keep the old files
+        open), self is updated in place.
+
+        Parameters
+        -----------
+        depth : int
+            number of sub-VRTs to keep (e.g. 0 - keep only self)
+
+        Returns
+        -------
+        nFreed : int
+            number of removed sub-VRTs
+
+        '''
+        chain = [self]
+        while chain[-1].vrt is not None:
+            chain.append(chain[-1].vrt)
+        if len(chain) <= depth + 1:
+            return 0
+
+        # find the shallowest sub-VRT referenced by flattened VRT
+        flatVRT = chain[depth].flatten()
+        flatXML = flatVRT.read_xml()
+        deeperVRTs = chain[depth + 1:]
+        nFreed = len(deeperVRTs)
+        for i, vrt in enumerate(deeperVRTs):
+            if vrt.fileName in flatXML:
+                nFreed = i
+                break
+        subVRT = None
+        newSubVRT = None
+        if nFreed < len(deeperVRTs):
+            # sub-VRTs of the needed sub-VRT (e.g. of a warped VRT, which
+            # is not flattened, but its source is) are freed in a copy of
+            # it with a new file
+            subVRT = deeperVRTs[nFreed]
+            newSubVRT = subVRT._shared_copy()
+            nFreedSub = newSubVRT.free_sub_vrts(1)
+            if nFreedSub == 0:
+                newSubVRT = subVRT
+            nFreed += nFreedSub
+        if nFreed == 0:
+            return 0
+
+        # replace VRT at <depth> and update references above it
+        if depth == 0:
+            if subVRT is not None:
+                flatXML = flatXML.replace(subVRT.fileName,
+                                          newSubVRT.fileName)
+            if flatVRT is not self or newSubVRT is not subVRT:
+                self.write_xml(flatXML)
+            self.vrt = newSubVRT
+            return nFreed
+        if flatVRT is chain[depth]:
+            flatVRT = flatVRT._shared_copy()
+        flatVRT.vrt = subVRT
+        if newSubVRT is not subVRT:
+            flatVRT = flatVRT._relink(newSubVRT)
+        for vrt in reversed(chain[1:depth]):
+            flatVRT = vrt._relink(flatVRT)
+        self.write_xml(self.read_xml().replace(self.vrt.fileName,
+                                               flatVRT.fileName))
+        self.vrt = flatVRT
+
+        return nFreed
+
+    def _relink(self, subVRT):
+        '''Create copy of self in a new VRT file which refers to <subVRT>
+
+        References to self.vrt in the XML are replaced with references to
+        <subVRT>.
+
+        '''
+        vrt = self._shared_copy()
+        vrt.fileName = self._make_filename()
+        vrt.vrt = subVRT
+        vrt.write_xml(self.read_xml().replace(self.vrt.fileName,
+                                              subVRT.fileName))
+        vrt.dataset.SetMetadataItem('fileName', vrt.fileName)
+        return vrt
+
     def __repr__(self):
         strOut = os.path.split(self.fileName)[1]
         if self.vrt is not None:
@@ -1582,7 +2132,7 @@ class VRT(object):
 
         # create new self
         superVRT = VRT(gdalDataset=self.dataset)
-        superVRT.vrt = self.copy()
+        superVRT.vrt = self._shared_copy()
         superVRT.tps = self.tps
 
         # Add bands to newSelf
@@ -1598,46 +2148,495 @@ class VRT(object):
 
         return superVRT
 
+    def get_materialized_vrt(self, tileSize=1024, nProcesses=1):
+        '''Create VRT with bands of self read into arrays
+
+        Data is read tile by tile, optionally by several worker processes
+        (e.g. to run warping of a warped VRT in parallel). Each band is
+        kept in an array (see create_dataset_from_array()). The new VRT
+        has the georeference and metadata of self and keeps self as sub-VRT.
+
+        Parameters
+        -----------
+        tileSize : int
+            width and height of the tiles (pixels)
+        nProcesses : int
+            number of worker processes. Worker processes are forked and
+            inherit the VSI files, therefore they are used only if os.fork
+            is available
+
+        Returns
+        --------
+        vrt : VRT
+
+        '''
+        xSize = self.dataset.RasterXSize
+        ySize = self.dataset.RasterYSize
+        windows = [(xOff, yOff,
+                    min(tileSize, xSize - xOff), min(tileSize, ySize - yOff))
+                   for yOff in range(0, ySize, tileSize)
+                   for xOff in range(0, xSize, tileSize)]
+
+        arrays = [None] * self.dataset.RasterCount
+
+        def put_tile(window, data):
+            xOff, yOff, tileXSize, tileYSize = window
+            for iBand, tile in enumerate(data):
+                if arrays[iBand] is None:
+                    arrays[iBand] = np.empty((ySize, xSize), tile.dtype)
+                arrays[iBand][yOff:yOff + tileYSize,
+                              xOff:xOff + tileXSize] = tile
+
+        if nProcesses > 1 and hasattr(os, 'fork') and len(windows) > 1:
+            # write content of the dataset into the VRT file for workers
+            self.dataset.FlushCache()
+            pool = multiprocessing.Pool(nProcesses)
+            try:
+                for window, data in pool.imap_unordered(
+                        _read_window, [(self.fileName, window)
+                                       for window in windows]):
+                    put_tile(window, data)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for window in windows:
+                put_tile(window, [
+                    self.dataset.GetRasterBand(iBand + 1).ReadAsArray(*window)
+                    for iBand in range(self.dataset.RasterCount)])
+
+        return self.get_array_vrt(arrays, copyArrays=False)
+
+    def get_array_vrt(self, arrays, gdalDataset=None, copyArrays=True):
+        '''Create VRT with bands from arrays and band metadata of self
+
+        Parameters
+        -----------
+        arrays : list of 2D numpy arrays
+            data for each band of self (e.g. resampled)
+        gdalDataset : GDAL Dataset
+            source of georeference and size (self.dataset by default)
+        copyArrays : bool
+            copy the arrays (see create_dataset_from_array())? False only
+            for arrays which are not used anywhere else
+
+        Returns
+        --------
+        vrt : VRT
+            VRT with global metadata of self and self as sub-VRT
+
+        '''
+        if gdalDataset is None:
+            gdalDataset = self.dataset
+        vrt = VRT(gdalDataset=gdalDataset,
+                  srcMetadata=self.dataset.GetMetadata())
+        vrt.tps = self.tps
+        for iBand, array in enumerate(arrays):
+            bandVRT = VRT(array=array, copyArray=copyArrays)
+            dst = self.dataset.GetRasterBand(iBand + 1).GetMetadata()
+            dst.pop('PixelFunctionType', None)
+            bandName = vrt._create_band({'SourceFilename': bandVRT.fileName,
+                                         'SourceBand': 1}, dst)
+            vrt.bandVRTs[bandName] = bandVRT
+        vrt.dataset.FlushCache()
+        vrt.vrt = self
+
+        return vrt
+
+    def get_virtual_vrt(self, function, value=0, dtype=None,
+                        tiePointStep=16):
+        '''Create VRT with one band computed for the size of self
+
+        The band takes (almost) no storage and the values are computed only
+        for the blocks which are read. Constant and pixel/line index bands
+        are read from a tiny source (one value, row or column) stretched to
+        the full size. Longitude and latitude are computed (see
+        transform_arrays()) on a grid of tie-points and interpolated
+        bilinearly by a warped VRT.
+
+        Parameters
+        -----------
+        function : str
+            'constant' : all pixels are equal to <value>
+            'pixel' : column index of each pixel
+            'line' : row index of each pixel
+            'longitude', 'latitude' : coordinates of each pixel. Longitudes
+            crossing the dateline are in range 0 - 360
+        value : int or float
+            value of the constant band
+        dtype : str or numpy dtype
+            data type of the band (float32 or int32 for index bands by
+            default)
+        tiePointStep : int
+            distance between tie-points for longitude and latitude (pixels)
+
+        Returns
+        --------
+        vrt : VRT
+            VRT with one band of the same size as self
+
+        '''
+        xSize = self.dataset.RasterXSize
+        ySize = self.dataset.RasterYSize
+        if dtype is None:
+            dtype = {'pixel': 'int32', 'line': 'int32'}.get(function,
+                                                             'float32')
+
+        if function in ['longitude', 'latitude']:
+            # tie-points cover the full grid with the same step
+            cols, rows = np.meshgrid(
+                np.arange(np.ceil((xSize - 1.) / tiePointStep) + 1),
+                np.arange(np.ceil((ySize - 1.) / tiePointStep) + 1))
+            lon, lat = self.transform_arrays(cols * tiePointStep,
+                                             rows * tiePointStep)
+            if function == 'latitude':
+                tieGrid = lat
+            elif lon.max() - lon.min() > 180:
+                tieGrid = lon % 360
+            else:
+                tieGrid = lon
+            # center of tie-point (i, j) is at pixel/line
+            # (i * tiePointStep, j * tiePointStep) of the warped VRT
+            offset = 0.5 - tiePointStep / 2.
+            tieVRT = VRT(array=tieGrid.astype(dtype),
+                         srcGeoTransform=(offset, tiePointStep, 0,
+                                          -offset, 0, -tiePointStep))
+            return tieVRT.get_warped_vrt(xSize=xSize, ySize=ySize,
+                                         geoTransform=(0, 1, 0, 0, 0, -1),
+                                         eResampleAlg=1,
+                                         use_geolocationArray=False,
+                                         use_gcps=False)
+
+        if function == 'constant':
+            array = np.array([[value]], dtype)
+        elif function == 'pixel':
+            array = np.arange(xSize, dtype=dtype)[None]
+        elif function == 'line':
+            array = np.arange(ySize, dtype=dtype)[:, None]
+        else:
+            raise OptionError('Unknown function of virtual band: %s'
+                              % function)
+
+        # stretch the source to the full size
+        srcVRT = VRT(array=array)
+        vrt = VRT(srcRasterXSize=xSize, srcRasterYSize=ySize)
+        vrt._create_band({'SourceFilename': srcVRT.fileName,
+                          'SourceBand': 1}, {'name': function})
+        with vrt.xml_transaction() as node0:
+            dstRect = node0.node('DstRect')
+            dstRect.replaceAttribute('xSize', str(xSize))
+            dstRect.replaceAttribute('ySize', str(ySize))
+        vrt.vrt = srcVRT
+
+        return vrt
+
+    def get_append_vrt(self):
+        '''Get VRT to which a batch of bands can be appended
+
+        Bands are appended to self in place if self was created by this
+        method and is not shared with copies. Otherwise a super VRT is
+        created (see get_super_vrt()). Each batch appended in place is
+        recorded in self.bandBatches and can be removed with
+        remove_band_batch().
+
+        Returns
+        --------
+        vrt : self or new super VRT
+
+        '''
+        if self.bandsAppendable and len(self._file.users) < 2:
+            self.bandBatches = self.bandBatches + (self.dataset.RasterCount, )
+            return self
+
+        superVRT = self.get_super_vrt()
+        superVRT.bandsAppendable = True
+        return superVRT
+
+    def remove_band_batch(self):
+        '''Create copy of self without the last batch of appended bands
+
+        Returns
+        --------
+        vrt : VRT
+            copy of self with bands and self.bandBatches as before the last
+            call of get_append_vrt() (or self if no bands were appended)
+
+        '''
+        if len(self.bandBatches) == 0:
+            return self
+
+        vrt = self._shared_copy()
+        vrt.bandVRTs = dict(vrt.bandVRTs)
+        vrt.bandBatches = vrt.bandBatches[:-1]
+        bandNums = range(self.bandBatches[-1] + 1,
+                         self.dataset.RasterCount + 1)
+        for iBand in bandNums:
+            bandName = vrt.dataset.GetRasterBand(iBand).GetMetadataItem('name')
+            vrt.bandVRTs.pop(bandName, None)
+        vrt.delete_bands(bandNums)
+
+        return vrt
+
+    def flatten(self):
+        '''Create VRT which reads data directly from the deepest sub-VRTs
+
+        Sources of the bands which reference bands of sub-VRTs (self.vrt,
+        self.bandVRTs and their sub-VRTs) are replaced by the sources of
+        the referenced bands: SrcRect/DstRect, ScaleRatio/ScaleOffset and
+        band numbers are composed, so that GDAL does not read each block
+        through every level of the chain. No data is read. A source is
+        composed only if the result is the same: the referenced band has
+        only one simple, complex or averaged source, no NoDataValue and a
+        data type which keeps the source values; NODATA and LUT are not
+        used and at most one of the two sources is resampled. Warped VRTs,
+        pixel function bands and sources with data of arrays (MEM datasets,
+        see create_dataset_from_array()) are not composed (but sources of
+        pixel function bands are).
+
+        The returned VRT keeps references to self.vrt and self.bandVRTs.
+        It should be used only for reading and it is not updated if the
+        sub-VRTs are changed.
+
+        Returns
+        --------
+        flatVRT : VRT
+            new VRT or self, if nothing can be flattened
+
+        '''
+        # VRTs in the chain by file name
+        vrts = {}
+        stack = [self]
+        while stack:
+            vrt = stack.pop()
+            if not isinstance(vrt, VRT) or vrt.fileName in vrts:
+                continue
+            vrts[vrt.fileName] = vrt
+            stack.append(vrt.vrt)
+            stack += vrt.bandVRTs.values()
+
+        # bands of sub-VRTs (parsed on demand)
+        bands = {}
+        node0 = Node.create(self.read_xml())
+        if node0.attributes.get('subClass') == 'VRTWarpedDataset':
+            return self
+
+        composed = False
+        for bandNode in node0.nodeList('VRTRasterBand'):
+            for srcNode in bandNode.children:
+                if srcNode.tag not in self._flatSourceTypes:
+                    continue
+                for i in range(len(vrts)):
+                    if not self._compose_source(srcNode, vrts, bands):
+                        break
+                    composed = True
+
+        if not composed:
+            return self
+
+        flatVRT = VRT(gdalDataset=self.dataset)
+        flatVRT.write_xml(node0.rawxml())
+        # keep the referenced files
+        flatVRT.vrt = self.vrt
+        flatVRT.bandVRTs = self.bandVRTs
+        flatVRT.tps = self.tps
+
+        return flatVRT
+
+    def _compose_source(self, srcNode, vrts, bands):
+        '''Replace source with the source of the referenced band of sub-VRT
+
+        Parameters
+        -----------
+        srcNode : Node
+            source of a band (modified in place)
+        vrts : dict
+            VRT objects by file names
+        bands : dict
+            (file name, band number) => Node of the band in the sub-VRT,
+            (file name, None) => root Node of the sub-VRT.
+            Filled when a sub-VRT is parsed.
+
+        Returns
+        --------
+        status : bool
+            True if the source was replaced
+
+        '''
+        if not self._is_flat_source(srcNode):
+            return False
+        fileNode = srcNode.node('SourceFilename')
+        fileName = fileNode.value
+        if (fileName not in vrts or
+                fileNode.attributes.get('relativeToVRT', '0') != '0'):
+            return False
+        try:
+            bandNum = int(srcNode['SourceBand'])
+        except (KeyError, ValueError):
+            return False
+
+        if (fileName, None) not in bands:
+            subNode0 = Node.create(vrts[fileName].read_xml())
+            bands[(fileName, None)] = subNode0
+            if subNode0.attributes.get('subClass') is None:
+                for subBandNode in subNode0.nodeList('VRTRasterBand'):
+                    bands[(fileName, int(subBandNode.getAttribute('band')))
+                          ] = subBandNode
+        bandNode = bands.get((fileName, bandNum))
+
+        # the referenced band should have one composable source
+        if bandNode is None or 'subClass' in bandNode.attributes:
+            return False
+        subSrcNodes = []
+        for child in bandNode.children:
+            if child.tag in self._flatSourceTypes:
+                subSrcNodes.append(child)
+            elif child.tag not in self._flatBandTags:
+                return False
+        if len(subSrcNodes) != 1 or not self._is_flat_source(subSrcNodes[0]):
+            return False
+        subSrcNode = subSrcNodes[0]
+        subFileNode = subSrcNode.node('SourceFilename')
+        if subFileNode.attributes.get('relativeToVRT', '0') != '0':
+            return False
+        # data pointer is valid only while the VRT with the array exists
+        if subFileNode.value.startswith('MEM:::'):
+            return False
+
+        # SrcRect should be inside DstRect of the referenced source
+        srcRect = self._get_rect(srcNode.node('SrcRect'))
+        dstRect = self._get_rect(srcNode.node('DstRect'))
+        subSrcRect = self._get_rect(subSrcNode.node('SrcRect'))
+        subDstRect = self._get_rect(subSrcNode.node('DstRect'))
+        if (min(dstRect[2:] + subSrcRect[2:] + subDstRect[2:]) <= 0 or
+                srcRect[0] < subDstRect[0] or srcRect[1] < subDstRect[1] or
+                srcRect[0] + srcRect[2] > subDstRect[0] + subDstRect[2] or
+                srcRect[1] + srcRect[3] > subDstRect[1] + subDstRect[3]):
+            return False
+
+        # only one of the sources can resample
+        subUnit = (subSrcRect[2] == subDstRect[2] and
+                   subSrcRect[3] == subDstRect[3])
+        unit = srcRect[2] == dstRect[2] and srcRect[3] == dstRect[3]
+        if subUnit:
+            sourceType = srcNode.tag
+        elif unit:
+            sourceType = subSrcNode.tag
+        else:
+            return False
+
+        # compose scaling
+        ratio, offset = self._get_scaling(srcNode)
+        subRatio, subOffset = self._get_scaling(subSrcNode)
+        scaled = (ratio, offset) != (1, 0)
+        subScaled = (subRatio, subOffset) != (1, 0)
+        ratio, offset = ratio * subRatio, subOffset * ratio + offset
+        if (ratio, offset) != (1, 0):
+            if sourceType == 'AveragedSource':
+                return False
+            if sourceType == 'SimpleSource':
+                sourceType = 'ComplexSource'
+
+        # the referenced band should keep values of its source
+        bandType = bandNode.attributes.get('dataType', 'Byte')
+        if subScaled:
+            if bandType not in ['Float32', 'Float64']:
+                return False
+        else:
+            try:
+                subDataset = gdal.Open(str(subFileNode.value))
+                subBandType = gdal.GetDataTypeName(subDataset.GetRasterBand(
+                                    int(subSrcNode['SourceBand'])).DataType)
+            except (AttributeError, KeyError, ValueError, RuntimeError):
+                return False
+            if (subBandType != bandType and
+                    subBandType not in self._flatHeldTypes.get(bandType, [])):
+                return False
+
+        # replace the source
+        xStep = subSrcRect[2] / subDstRect[2]
+        yStep = subSrcRect[3] / subDstRect[3]
+        newSrcRect = [subSrcRect[0] + (srcRect[0] - subDstRect[0]) * xStep,
+                      subSrcRect[1] + (srcRect[1] - subDstRect[1]) * yStep,
+                      srcRect[2] * xStep,
+                      srcRect[3] * yStep]
+        srcNode.tag = sourceType
+        fileNode.value = subFileNode.value
+        srcNode['SourceBand'] = subSrcNode['SourceBand']
+        for key, val in zip(['xOff', 'yOff', 'xSize', 'ySize'], newSrcRect):
+            srcNode.node('SrcRect').setAttribute(key, '%.15g' % val)
+        srcNode.delNode('SourceProperties')
+        if subSrcNode.node('SourceProperties'):
+            srcNode += subSrcNode.node('SourceProperties').copy()
+        srcNode.delNode('ScaleOffset')
+        srcNode.delNode('ScaleRatio')
+        if sourceType == 'ComplexSource' and (scaled or subScaled):
+            srcNode += Node('ScaleOffset', repr(offset))
+            srcNode += Node('ScaleRatio', repr(ratio))
+
+        return True
+
+    def _is_flat_source(self, srcNode):
+        ''' Check if source can be composed with another source '''
+        for child in srcNode.children:
+            if (child.tag not in self._flatSourceTags or
+                    (child.tag in ['NODATA', 'LUT'] and child.value)):
+                return False
+        return (bool(srcNode.node('SourceFilename')) and
+                bool(srcNode.node('SrcRect')) and
+                bool(srcNode.node('DstRect')))
+
+    def _get_scaling(self, srcNode):
+        ''' Get ScaleRatio and ScaleOffset of a source '''
+        scaling = []
+        for tag, default in [('ScaleRatio', 1.), ('ScaleOffset', 0.)]:
+            scaleNode = srcNode.node(tag)
+            if scaleNode and scaleNode.value:
+                scaling.append(float(scaleNode.value))
+            else:
+                scaling.append(default)
+        return scaling
+
+    def _get_rect(self, rectNode):
+        ''' Get xOff, yOff, xSize, ySize from SrcRect or DstRect '''
+        return [float(rectNode.getAttribute(key))
+                for key in ['xOff', 'yOff', 'xSize', 'ySize']]
+
     def get_subsampled_vrt(self, newRasterXSize, newRasterYSize,
                             factor, eResampleAlg):
         '''Create VRT and replace step in the source'''
 
         subsamVRT = self.get_super_vrt()
 
-        # Get XML content from VRT-file
-        vrtXML = subsamVRT.read_xml()
-        node0 = Node.create(vrtXML)
-
-        # replace rasterXSize in <VRTDataset>
-        node0.replaceAttribute('rasterXSize', str(newRasterXSize))
-        node0.replaceAttribute('rasterYSize', str(newRasterYSize))
-
-        rasterYSize = subsamVRT.vrt.dataset.RasterYSize
-        rasterXSize = subsamVRT.vrt.dataset.RasterXSize
-
-        # replace xSize in <DstRect> of each source
-        for iNode1 in node0.nodeList('VRTRasterBand'):
-            for sourceName in ['ComplexSource', 'SimpleSource']:
-                for iNode2 in iNode1.nodeList(sourceName):
-                    iNodeDstRect = iNode2.node('DstRect')
-                    iNodeDstRect.replaceAttribute('xSize',
-                                                  str(newRasterXSize))
-                    iNodeDstRect.replaceAttribute('ySize',
-                                                  str(newRasterYSize))
-            # if method=-1, overwrite 'ComplexSource' to 'AveragedSource'
-            if eResampleAlg == -1:
-                iNode1.replaceTag('ComplexSource', 'AveragedSource')
-                iNode1.replaceTag('SimpleSource', 'AveragedSource')
-                # if the values are complex number, give a warning
-                if iNode1.getAttribute('dataType').startswith('C'):
-                    warnings.warn(
-                        'Band %s : The imaginary parts of complex numbers ' \
-                        'are lost when resampling by averaging ' \
-                        '(eResampleAlg=-1)' %iNode1.getAttribute('band')
-                    )
-
-        # Write the modified elemements into VRT
-        subsamVRT.write_xml(node0.rawxml())
+        # Modify XML content of VRT-file
+        # (written when the transaction is closed)
+        with subsamVRT.xml_transaction() as node0:
+            # replace rasterXSize in <VRTDataset>
+            node0.replaceAttribute('rasterXSize', str(newRasterXSize))
+            node0.replaceAttribute('rasterYSize', str(newRasterYSize))
+
+            rasterYSize = subsamVRT.vrt.dataset.RasterYSize
+            rasterXSize = subsamVRT.vrt.dataset.RasterXSize
+
+            # replace xSize in <DstRect> of each source
+            for iNode1 in node0.nodeList('VRTRasterBand'):
+                for sourceName in ['ComplexSource', 'SimpleSource']:
+                    for iNode2 in iNode1.nodeList(sourceName):
+                        iNodeDstRect = iNode2.node('DstRect')
+                        iNodeDstRect.replaceAttribute('xSize',
+                                                      str(newRasterXSize))
+                        iNodeDstRect.replaceAttribute('ySize',
+                                                      str(newRasterYSize))
+                # if method=-1, overwrite 'ComplexSource' to 'AveragedSource'
+                if eResampleAlg == -1:
+                    iNode1.replaceTag('ComplexSource', 'AveragedSource')
+                    iNode1.replaceTag('SimpleSource', 'AveragedSource')
+                    # if the values are complex number, give a warning
+                    if iNode1.getAttribute('dataType').startswith('C'):
+                        warnings.warn(
+                            'Band %s : The imaginary parts of complex '
+                            'numbers are lost when resampling by averaging '
+                            '(eResampleAlg=-1)' % iNode1.getAttribute('band')
+                        )
 
         return subsamVRT
 
@@ -1664,36 +2663,97 @@ class VRT(object):
             X and Y coordinates in degree of lat/lon
 
         '''
-        # get source SRS (either Projection or GCPProjection)
-        srcWKT = self.get_projection()
+        if dstDs is None and options is None:
+            # use cached transformer
+            transformer = self.get_transformer()
+        else:
+            transformer = gdal.Transformer(self.dataset, dstDs,
+                                           self._transformer_options(options))
 
-        # prepare options
-        if options is None:
-            options = ['SRC_SRS=' + srcWKT, 'DST_SRS=' + NSR().wkt]
-            # add TPS method if we have GCPs and self.tps is True
-            if self.tps and len(self.dataset.GetGCPs()) > 0:
-                options.append('METHOD=GCP_TPS')
+        lonVector, latVector = self._transform_arrays(
+            transformer, np.asarray(colVector), np.asarray(rowVector),
+            DstToSrc)
+        if lonVector.size == 0:
+            lonVector, latVector = [], []
 
-        # create transformer
-        transformer = gdal.Transformer(self.dataset, dstDs, options)
+        return lonVector, latVector
 
-        # convert lists with X,Y coordinates to 2D numpy array
-        xy = np.array([colVector, rowVector]).transpose()
+    def transform_arrays(self, cols, rows, DstToSrc=0):
+        '''Transform arrays of pixel/line into lon/lat (or back)
 
-        # transfrom coordinates
-        #lonlat = transformer.TransformPoints(DstToSrc, xy)#[0]
-        #import pdb; pdb.set_trace()
-        lonlat = transformer.TransformPoints(DstToSrc, xy)[0]
+        Batched version of transform_points() which uses the cached
+        transformer (see get_transformer()).
 
-        # convert return to lon,lat vectors
-        lonlat = np.array(lonlat)
-        if lonlat.shape[0] > 0:
-            lonVector = lonlat[:, 0]
-            latVector = lonlat[:, 1]
-        else:
-            lonVector, latVector = [], []
+        Parameters
+        -----------
+        cols, rows : numpy arrays
+            X and Y coordinates (pixel/line or lon/lat), any shape
+        DstToSrc : 0 or 1
+            1 for inverse transformation, 0 for forward transformation.
 
-        return lonVector, latVector
+        Returns
+        --------
+        lon, lat : numpy arrays
+            transformed coordinates with the same shape as input arrays
+
+        '''
+        cols, rows = np.broadcast_arrays(np.asarray(cols, 'float64'),
+                                         np.asarray(rows, 'float64'))
+        lon, lat = self._transform_arrays(self.get_transformer(),
+                                          cols.flatten(), rows.flatten(),
+                                          DstToSrc)
+        return lon.reshape(cols.shape), lat.reshape(cols.shape)
+
+    def get_transformer(self):
+        '''Get transformer pixel/line => lon/lat of self.dataset
+
+        The transformer (and NSR it depends on) is created once and
+        re-created after VRT methods which change the georeference (e.g.
+        reproject_GCPs(), write_xml()) or if GeoTransform, projections,
+        number of GCPs, geolocation array or self.tps differ. Other
+        changes of GCPs made directly in self.dataset are not detected.
+
+        Returns
+        --------
+        transformer : gdal.Transformer
+
+        '''
+        key = self._georeference_key()
+        if self._transformer is None or self._transformerKey != key:
+            self._transformer = gdal.Transformer(
+                self.dataset, None, self._transformer_options())
+            self._transformerKey = key
+        return self._transformer
+
+    def _transformer_options(self, options=None):
+        '''Options of transformer pixel/line => lon/lat'''
+        if options is None:
+            # get source SRS (either Projection or GCPProjection)
+            options = ['SRC_SRS=' + self.get_projection(),
+                       'DST_SRS=' + NSR().wkt]
+            # add TPS method if we have GCPs and self.tps is True
+            if self.tps and self.dataset.GetGCPCount() > 0:
+                options.append('METHOD=GCP_TPS')
+        return options
+
+    def _georeference_key(self):
+        '''Properties of self.dataset which define the transformer (only
+        those which are cheap to get: GCPs are not read)'''
+        return (id(self.dataset), bool(self.tps),
+                self.dataset.GetGeoTransform(),
+                self.dataset.GetProjection(),
+                self.dataset.GetGCPProjection(),
+                self.dataset.GetGCPCount(),
+                tuple(sorted((self.dataset.GetMetadata('GEOLOCATION') or
+                              {}).items())))
+
+    def _transform_arrays(self, transformer, cols, rows, DstToSrc):
+        '''Transform 1D arrays of coordinates with given transformer'''
+        if cols.size == 0:
+            return np.zeros(0), np.zeros(0)
+        xy = np.column_stack([cols, rows]).astype('float64')
+        lonlat = np.array(transformer.TransformPoints(DstToSrc, xy)[0])
+        return lonlat[:, 0], lonlat[:, 1]
 
     def get_projection(self):
         '''Get projection form self.dataset
@@ -1773,21 +2833,13 @@ class VRT(object):
         --------
             Reprojects all GCPs to new SRS and updates GCPProjection
         '''
-        # Make tranformer from GCP SRS to destination SRS
+        # Reproject all GCPs from GCP SRS to destination SRS
         dstSRS = NSR(dstSRS)
-        srcSRS = NSR(self.dataset.GetGCPProjection())
-        transformer = osr.CoordinateTransformation(srcSRS, dstSRS)
-
-        # Reproject all GCPs
-        srcGCPs = self.dataset.GetGCPs()
-        dstGCPs = []
-        for srcGCP in srcGCPs:
-            (x, y, z) = transformer.TransformPoint(srcGCP.GCPX,
-                                                   srcGCP.GCPY,
-                                                   srcGCP.GCPZ)
-            dstGCP = gdal.GCP(x, y, z, srcGCP.GCPPixel,
-                              srcGCP.GCPLine, srcGCP.Info, srcGCP.Id)
-            dstGCPs.append(dstGCP)
+        srcGCPs = gcptools.from_gdal(self.dataset.GetGCPs())
+        dstGCPs = gcptools.transform(srcGCPs,
+                                     self.dataset.GetGCPProjection(), dstSRS)
 
         # Update dataset
-        self.dataset.SetGCPs(dstGCPs, dstSRS.wkt)
+        self._unshare()
+        self.dataset.SetGCPs(gcptools.to_gdal(dstGCPs), dstSRS.wkt)
+        self._transformer = None
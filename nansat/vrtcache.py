@@ -0,0 +1,394 @@
+# Name:    vrtcache.py
+# Purpose: Container of VRTCache class
+# Created:      17.10.2026
+# Copyright:    (c) NERSC 2011 - 2026
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+from random import choice
+from string import ascii_uppercase, digits
+
+import numpy as np
+
+from nansat.vrt import VRT
+from nansat import vsimem
+from nansat.tools import add_logger, gdal
+
+
+class _VSIMemFiles(list):
+    '''List of restored VSI files which are deleted together with the list'''
+    def __del__(self):
+        for fileName in self:
+            try:
+                gdal.Unlink(fileName)
+            except:
+                pass
+
+
+class VRTCache(object):
+    '''Persistent cache of VRTs created by mappers
+
+    A cache entry is a sub-directory of <cacheDir> with the XML of the VRT
+    created by the mapper and all VSI files it refers to (VRTs of bands
+    created from arrays, raw data, VRTs with geolocation arrays, etc). GCPs
+    and metadata are kept in the XML. The entry is identified by the
+    absolute path, size and modification time of the input file, name of
+    the requested mapper and mapper arguments. The entry is valid only
+    until the source code of the used mapper is changed.
+
+    When the total size of the cache exceeds <maxBytes> the least
+    recently used entries are removed.
+
+    '''
+    # version of the format of cache entries
+    formatVersion = 1
+    # name of the file with description of an entry
+    entryName = 'entry.json'
+
+    def __init__(self, cacheDir, maxBytes=2 ** 30, logLevel=30):
+        '''Create cache in the given directory
+
+        Parameters
+        -----------
+        cacheDir : str
+            directory for the cache. Created if does not exist.
+        maxBytes : int
+            maximum total size of the cache in bytes (1 GB by default)
+        logLevel : int
+
+        '''
+        self.cacheDir = cacheDir
+        self.maxBytes = int(maxBytes)
+        self.logger = add_logger('Nansat', logLevel)
+        if not os.path.exists(cacheDir):
+            os.makedirs(cacheDir)
+
+    def get_key(self, fileName, mapperName='', kwargs=None):
+        '''Get key of the cache entry for the input file
+
+        Parameters
+        -----------
+        fileName : str
+            name of the input file
+        mapperName : str
+            name of the requested mapper ('' for automatic selection)
+        kwargs : dict
+            additional arguments for the mapper. Only numbers, strings,
+            None, numpy arrays and lists, tuples or dicts of them can be
+            a part of the key (arrays are hashed with all their data)
+
+        Returns
+        --------
+        key : str or None
+            None, if <fileName> is not a file (e.g. URL) or if <kwargs>
+            have other values (then the VRT should not be cached)
+
+        '''
+        if not os.path.isfile(fileName):
+            return None
+        fileName = os.path.abspath(fileName)
+        fileStat = os.stat(fileName)
+        md5 = hashlib.md5(repr((self.formatVersion, fileName,
+                                fileStat.st_size, fileStat.st_mtime,
+                                mapperName)))
+        if not self._update_key(md5, kwargs or {}):
+            return None
+
+        return md5.hexdigest()
+
+    def _update_key(self, md5, value):
+        '''Add value of a mapper argument to the key
+
+        Returns
+        --------
+        success : bool
+            False if the value cannot be a part of the key
+
+        '''
+        if value is None or isinstance(value, (bool, int, long, float,
+                                               basestring)):
+            md5.update(repr((type(value).__name__, value)))
+        elif isinstance(value, (np.ndarray, np.generic)):
+            if value.dtype.hasobject:
+                return False
+            md5.update(repr(('ndarray', value.dtype.str, value.shape)))
+            md5.update(np.ascontiguousarray(value).tostring())
+        elif isinstance(value, (list, tuple)):
+            md5.update(repr((type(value).__name__, len(value))))
+            for item in value:
+                if not self._update_key(md5, item):
+                    return False
+        elif isinstance(value, dict):
+            md5.update(repr(('dict', len(value))))
+            for itemKey in sorted(value):
+                if not (self._update_key(md5, itemKey) and
+                        self._update_key(md5, value[itemKey])):
+                    return False
+        else:
+            return False
+
+        return True
+
+    def get(self, key, mapperVersions):
+        '''Create VRT from the cache entry
+
+        Parameters
+        -----------
+        key : str
+            key of the entry (see VRTCache.get_key)
+        mapperVersions : function
+            returns current version of mapper from its name
+
+        Returns
+        --------
+        vrt : VRT or None
+            None if entry is not found or outdated
+        mapper : str
+            name of the mapper which created the VRT
+
+        '''
+        entryDir = os.path.join(self.cacheDir, key)
+        entryFile = os.path.join(entryDir, self.entryName)
+        if not os.path.exists(entryFile):
+            return None, None
+
+        try:
+            return self._read_entry(key, mapperVersions)
+        except (IOError, OSError, ValueError, KeyError, RuntimeError) as e:
+            # corrupt entry or entry removed by another process
+            self.logger.error('Cannot read cached VRT %s: %s' % (key, e))
+            self.remove(key)
+            return None, None
+
+    def _read_entry(self, key, mapperVersions):
+        '''Create VRT from the cache entry (see get())'''
+        entryDir = os.path.join(self.cacheDir, key)
+        entryFile = os.path.join(entryDir, self.entryName)
+        entry = json.load(open(entryFile))
+        if entry['mapperVersion'] != mapperVersions(entry['mapper']):
+            self.logger.info('Mapper %s was changed. Remove cached VRT %s'
+                             % (entry['mapper'], key))
+            self.remove(key)
+            return None, None
+
+        # write all files into new VSI files and update names in VRTs
+        newNames = dict((oldName, self._make_filename(oldName))
+                        for oldName in entry['files'])
+        vsiFiles = _VSIMemFiles()
+        for oldName in entry['files']:
+            content = open(os.path.join(entryDir,
+                                        entry['files'][oldName]),
+                           'rb').read()
+            if oldName.endswith('.vrt'):
+                for name in newNames:
+                    content = content.replace(str(name),
+                                              str(newNames[name]))
+            gdal.FileFromMemBuffer(str(newNames[oldName]), content)
+            vsiFiles.append(str(newNames[oldName]))
+
+        mainFileName = str(newNames[entry['main']])
+        dataset = gdal.Open(mainFileName)
+        if dataset is None:
+            raise IOError('GDAL cannot open %s' % mainFileName)
+        vrt = VRT(vrtDataset=dataset)
+        vrt.tps = entry['tps']
+        # restored files are kept while the VRT (or its copies) exists
+        vrt._keptFiles = tuple(vrt._keptFiles) + (vsiFiles, )
+
+        # mark entry as recently used
+        try:
+            os.utime(entryFile, None)
+        except OSError:
+            pass
+
+        return vrt, entry['mapper']
+
+    def put(self, key, vrt, mapper, mapperVersion):
+        '''Store VRT with all VSI files it refers to in the cache
+
+        Parameters
+        -----------
+        key : str
+            key of the entry (see VRTCache.get_key)
+        vrt : VRT
+            VRT created by the mapper
+        mapper : str
+            name of the mapper
+        mapperVersion : str
+            version of the mapper
+
+        '''
+        if not vrt.fileName.startswith('/vsimem/'):
+            return
+        try:
+            self._write_entry(key, vrt, mapper, mapperVersion)
+            self.purge(self.maxBytes)
+        except (IOError, OSError, RuntimeError) as e:
+            # e.g. no space left or entry written by another process
+            self.logger.error('Cannot cache VRT %s: %s' % (key, e))
+
+    def _write_entry(self, key, vrt, mapper, mapperVersion):
+        '''Write entry into temporary dir and move it into the cache'''
+        vrt.dataset.FlushCache()
+        files = self._get_vsi_files(vrt.fileName)
+
+        tmpDir = tempfile.mkdtemp(dir=self.cacheDir)
+        try:
+            entry = {'mapper': mapper,
+                     'mapperVersion': mapperVersion,
+                     'main': vrt.fileName,
+                     'tps': bool(vrt.tps),
+                     'files': {}}
+            for i, fileName in enumerate(sorted(files)):
+                entry['files'][fileName] = 'file_%03d' % i
+                outFile = open(os.path.join(tmpDir,
+                                            entry['files'][fileName]), 'wb')
+                try:
+                    outFile.write(files[fileName])
+                finally:
+                    outFile.close()
+            entryFile = open(os.path.join(tmpDir, self.entryName), 'w')
+            try:
+                json.dump(entry, entryFile)
+            finally:
+                entryFile.close()
+
+            entryDir = os.path.join(self.cacheDir, key)
+            if os.path.exists(entryDir):
+                shutil.rmtree(entryDir)
+            os.rename(tmpDir, entryDir)
+        finally:
+            shutil.rmtree(tmpDir, ignore_errors=True)
+
+    def remove(self, key):
+        '''Remove entry from the cache'''
+        shutil.rmtree(os.path.join(self.cacheDir, key), ignore_errors=True)
+
+    def entries(self):
+        '''Get list of entries sorted from least to most recently used
+
+        Returns
+        --------
+        entries : list of tuples
+            (key, time of last use, size in bytes)
+
+        '''
+        entries = []
+        for key in os.listdir(self.cacheDir):
+            entryDir = os.path.join(self.cacheDir, key)
+            entryFile = os.path.join(entryDir, self.entryName)
+            try:
+                size = sum(os.path.getsize(os.path.join(entryDir, f))
+                           for f in os.listdir(entryDir))
+                entries.append((key, os.path.getmtime(entryFile), size))
+            except OSError:
+                # not an entry or removed by another process
+                continue
+
+        return sorted(entries, key=lambda e: e[1])
+
+    def purge(self, maxBytes=0):
+        '''Remove least recently used entries until the cache fits maxBytes
+
+        Parameters
+        -----------
+        maxBytes : int
+            maximum total size of the cache. 0 removes all entries.
+
+        Returns
+        --------
+        nRemoved : int
+            number of removed entries
+
+        '''
+        entries = self.entries()
+        totalSize = sum(e[2] for e in entries)
+        nRemoved = 0
+        for key, lastUsed, size in entries:
+            if totalSize <= maxBytes:
+                break
+            self.remove(key)
+            totalSize -= size
+            nRemoved += 1
+
+        return nRemoved
+
+    def _get_vsi_files(self, fileName, files=None):
+        '''Read content of VSI file and all VSI files it refers to'''
+        if files is None:
+            files = {}
+        try:
+            vsiFile = gdal.VSIFOpenL(fileName, 'rb')
+        except RuntimeError:
+            vsiFile = None
+        if vsiFile is None:
+            self.logger.warning('Cannot read %s for cache!' % fileName)
+            return files
+        gdal.VSIFSeekL(vsiFile, 0, 2)
+        vsiFileSize = gdal.VSIFTellL(vsiFile)
+        gdal.VSIFSeekL(vsiFile, 0, 0)
+        files[fileName] = gdal.VSIFReadL(vsiFileSize, 1, vsiFile)
+        gdal.VSIFCloseL(vsiFile)
+
+        # VRT of array points to the array data in memory
+        if fileName.endswith('.vrt') and 'MEM:::' in files[fileName]:
+            self._add_raw_band(fileName, files)
+
+        # only VRT files can refer to other files
+        if fileName.endswith('.vrt'):
+            # VSI files and data moved from memory to disk
+            refFileNames = re.findall('/vsimem/[^<>"\s]+', files[fileName])
+            refFileNames += [refFileName for refFileName in
+                             re.findall('>([^<>"]+)<', files[fileName])
+                             if vsimem.is_spill_filename(refFileName)]
+            for refFileName in refFileNames:
+                if refFileName not in files:
+                    self._get_vsi_files(refFileName, files)
+
+        return files
+
+    def _add_raw_band(self, fileName, files):
+        '''Store data of array used by VRT in raw file
+
+        The reference to the array in the VRT is replaced with a reference
+        to a VRT of the raw file.
+
+        '''
+        memFileName = re.search('MEM:::[^<]+', files[fileName]).group(0)
+        dataset = gdal.Open(memFileName)
+        if dataset is None:
+            raise IOError('GDAL cannot open %s' % memFileName)
+        band = dataset.GetRasterBand(1)
+        rawFileName = fileName.replace('.vrt', '.raw')
+        rawVRTFileName = fileName.replace('.vrt', '_raw.vrt')
+        pixelOffset = gdal.GetDataTypeSize(band.DataType) // 8
+        files[rawFileName] = band.ReadRaster()
+        files[rawVRTFileName] = VRT.RawRasterBandSource.substitute(
+            XSize=dataset.RasterXSize,
+            YSize=dataset.RasterYSize,
+            DataType=gdal.GetDataTypeName(band.DataType),
+            BandNum=1,
+            SrcFileName=rawFileName,
+            PixelOffset=pixelOffset,
+            LineOffset=pixelOffset * dataset.RasterXSize)
+        files[fileName] = files[fileName].replace(memFileName,
+                                                  rawVRTFileName)
+
+    def _make_filename(self, fileName):
+        '''Create random VSI file name with the same extension'''
+        randomChars = ''.join(choice(ascii_uppercase + digits)
+                              for x in range(10))
+        return '/vsimem/%s%s' % (randomChars, os.path.splitext(fileName)[1])
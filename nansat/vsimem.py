@@ -0,0 +1,172 @@
+# Name:    vsimem.py
+# Purpose: Accounting of memory used by VSI files and spilling to disk
+# Created:      17.10.2026
+# Copyright:    (c) NERSC 2011 - 2026
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+'''Registry of objects which keep files in /vsimem
+
+Each owner (e.g. VRT file of a VRT object) registers itself and
+implements:
+* name : name of the owner (e.g. name of the VRT file)
+* vsimem_bytes() : number of bytes kept in memory by the owner
+* spill() : move data to a file on disk (see make_spill_filename()),
+  returns number of freed bytes
+
+Owners are kept by weak references. The registry keeps the number of
+bytes of each owner and the total: owners call update() after their files
+are changed and unregister() when their files are deleted.
+
+'''
+from __future__ import absolute_import
+import os
+import tempfile
+import weakref
+
+from nansat.tools import gdal
+
+_owners = weakref.WeakSet()
+# number of bytes of each owner by id() and total number of bytes
+_sizes = {}
+_total = 0
+
+# high-water mark of memory used by VSI files (None - no limit)
+maxBytes = None
+# directory for data moved from memory (None - system temporary directory)
+spillDir = None
+# prefix of names of files with data moved from memory
+spillPrefix = 'nansat_vsimem_'
+
+
+def register(owner):
+    '''Add object which keeps files in /vsimem to the registry'''
+    _owners.add(owner)
+    update(owner)
+
+
+def update(owner):
+    '''Update number of bytes of the owner after its files were changed'''
+    global _total
+    nBytes = owner.vsimem_bytes()
+    _total += nBytes - _sizes.get(id(owner), 0)
+    _sizes[id(owner)] = nBytes
+
+
+def unregister(owner):
+    '''Remove bytes of the owner from the total (when its files are deleted)
+    '''
+    global _total
+    _total -= _sizes.pop(id(owner), 0)
+
+
+def total_bytes():
+    '''Get total number of bytes of all owners (see update())'''
+    return _total
+
+
+def file_size(fileName):
+    '''Size of a VSI file in memory (0 for files on disk or not existing)'''
+    if not fileName.startswith('/vsimem/'):
+        return 0
+    stat = gdal.VSIStatL(fileName)
+    if stat is None:
+        return 0
+    return stat.size
+
+
+def vsimem_usage():
+    '''Get memory used by VSI files of each object (see update())
+
+    Returns
+    --------
+    usage : dict
+        name of object (e.g. VRT.fileName) => number of bytes
+
+    '''
+    usage = {}
+    for owner in list(_owners):
+        nBytes = _sizes.get(id(owner), 0)
+        if nBytes > 0:
+            usage[owner.name] = usage.get(owner.name, 0) + nBytes
+    return usage
+
+
+def set_vsimem_limit(limit, dirName=None):
+    '''Set high-water mark of memory used by VSI files
+
+    Above the mark raw data of bands created from arrays is written into
+    temporary files in <dirName> instead of memory. Existing data is
+    moved to disk (see spill()).
+
+    Parameters
+    -----------
+    limit : int or None
+        maximum number of bytes, None for no limit
+    dirName : str, optional
+        directory for temporary files (system temporary directory by
+        default)
+
+    '''
+    global maxBytes, spillDir
+    maxBytes = limit
+    spillDir = dirName
+    spill()
+
+
+def is_over_limit(nBytes=0):
+    '''Check if usage with additional <nBytes> is above the high-water mark'''
+    if maxBytes is None:
+        return False
+    return _total + nBytes > maxBytes
+
+
+def make_spill_filename(extension='.raw'):
+    '''Create name of temporary file on disk for data moved from memory'''
+    fd, fileName = tempfile.mkstemp(suffix=extension, prefix=spillPrefix,
+                                    dir=spillDir)
+    os.close(fd)
+    return fileName
+
+
+def is_spill_filename(fileName):
+    '''Check if file was created by make_spill_filename()'''
+    dirName, baseName = os.path.split(fileName)
+    return (baseName.startswith(spillPrefix) and
+            os.path.abspath(dirName) ==
+            os.path.abspath(spillDir or tempfile.gettempdir()))
+
+
+def spill():
+    '''Move data to disk until usage is below the high-water mark
+
+    The largest owners are spilled first. Files are moved and the VRT
+    files of the owners are updated, but GDAL datasets which have already
+    opened them as sources (e.g. open datasets of VRTs referring to a band
+    VRT) keep the data in memory until they are closed or re-opened (e.g.
+    when the next band is added to Nansat). This memory is not counted.
+
+    Returns
+    --------
+    nBytes : int
+        number of freed bytes
+
+    '''
+    if maxBytes is None or _total <= maxBytes:
+        return 0
+    owners = sorted(_owners, key=lambda owner: -_sizes.get(id(owner), 0))
+    freed = 0
+    for owner in owners:
+        if _total <= maxBytes:
+            break
+        nBytes = owner.spill()
+        if nBytes > 0:
+            update(owner)
+            freed += nBytes
+    return freed
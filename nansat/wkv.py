@@ -0,0 +1,116 @@
+# Name:    wkv.py
+# Purpose: Index of well known variables (WKV) from wkv.xml
+# Created:      17.10.2026
+# Copyright:    (c) NERSC 2011 - 2026
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import os
+
+from nansat.node import Node
+
+fileNameWKV = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                           'wkv.xml')
+
+# index of the default vocabulary (built on first use)
+_wkvIndex = None
+
+
+class WKVIndex(object):
+    '''Read-only index of the vocabulary of well known variables
+
+    The vocabulary is parsed once. Each WKV is a dictionary with the tags
+    of a <wkv> node (standard_name, long_name, short_name, units, ...).
+    WKVs can be looked up by standard name, by short name or by units.
+    Lookups return copies, the index itself is never changed.
+
+    '''
+    def __init__(self, fileName=fileNameWKV):
+        '''Parse the vocabulary
+
+        Parameters
+        -----------
+        fileName : str
+            name of the XML file with <wkv> nodes
+
+        '''
+        byStandardName = {}
+        for iNode in Node.create(fileName).nodeList('wkv'):
+            standardNameNode = iNode.node('standard_name')
+            if not standardNameNode:
+                continue
+            standardName = standardNameNode.value
+            wkvDict = {'standard_name': standardName}
+            for iTag in iNode.tagList():
+                wkvDict[iTag] = str(iNode.node(iTag).value)
+            # the last WKV with the same standard name is used
+            byStandardName[standardName] = wkvDict
+
+        byShortName = {}
+        byUnits = {}
+        for standardName in sorted(byStandardName):
+            wkvDict = byStandardName[standardName]
+            if 'short_name' in wkvDict:
+                byShortName.setdefault(wkvDict['short_name'],
+                                       []).append(standardName)
+            if 'units' in wkvDict:
+                byUnits.setdefault(wkvDict['units'], []).append(standardName)
+
+        self._byStandardName = byStandardName
+        self._byShortName = byShortName
+        self._byUnits = byUnits
+
+    def __len__(self):
+        return len(self._byStandardName)
+
+    def __contains__(self, standardName):
+        return standardName in self._byStandardName
+
+    def standard_names(self):
+        '''Sorted list of standard names of all WKVs'''
+        return sorted(self._byStandardName)
+
+    def get(self, standardName):
+        '''Get WKV by standard name
+
+        Parameters
+        -----------
+        standardName : str
+            value of <standard_name> (e.g. value of 'wkv' key in metaDict)
+
+        Returns
+        --------
+        wkvDict : dict
+            copy of WKV metadata or empty dict if WKV is not found
+
+        '''
+        return dict(self._byStandardName.get(standardName, {}))
+
+    def find_short_name(self, shortName):
+        '''Get list of WKVs with the given <short_name>'''
+        return [self.get(standardName)
+                for standardName in self._byShortName.get(shortName, [])]
+
+    def find_units(self, units):
+        '''Get list of WKVs with the given <units>'''
+        return [self.get(standardName)
+                for standardName in self._byUnits.get(units, [])]
+
+
+def get_wkv_index():
+    '''Get index of the default vocabulary (nansat/wkv.xml)
+
+    The index is built on the first call and shared afterwards.
+
+    '''
+    global _wkvIndex
+    if _wkvIndex is None:
+        _wkvIndex = WKVIndex()
+    return _wkvIndex
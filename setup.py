@@ -214,6 +214,7 @@ def run_setup(skip_compile):
         platforms=PLATFORMS,
         packages=packages,
         package_data={NAME:['wkv.xml', "fonts/*.ttf", 'mappers/*.pl',
+            'mappers/manifest.json',
             'tests/data/*.*']},
         scripts=[os.path.join('utilities', name) for name in
                     ['nansatinfo',
@@ -221,6 +222,7 @@ def run_setup(skip_compile):
                      'nansat_geotiffimage',
                      'nansat_show',
                      'nansat_translate',
+                     'nansat_purge_cache',
                      ]],
         cmdclass = {'install_scripts': my_install_scripts},
         install_requires=REQS,